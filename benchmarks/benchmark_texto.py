@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from src import huffman_rapido  # noqa: E402
+from src.compresion_texto import (  # noqa: E402
+    TRAMA_FIN,
+    TRAMA_TABLA_NUEVA,
+    _leer_datos,
+    _leer_encabezado,
+    _leer_tabla,
+    comprimir_texto,
+    descomprimir_texto,
+)
+
+RUTA_TEXTO = os.path.join("archivos", "originales", "texto_grande.txt")
+# Copias del texto de prueba (~22 KB) por medición: hasta ~9 MB
+REPETICIONES = [10, 100, 400]
+# El decodificador bit a bit sólo se mide hasta este tamaño (es muy lento)
+MEGABYTES_ANTERIOR = 3
+
+
+def descomprimir_bit_a_bit(archivo_entrada):
+    # Decodificador anterior (cadena de bits y concatenación), como referencia
+    texto = ""
+    with open(archivo_entrada, "rb") as f:
+        _, tipo = _leer_encabezado(f)
+        while (tipo_trama := f.read(1)[0]) != TRAMA_FIN:
+            if tipo_trama == TRAMA_TABLA_NUEVA:
+                alfabeto, enteros, longitudes = _leer_tabla(f, tipo)
+                reverse = {
+                    format(int(c), f"0{l}b"): chr(p)
+                    for p, c, l in zip(alfabeto.tolist(), enteros, longitudes.tolist())
+                }
+            n_bits = huffman_rapido.leer_varint(f)
+            datos = _leer_datos(f, n_bits)
+
+            bit_string = ""
+            for byte in datos:
+                bit_string += f"{byte:08b}"
+            bit_string = bit_string[:n_bits]
+
+            current = ""
+            for bit in bit_string:
+                current += bit
+                if current in reverse:
+                    texto += reverse[current]
+                    current = ""
+    return texto
+
+
+def medir(funcion, *argumentos):
+    inicio = time.perf_counter()
+    resultado = funcion(*argumentos)
+    return resultado, time.perf_counter() - inicio
+
+
+def main():
+    with open(RUTA_TEXTO, "r", encoding="utf-8") as f:
+        base = f.read()
+
+    print(f"{'Tamaño':>12} {'Anterior':>12} {'Tablas':>12} {'MB/s':>8} {'Mejora':>8}")
+    with tempfile.TemporaryDirectory() as directorio:
+        comprimido = os.path.join(directorio, "texto.bin")
+        salida = os.path.join(directorio, "texto.txt")
+        for repeticiones in REPETICIONES:
+            texto = base * repeticiones
+            comprimir_texto(texto, comprimido)
+            megabytes = len(texto.encode("utf-8")) / 1e6
+
+            nuevo, tiempo_nuevo = medir(descomprimir_texto, comprimido, salida)
+            assert nuevo == texto
+            if megabytes <= MEGABYTES_ANTERIOR:
+                anterior, tiempo_anterior = medir(descomprimir_bit_a_bit, comprimido)
+                assert anterior == texto
+                columnas = (
+                    f"{tiempo_anterior:>11.3f}s {tiempo_nuevo:>11.3f}s "
+                    f"{megabytes / tiempo_nuevo:>8.1f} "
+                    f"{tiempo_anterior / tiempo_nuevo:>7.1f}x"
+                )
+            else:
+                columnas = (
+                    f"{'-':>12} {tiempo_nuevo:>11.3f}s "
+                    f"{megabytes / tiempo_nuevo:>8.1f} {'-':>8}"
+                )
+            print(f"{megabytes:>10.2f}MB {columnas}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,30 @@
+import io
 import numpy as np
 import wave
-import heapq
 import os
 import time
-import pickle
 import pyaudio
 import threading
 
-
-class NodoHuffman:
-    __slots__ = ("simbolo", "frecuencia", "izquierda", "derecha")
-
-    def __init__(self, simbolo=None, frecuencia=None):
-        self.simbolo = simbolo
-        self.frecuencia = frecuencia
-        self.izquierda = None
-        self.derecha = None
-
-    def __lt__(self, otro):
-        return self.frecuencia < otro.frecuencia
+from src import huffman_rapido, paralelo, prediccion
+
+# Encabezado de los archivos .hac: firma + version del formato + codec
+MAGIA_AUDIO = b"HAC"
+VERSION_AUDIO = 1
+# Codecs: RLE de las muestras + Huffman, o prediccion lineal por canal
+# (src/prediccion.py) para audio de 8 o 16 bits
+CODEC_RLE_HUFFMAN = 0
+CODEC_PREDICTIVO = 1
+# Muestras por canal desde las que los canales se codifican en procesos
+# aparte: con menos, arrancar el pool y pasarle los datos cuesta mas que
+# codificar
+MUESTRAS_EN_PARALELO = 1 << 20
+# Clases que puede contener un .hac del formato anterior (pickle)
+CLASES_LEGADO = {
+    ("numpy", "dtype"),
+    ("numpy.core.multiarray", "scalar"),
+    ("numpy._core.multiarray", "scalar"),
+}
 
 
 class ReproductorAudio:
@@ -154,36 +160,50 @@ class ReproductorAudio:
 
 
 class CompresorAudioOptimizado:
-    def __init__(self):
-        self.codigos_huffman = {}
-        self.arbol_huffman = None
+    def __init__(
+        self,
+        longitud_maxima=huffman_rapido.LONGITUD_MAXIMA,
+        codec=CODEC_PREDICTIVO,
+        residuos=prediccion.RESIDUOS_AUTOMATICO,
+        estereo=True,
+        procesos=None,
+    ):
+        # longitud_maxima: bits maximos por codigo (None: sin limite)
+        # codec: CODEC_PREDICTIVO o CODEC_RLE_HUFFMAN
+        # residuos: codificador de los residuos del codec predictivo
+        # (prediccion.RESIDUOS_AUTOMATICO, el mas chico por canal;
+        # prediccion.RESIDUOS_RICE, sin tabla; o prediccion.RESIDUOS_HUFFMAN)
+        # estereo: en audio de 2 canales, elegir medio/lateral por trama
+        # procesos: procesos para los canales (por omision, uno por nucleo)
+        if codec not in (CODEC_RLE_HUFFMAN, CODEC_PREDICTIVO):
+            raise ValueError(f"Codec de audio desconocido: {codec}")
+        if residuos not in prediccion.CODIFICADORES_RESIDUOS:
+            raise ValueError(f"Codificador de residuos desconocido: {residuos}")
+        self.longitud_maxima = longitud_maxima
+        self.codec = codec
+        self.residuos = residuos
+        self.estereo = estereo
+        self.procesos = procesos
         self.reproductor = ReproductorAudio()
 
-    def construir_arbol_huffman(self, datos):
-        # Construye arbol de Huffman optimizado
+    def longitudes_huffman(self, datos):
+        # Simbolos distintos (ordenados) y longitud del codigo de Huffman de
+        # cada uno, calculadas desde los conteos sin armar el arbol; con
+        # longitud_maxima se limitan (package-merge) si alguna la supera
         print("  Contando frecuencias...")
 
-        valores_unicos, conteos = np.unique(datos, return_counts=True)
-        frecuencias = dict(zip(valores_unicos, conteos))
-
-        print(f"  Simbolos unicos: {len(frecuencias)}")
+        simbolos, conteos = np.unique(datos, return_counts=True)
 
-        cola_prioridad = [
-            NodoHuffman(simbolo, freq) for simbolo, freq in frecuencias.items()
-        ]
-        heapq.heapify(cola_prioridad)
+        print(f"  Simbolos unicos: {len(simbolos)}")
 
-        while len(cola_prioridad) > 1:
-            nodo1 = heapq.heappop(cola_prioridad)
-            nodo2 = heapq.heappop(cola_prioridad)
-
-            nodo_combinado = NodoHuffman(frecuencia=nodo1.frecuencia + nodo2.frecuencia)
-            nodo_combinado.izquierda = nodo1
-            nodo_combinado.derecha = nodo2
-
-            heapq.heappush(cola_prioridad, nodo_combinado)
-
-        return cola_prioridad[0]
+        longitudes = huffman_rapido.longitudes_huffman(conteos)
+        if self.longitud_maxima and longitudes.max() > self.longitud_maxima:
+            # Con miles de simbolos salen codigos muy largos
+            longitudes = huffman_rapido.longitudes_limitadas(
+                conteos, self.longitud_maxima
+            )
+            print(f"  Codigos limitados a {longitudes.max()} bits")
+        return simbolos, longitudes
 
     def comprimir_rle(self, datos):
         # RLE vectorizado usando numpy
@@ -220,55 +240,211 @@ class CompresorAudioOptimizado:
         print(f"  RLE descomprimido: {len(descomprimido)} muestras")
         return descomprimido
 
-    def codificar_huffman(self, datos_rle, codigos_huffman):
-        # Codificacion Huffman optimizada
+    def codificar_huffman(self, datos_rle, simbolos, codigos=None, longitudes=None):
+        # Codificacion Huffman vectorizada: los codigos son enteros
+        # (codigo, longitud) indexados por la posicion de cada simbolo en
+        # `simbolos` (ordenados), y los bits se empaquetan en bloque. Tambien
+        # acepta, en lugar de los tres arreglos, un diccionario
+        # {simbolo: "0101..."} como antes
         print("  Codificando Huffman...")
 
-        longitudes = {
-            simbolo: len(codigo) for simbolo, codigo in codigos_huffman.items()
-        }
-        bits_totales = sum(longitudes[valor] for valor in datos_rle)
-        bytes_totales = (bits_totales + 7) // 8
-
-        resultado = bytearray(bytes_totales)
-        bit_actual = 0
+        if isinstance(simbolos, dict):
+            codigos_texto = simbolos
+            simbolos = np.array(sorted(codigos_texto))
+            textos = [codigos_texto[s] for s in simbolos.tolist()]
+            codigos = np.array([int(t, 2) for t in textos], dtype=np.int64)
+            longitudes = np.array([len(t) for t in textos], dtype=np.int64)
 
-        for valor in datos_rle:
-            codigo = codigos_huffman[valor]
-            for bit in codigo:
-                if bit == "1":
-                    resultado[bit_actual // 8] |= 1 << (7 - (bit_actual % 8))
-                bit_actual += 1
+        # Posicion de cada valor en la tabla ordenada de simbolos
+        indices = np.searchsorted(simbolos, datos_rle)
+        resultado, bits_validos = huffman_rapido.codificar(indices, codigos, longitudes)
 
         print(f"  Huffman codificado: {len(resultado)} bytes")
-        return bytes(resultado), bit_actual
-
-    def decodificar_huffman(self, bits_comprimidos, bits_validos, arbol_raiz):
-        # Decodificacion Huffman optimizada
+        return resultado, bits_validos
+
+    def decodificar_huffman(
+        self, bits_comprimidos, bits_validos, simbolos, codigos, longitudes
+    ):
+        # Decodificacion por tablas (huffman_rapido): se leen ventanas de
+        # varios bits de una vista uint8 de los datos y cada consulta resuelve
+        # uno o mas codigos; los simbolos se escriben en un arreglo int32
+        # preasignado, asi la memoria es proporcional a la salida
         print("  Decodificando Huffman...")
 
-        datos_rle = []
-        nodo_actual = arbol_raiz
-
-        bits_array = []
-        for byte in bits_comprimidos:
-            for i in range(7, -1, -1):
-                bits_array.append((byte >> i) & 1)
-
-        bits_array = bits_array[:bits_validos]
-
-        for bit in bits_array:
-            if bit == 0:
-                nodo_actual = nodo_actual.izquierda
-            else:
-                nodo_actual = nodo_actual.derecha
-
-            if nodo_actual.simbolo is not None:
-                datos_rle.append(nodo_actual.simbolo)
-                nodo_actual = arbol_raiz
+        if bits_validos > 8 * len(bits_comprimidos):
+            raise ValueError("Archivo truncado: faltan datos comprimidos")
+        indices = huffman_rapido.decodificar(
+            bits_comprimidos, bits_validos, codigos, longitudes
+        )
+        datos_rle = np.empty(len(indices), dtype=np.int32)
+        np.take(np.asarray(simbolos, dtype=np.int32), indices, out=datos_rle)
 
         print(f"  Huffman decodificado: {len(datos_rle)} elementos")
-        return np.array(datos_rle, dtype=np.int32)
+        return datos_rle
+
+    def _columnas(self, canales, sample_width):
+        # Flujos entrelazados en los datos: un canal por muestra de 8 o 16
+        # bits; con muestras mas anchas (leidas como bytes), cada byte de
+        # cada canal
+        return canales if sample_width in (1, 2) else canales * sample_width
+
+    def _en_canales(self, funcion, tareas, n):
+        # Aplica funcion a la tarea de cada canal (de n muestras), en el pool
+        # de procesos si hay mas de un proceso, mas de un canal y al menos
+        # MUESTRAS_EN_PARALELO muestras por canal
+        procesos = self.procesos or os.cpu_count() or 1
+        if procesos > 1 and len(tareas) > 1 and n >= MUESTRAS_EN_PARALELO:
+            return list(paralelo.en_paralelo(funcion, tareas, procesos))
+        return [funcion(*tarea) for tarea in tareas]
+
+    def comprimir_rle_huffman(self, datos_audio, columnas):
+        # Codec RLE + Huffman: el RLE recorre cada canal por separado (vistas
+        # sin copia de las muestras entrelazadas) y los resultados van uno
+        # detras del otro a un mismo Huffman. Devuelve (bits validos + tabla
+        # canonica + bits, tiempos por etapa)
+        tiempo_rle = time.time()
+        datos_rle = np.concatenate(
+            [self.comprimir_rle(datos_audio[c::columnas]) for c in range(columnas)]
+        )
+        tiempo_rle = time.time() - tiempo_rle
+
+        carga = io.BytesIO()
+        if len(datos_rle) == 0:
+            # Audio vacio: tabla vacia y ningun bit (no hay arbol que armar)
+            vacio = np.empty(0, dtype=np.int64)
+            huffman_rapido.escribir_varint(carga, 0)
+            huffman_rapido.escribir_tabla(carga, vacio, vacio)
+            return carga.getvalue(), [("RLE", tiempo_rle)]
+
+        tiempo_huffman = time.time()
+        simbolos, longitudes = self.longitudes_huffman(datos_rle)
+        codigos = huffman_rapido.codigos_canonicos(longitudes)
+        tiempo_huffman = time.time() - tiempo_huffman
+
+        tiempo_codificacion = time.time()
+        bits_comprimidos, bits_validos = self.codificar_huffman(
+            datos_rle, simbolos, codigos, longitudes
+        )
+        tiempo_codificacion = time.time() - tiempo_codificacion
+
+        huffman_rapido.escribir_varint(carga, bits_validos)
+        huffman_rapido.escribir_tabla(carga, simbolos, longitudes)
+        carga.write(bits_comprimidos)
+        tiempos = [
+            ("RLE", tiempo_rle),
+            ("Huffman", tiempo_huffman),
+            ("Codificacion", tiempo_codificacion),
+        ]
+        return carga.getvalue(), tiempos
+
+    def descomprimir_rle_huffman(self, f, metadatos):
+        # Inverso de comprimir_rle_huffman: devuelve (muestras, tiempos)
+        bits_comprimidos = f.read()
+        if "arbol_huffman" in metadatos:
+            simbolos, codigos, longitudes = self._codigos_de_arbol(
+                metadatos["arbol_huffman"]
+            )
+        else:
+            simbolos, longitudes = metadatos["simbolos"], metadatos["longitudes"]
+            codigos = huffman_rapido.codigos_canonicos(longitudes)
+
+        tiempo_decodificacion = time.time()
+        datos_rle = self.decodificar_huffman(
+            bits_comprimidos,
+            metadatos["bits_validos"],
+            simbolos,
+            codigos,
+            longitudes,
+        )
+        tiempo_decodificacion = time.time() - tiempo_decodificacion
+
+        tiempo_rle = time.time()
+        datos_audio = self.descomprimir_rle(datos_rle)
+        if metadatos["version"] == VERSION_AUDIO:
+            # Los canales vienen uno detras del otro (en el formato anterior,
+            # entrelazados): se vuelven a entrelazar
+            columnas = self._columnas(metadatos["canales"], metadatos["sample_width"])
+            if columnas == 0 or len(datos_audio) % columnas:
+                raise ValueError("Archivo corrupto: muestras incompletas por canal")
+            datos_audio = datos_audio.reshape(columnas, -1).T.ravel()
+        tiempo_rle = time.time() - tiempo_rle
+        return datos_audio, [
+            ("Decodificacion", tiempo_decodificacion),
+            ("RLE", tiempo_rle),
+        ]
+
+    def comprimir_predictivo(self, datos_audio, canales, sample_width):
+        # Codec predictivo: cada canal (vista sin copia de las muestras
+        # entrelazadas) se codifica aparte, en paralelo, como residuos de
+        # prediccion lineal por trama. Despues del byte del codificador de
+        # residuos va un byte que indica si hay modos estereo (tamano de
+        # trama + un modo por trama) y luego el bloque de cada canal con su
+        # largo. Las muestras de 8 bits (sin signo) se centran en 0
+        print("  Aplicando prediccion lineal por canal...")
+        tiempo_prediccion = time.time()
+        muestras = datos_audio.reshape(-1, canales)
+        if sample_width == 1:
+            muestras = muestras.astype(np.int16) - 128
+        senales = [muestras[:, canal] for canal in range(canales)]
+
+        carga = io.BytesIO()
+        carga.write(bytes([self.residuos]))
+        if canales == 2 and self.estereo:
+            modos, *senales = prediccion.estereo(*senales)
+            carga.write(bytes([1]))
+            huffman_rapido.escribir_varint(carga, prediccion.TAMANO_TRAMA)
+            carga.write(modos.tobytes())
+            independientes = np.count_nonzero(
+                modos == prediccion.ESTEREO_IZQUIERDO_DERECHO
+            )
+            print(f"  Tramas con lateral: {len(modos) - independientes}/{len(modos)}")
+        else:
+            carga.write(bytes([0]))
+
+        tareas = [(senal, self.residuos) for senal in senales]
+        bloques = self._en_canales(prediccion.codificar, tareas, len(muestras))
+        for bloque in bloques:
+            huffman_rapido.escribir_varint(carga, len(bloque))
+            carga.write(bloque)
+        tiempo_prediccion = time.time() - tiempo_prediccion
+        print(f"  Prediccion completada: {carga.tell()} bytes")
+        return carga.getvalue(), [("Prediccion", tiempo_prediccion)]
+
+    def descomprimir_predictivo(self, f, metadatos):
+        # Inverso de comprimir_predictivo: devuelve (muestras entrelazadas,
+        # tiempos)
+        print("  Reconstruyendo prediccion lineal...")
+        tiempo_prediccion = time.time()
+        canales = metadatos["canales"]
+        if canales == 0 or metadatos["tamano_original"] % canales:
+            raise ValueError("Archivo corrupto: muestras incompletas por canal")
+        n = metadatos["tamano_original"] // canales
+        residuos = metadatos["residuos"]
+
+        estereo = f.read(1)[0]
+        if estereo:
+            tamano = huffman_rapido.leer_varint(f)
+            if canales != 2 or tamano == 0:
+                raise ValueError("Archivo corrupto: modos estereo invalidos")
+            modos = np.frombuffer(f.read(-(-n // tamano)), dtype=np.uint8)
+        bloques = []
+        for _ in range(canales):
+            largo = huffman_rapido.leer_varint(f)
+            bloques.append(f.read(largo))
+            if len(bloques[-1]) != largo:
+                raise ValueError("Archivo truncado: faltan datos de un canal")
+        tareas = [(bloque, n, residuos) for bloque in bloques]
+        senales = self._en_canales(prediccion.decodificar, tareas, n)
+        if estereo:
+            senales = prediccion.desestereo(modos, *senales, tamano)
+
+        muestras = np.empty((n, canales), dtype=np.int16)
+        for canal, senal in enumerate(senales):
+            muestras[:, canal] = senal
+        if metadatos["sample_width"] == 1:
+            muestras += 128
+        tiempo_prediccion = time.time() - tiempo_prediccion
+        return muestras.ravel(), [("Prediccion", tiempo_prediccion)]
 
     def comprimir_audio(self, ruta_archivo):
         # Compresion optimizada y rapida
@@ -292,50 +468,35 @@ class CompresorAudioOptimizado:
 
             print(f"  Muestras a procesar: {len(datos_audio):,}")
 
-            tiempo_rle = time.time()
-            datos_rle = self.comprimir_rle(datos_audio)
-            tiempo_rle = time.time() - tiempo_rle
-
-            tiempo_huffman = time.time()
-            self.arbol_huffman = self.construir_arbol_huffman(datos_rle)
-            self.codigos_huffman = {}
-            self._generar_codigos_huffman(self.arbol_huffman)
-            tiempo_huffman = time.time() - tiempo_huffman
-
-            tiempo_codificacion = time.time()
-            bits_comprimidos, bits_validos = self.codificar_huffman(
-                datos_rle, self.codigos_huffman
-            )
-            tiempo_codificacion = time.time() - tiempo_codificacion
+            if self.codec == CODEC_PREDICTIVO and sample_width in (1, 2):
+                codec = CODEC_PREDICTIVO
+                carga, tiempos = self.comprimir_predictivo(
+                    datos_audio, canales, sample_width
+                )
+            else:
+                codec = CODEC_RLE_HUFFMAN
+                carga, tiempos = self.comprimir_rle_huffman(
+                    datos_audio, self._columnas(canales, sample_width)
+                )
 
             nombre_base = os.path.splitext(ruta_archivo)[0]
             ruta_comprimido = nombre_base + "_comprimido.hac"
 
             with open(ruta_comprimido, "wb") as f:
-                metadatos = {
-                    "canales": canales,
-                    "sample_width": sample_width,
-                    "frame_rate": frame_rate,
-                    "tamano_original": len(datos_audio),
-                    "bits_validos": bits_validos,
-                    "arbol_huffman": self._serializar_arbol(self.arbol_huffman),
-                }
-                pickle.dump(metadatos, f)
-                f.write(bits_comprimidos)
+                # Encabezado compacto: parametros comunes + datos del codec
+                f.write(MAGIA_AUDIO + bytes([VERSION_AUDIO, codec]))
+                for valor in (canales, sample_width, frame_rate, len(datos_audio)):
+                    huffman_rapido.escribir_varint(f, valor)
+                f.write(carga)
 
             tiempo_total = time.time() - inicio
             tamano_original = len(datos_audio) * sample_width
-            ratio_compresion = (
-                tamano_original / len(bits_comprimidos)
-                if len(bits_comprimidos) > 0
-                else 1
-            )
+            ratio_compresion = tamano_original / len(carga) if len(carga) > 0 else 1
 
             print("\n=== COMPRESION COMPLETADA ===")
             print(f"Tiempo total: {tiempo_total:.2f}s")
-            print(f" - RLE: {tiempo_rle:.2f}s")
-            print(f" - Huffman: {tiempo_huffman:.2f}s")
-            print(f" - Codificacion: {tiempo_codificacion:.2f}s")
+            for etapa, segundos in tiempos:
+                print(f" - {etapa}: {segundos:.2f}s")
             print(f"Ratio compresion: {ratio_compresion:.2f}:1")
             print(f"Archivo: {ruta_comprimido}")
 
@@ -352,20 +513,11 @@ class CompresorAudioOptimizado:
 
         try:
             with open(ruta_comprimido, "rb") as f:
-                metadatos = pickle.load(f)
-                bits_comprimidos = f.read()
-
-            self.arbol_huffman = self._reconstruir_arbol(metadatos["arbol_huffman"])
-
-            tiempo_decodificacion = time.time()
-            datos_rle = self.decodificar_huffman(
-                bits_comprimidos, metadatos["bits_validos"], self.arbol_huffman
-            )
-            tiempo_decodificacion = time.time() - tiempo_decodificacion
-
-            tiempo_rle = time.time()
-            datos_audio = self.descomprimir_rle(datos_rle)
-            tiempo_rle = time.time() - tiempo_rle
+                metadatos = self._leer_encabezado(f)
+                if metadatos["codec"] == CODEC_PREDICTIVO:
+                    datos_audio, tiempos = self.descomprimir_predictivo(f, metadatos)
+                else:
+                    datos_audio, tiempos = self.descomprimir_rle_huffman(f, metadatos)
 
             nombre_base = os.path.splitext(ruta_comprimido)[0]
             ruta_descomprimido = nombre_base + "_descomprimido.wav"
@@ -375,10 +527,11 @@ class CompresorAudioOptimizado:
                 archivo_wav.setsampwidth(metadatos["sample_width"])
                 archivo_wav.setframerate(metadatos["frame_rate"])
 
-                if metadatos["sample_width"] == 1:
-                    frames_data = datos_audio.astype(np.uint8).tobytes()
-                else:
+                # Con 16 bits son muestras; con otros anchos, bytes sueltos
+                if metadatos["sample_width"] == 2:
                     frames_data = datos_audio.astype(np.int16).tobytes()
+                else:
+                    frames_data = datos_audio.astype(np.uint8).tobytes()
 
                 archivo_wav.writeframes(frames_data)
 
@@ -386,8 +539,8 @@ class CompresorAudioOptimizado:
 
             print("\n=== DESCOMPRESION COMPLETADA ===")
             print(f"Tiempo total: {tiempo_total:.2f}s")
-            print(f" - Decodificacion: {tiempo_decodificacion:.2f}s")
-            print(f" - RLE: {tiempo_rle:.2f}s")
+            for etapa, segundos in tiempos:
+                print(f" - {etapa}: {segundos:.2f}s")
             print(f"Muestras reconstruidas: {len(datos_audio):,}")
             print(f"Archivo: {ruta_descomprimido}")
 
@@ -429,39 +582,53 @@ class CompresorAudioOptimizado:
         # Verifica si esta reproduciendo
         return self.reproductor.esta_reproduciendo()
 
-    def _generar_codigos_huffman(self, nodo, codigo_actual=""):
-        if nodo is None:
-            return
-        if nodo.simbolo is not None:
-            self.codigos_huffman[nodo.simbolo] = codigo_actual
-            return
-        self._generar_codigos_huffman(nodo.izquierda, codigo_actual + "0")
-        self._generar_codigos_huffman(nodo.derecha, codigo_actual + "1")
-
-    def _serializar_arbol(self, nodo):
-        if nodo is None:
-            return None
-        if nodo.simbolo is not None:
-            return {
-                "simbolo": nodo.simbolo,
-                "frecuencia": nodo.frecuencia,
-                "hoja": True,
-            }
-        return {
-            "frecuencia": nodo.frecuencia,
-            "hoja": False,
-            "izquierda": self._serializar_arbol(nodo.izquierda),
-            "derecha": self._serializar_arbol(nodo.derecha),
-        }
-
-    def _reconstruir_arbol(self, arbol_serializado):
-        if arbol_serializado is None:
-            return None
-        if arbol_serializado.get("hoja", False):
-            return NodoHuffman(
-                arbol_serializado["simbolo"], arbol_serializado["frecuencia"]
-            )
-        nodo = NodoHuffman(frecuencia=arbol_serializado["frecuencia"])
-        nodo.izquierda = self._reconstruir_arbol(arbol_serializado["izquierda"])
-        nodo.derecha = self._reconstruir_arbol(arbol_serializado["derecha"])
-        return nodo
+    def _leer_encabezado(self, f):
+        # Lee los metadatos del .hac (formato compacto o pickle anterior)
+        encabezado = f.read(len(MAGIA_AUDIO) + 1)
+        if encabezado[: len(MAGIA_AUDIO)] != MAGIA_AUDIO:
+            f.seek(0)
+            metadatos = huffman_rapido.cargar_legado(f, CLASES_LEGADO)
+            metadatos["codec"] = CODEC_RLE_HUFFMAN
+            metadatos["version"] = 0
+            return metadatos
+
+        version = encabezado[-1]
+        if version != VERSION_AUDIO:
+            raise ValueError(f"Version de archivo no soportada: {version}")
+        metadatos = {"codec": f.read(1)[0], "version": version}
+        if metadatos["codec"] not in (CODEC_RLE_HUFFMAN, CODEC_PREDICTIVO):
+            raise ValueError(f"Codec de audio desconocido: {metadatos['codec']}")
+        for clave in ("canales", "sample_width", "frame_rate", "tamano_original"):
+            metadatos[clave] = huffman_rapido.leer_varint(f)
+        if metadatos["codec"] == CODEC_RLE_HUFFMAN:
+            metadatos["bits_validos"] = huffman_rapido.leer_varint(f)
+            tabla = huffman_rapido.leer_tabla(f)
+            metadatos["simbolos"], metadatos["longitudes"] = tabla
+        else:
+            metadatos["residuos"] = f.read(1)[0]
+            if metadatos["residuos"] not in prediccion.CODIFICADORES_RESIDUOS:
+                raise ValueError(
+                    f"Codificador de residuos desconocido: {metadatos['residuos']}"
+                )
+        return metadatos
+
+    def _codigos_de_arbol(self, arbol_serializado):
+        # (simbolos, codigos, longitudes) de las hojas de un arbol del formato
+        # anterior (pickle), recorrido sin recursion
+        hojas = []
+        pendientes = [(arbol_serializado, 0, 0)]
+        while pendientes:
+            nodo, codigo, longitud = pendientes.pop()
+            if nodo is None:
+                continue
+            if nodo.get("hoja", False):
+                hojas.append((int(nodo["simbolo"]), codigo, longitud))
+            else:
+                pendientes.append((nodo["izquierda"], codigo << 1, longitud + 1))
+                pendientes.append((nodo["derecha"], (codigo << 1) | 1, longitud + 1))
+        simbolos, codigos, longitudes = zip(*sorted(hojas)) if hojas else ([], [], [])
+        return (
+            np.array(simbolos, dtype=np.int64),
+            np.array(codigos, dtype=np.int64),
+            np.array(longitudes, dtype=np.int64),
+        )
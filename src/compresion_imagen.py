@@ -1,3 +1,769 @@
-# Este módulo ya no se utiliza directamente
-# La funcionalidad RLE está implementada en la interfaz gráfica (interfaz_grafica.py)
-# Se mantiene el archivo por compatibilidad, pero todas las funciones están duplicadas en la GUI
+import io
+import itertools
+import os
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from src import cuantizacion, huffman_rapido, paralelo, rango
+
+# Compresión RLE de imágenes vectorizada con NumPy.
+#
+# La imagen se recorre fila por fila como una sola secuencia de píxeles, en
+# su modo original (L, LA, RGB, RGBA, I;16...): cada píxel son sus bytes
+# tal como los guarda PIL, un canal por byte. El archivo guarda firma +
+# versión, el modo, la etapa de entropía y las dimensiones, y después dos
+# flujos separados: los colores de las ejecuciones (un canal detrás de
+# otro) y sus repeticiones - 1 como varints, así una ejecución corta ocupa
+# un byte y ninguna tiene límite de longitud. Cada flujo pasa por una
+# segunda etapa de entropía, elegida al comprimir y guardada en el
+# encabezado: el codificador por rangos (el más chico), Huffman canónico
+# (se decodifica más rápido) o ninguna. La descompresión mapea el archivo
+# en memoria (np.memmap) y expande las ejecuciones con np.repeat, sin leer
+# ejecución por ejecución.
+#
+# Las imágenes grandes se parten en teselas cuadradas de lado fijo que se
+# comprimen por separado (cada una con sus dos flujos) en un pool de
+# procesos; un índice al final del archivo guarda dónde empieza cada tesela,
+# así la descompresión también se reparte entre procesos y una región se
+# decodifica leyendo sólo las teselas que toca.
+#
+# Cada tesela se guarda también filtrada como en PNG: cada fila se reemplaza
+# por la diferencia con una predicción (el píxel de la izquierda, el de
+# arriba o el predictor de Paeth, canal por canal), eligiendo por fila el
+# filtro con menor suma de residuos en valor absoluto. Los residuos pasan
+# por RLE y los dos flujos por la etapa de entropía; se guarda la versión
+# más chica de las dos. La reconstrucción avanza por diagonales
+# (cada píxel depende sólo del de la izquierda, el de arriba y el de arriba
+# a la izquierda), así cada paso decodifica una diagonal entera con NumPy;
+# se hace de a FILAS_POR_RECONSTRUCCION filas, con la última fila del
+# bloque anterior como fila de arriba, así el búfer de diagonales no crece
+# con el alto de la tesela.
+#
+# Las teselas con pocos colores distintos (logos, íconos, capturas) se
+# guardan además con paleta: los colores una sola vez y las ejecuciones de
+# índices de 1 o 2 bytes, también por la etapa de entropía; se reconstruyen
+# expandiendo los índices y buscándolos en la paleta.
+#
+# Para miniaturas y vistas previas hay un modo con pérdida (ver
+# cuantizacion.py): antes de comprimir se reducen los colores y/o se funden
+# píxeles vecinos casi iguales, lo que alarga mucho las ejecuciones; el
+# archivo es igual a uno sin pérdida y se informa la PSNR del resultado.
+#
+# La descompresión avanza por bandas de FILAS_POR_BANDA filas: de cada
+# tesela se expanden sólo las ejecuciones de la banda (las filtradas se
+# expanden y reconstruyen de a FILAS_POR_RECONSTRUCCION filas), las bandas
+# de una fila de teselas se juntan en un búfer que se reutiliza y, si la
+# salida es PNG, cada banda se filtra y se comprime con zlib apenas está
+# lista; así la memoria depende del ancho de las teselas y no del de la
+# imagen.
+
+# Encabezado de los archivos .bin de imagen: firma + versión del formato
+MAGIA_IMAGEN = b"HIM"
+VERSION_IMAGEN = 1
+# Largo máximo del nombre del modo y bytes máximos del encabezado (firma,
+# versión, modo, etapa de entropía y tres varints)
+LARGO_MODO_MAX = 16
+ENCABEZADO_MAX = len(MAGIA_IMAGEN) + 3 + LARGO_MODO_MAX + 3 * 10
+# Modos que se guardan tal cual ("1" como "L", con un byte 0 o 255 por
+# píxel); los demás se convierten a RGB, o a RGBA si tienen transparencia
+MODOS_NATIVOS = ("1", "L", "LA", "RGB", "RGBA", "I;16", "I;16B", "I", "F")
+# Modos de 32 bits, que se guardan como estos tipos de NumPy (little-endian)
+# porque PIL los da en el orden de bytes de la máquina
+TIPOS_32_BITS = {"I": "<i4", "F": "<f4"}
+# Lado de las teselas, y píxeles a partir de los cuales comprimir_imagen
+# parte la imagen en teselas si no se le indica otra cosa
+LADO_TESELA = 1024
+PIXELES_SIN_TESELAS = 4 * LADO_TESELA * LADO_TESELA
+# Cola del archivo: posición del índice de teselas (8 bytes) + esta firma
+MAGIA_INDICE_IMAGEN = b"HIMI"
+# Etapa de entropía de los flujos de las teselas: ninguna (largo + bytes),
+# Huffman canónico o codificador por rangos
+ENTROPIA_NINGUNA = 0
+ENTROPIA_HUFFMAN = 1
+ENTROPIA_RANGOS = 2
+# Tipos de tesela: RLE directo, filtrada + RLE o paleta + RLE de índices
+TESELA_RLE = 0
+TESELA_FILTRADA = 1
+TESELA_PALETA = 2
+# Colores máximos de una paleta (índices de 2 bytes) y de una paleta con
+# índices de 1 byte
+PALETA_MAX = 1 << 16
+PALETA_CORTA_MAX = 1 << 8
+# Filtros de fila: predicción nula, píxel de la izquierda, píxel de arriba
+# y predictor de Paeth
+FILTRO_NINGUNO = 0
+FILTRO_IZQUIERDA = 1
+FILTRO_ARRIBA = 2
+FILTRO_PAETH = 3
+# Filas que se expanden por vez al descomprimir, y filas de una tesela
+# filtrada que se reconstruyen juntas (con menos las diagonales son más
+# cortas y hacen falta más pasos; con más crece el búfer de diagonales)
+FILAS_POR_BANDA = 64
+FILAS_POR_RECONSTRUCCION = 4 * FILAS_POR_BANDA
+# Salida PNG por bandas: firma, (profundidad, tipo de color) de cada modo,
+# número de filtro PNG de cada FILTRO_* y nivel de zlib
+FIRMA_PNG = b"\x89PNG\r\n\x1a\n"
+TIPOS_PNG = {
+    "1": (1, 0),
+    "L": (8, 0),
+    "LA": (8, 4),
+    "RGB": (8, 2),
+    "RGBA": (8, 6),
+    "I;16": (16, 0),
+    "I;16B": (16, 0),
+}
+FILTROS_PNG = np.array([0, 1, 2, 4], dtype=np.uint8)
+NIVEL_PNG = 6
+# Registro de una ejecución en el formato anterior (sin firma): color +
+# repeticiones en 2 bytes big-endian, después de ancho y alto (4 + 4 bytes)
+TIPO_EJECUCION_LEGADO = np.dtype([("color", "u1", 3), ("repeticiones", ">u2")])
+
+
+def _modo_de_bytes(modo):
+    # Modo de PIL con el que se guardan los bytes de los píxeles
+    return "L" if modo == "1" else modo
+
+
+def bytes_por_pixel(modo):
+    # Bytes por píxel (canales de un byte) con que se guarda un modo
+    return len(Image.new(_modo_de_bytes(modo), (1, 1)).tobytes())
+
+
+def _pixeles(imagen):
+    # (modo, matriz (alto, ancho, bytes por píxel) de la imagen)
+    if imagen.mode not in MODOS_NATIVOS:
+        transparente = "A" in imagen.getbands() or "transparency" in imagen.info
+        imagen = imagen.convert("RGBA" if transparente else "RGB")
+    modo = imagen.mode
+    ancho, alto = imagen.size
+    if modo in TIPOS_32_BITS:
+        datos = np.asarray(imagen).astype(TIPOS_32_BITS[modo]).tobytes()
+    else:
+        datos = imagen.convert(_modo_de_bytes(modo)).tobytes()
+    pixeles = np.frombuffer(datos, dtype=np.uint8)
+    return modo, pixeles.reshape(alto, ancho, bytes_por_pixel(modo))
+
+
+def _imagen(modo, pixeles):
+    # Inverso de _pixeles: imagen de PIL en el modo original
+    alto, ancho = pixeles.shape[:2]
+    if modo in TIPOS_32_BITS:
+        tipo = np.dtype(TIPOS_32_BITS[modo])
+        valores = np.ascontiguousarray(pixeles).view(tipo)[..., 0]
+        return Image.fromarray(valores.astype(tipo.newbyteorder("=")), modo)
+    imagen = Image.frombytes(_modo_de_bytes(modo), (ancho, alto), pixeles.tobytes())
+    return imagen.convert(modo) if modo != imagen.mode else imagen
+
+
+def _empaquetar(pixeles):
+    # Cada píxel (n, canales) como un entero (hasta 4 canales): comparar dos
+    # píxeles es una sola comparación
+    valores = np.zeros(len(pixeles), dtype=np.uint32)
+    for canal in range(pixeles.shape[1]):
+        valores <<= 8
+        valores |= pixeles[:, canal]
+    return valores
+
+
+def _desempaquetar(valores, canales):
+    # Inverso de _empaquetar: canales (canales, n), del primero al último
+    desplazamientos = 8 * np.arange(canales - 1, -1, -1, dtype=np.uint32)
+    return ((valores >> desplazamientos[:, None]) & 0xFF).astype(np.uint8)
+
+
+def _ejecuciones(valores):
+    # (inicio, repeticiones) de cada ejecución de valores iguales de un
+    # arreglo no vacío
+    cambios = np.empty(len(valores), dtype=bool)
+    cambios[0] = True
+    np.not_equal(valores[1:], valores[:-1], out=cambios[1:])
+    inicios = np.flatnonzero(cambios)
+    return inicios, np.diff(inicios, append=len(valores))
+
+
+def comprimir_rle(pixeles):
+    # Ejecuciones de píxeles iguales consecutivos: (colores, repeticiones)
+    canales = pixeles.shape[-1]
+    pixeles = pixeles.reshape(-1, canales)
+    if len(pixeles) == 0:
+        return np.empty((0, canales), dtype=np.uint8), np.empty(0, dtype=np.int64)
+    inicios, repeticiones = _ejecuciones(_empaquetar(pixeles))
+    return np.take(pixeles, inicios, axis=0), repeticiones
+
+
+def descomprimir_rle(colores, repeticiones):
+    # Inverso de comprimir_rle: píxeles (n, canales)
+    return np.repeat(colores, repeticiones, axis=0)
+
+
+def _paeth(a, b, c):
+    # Predictor de Paeth (izquierda, arriba, arriba a la izquierda) en int16
+    izquierda, arriba = a - c, b - c
+    pa, pb, pc = np.abs(arriba), np.abs(izquierda), np.abs(izquierda + arriba)
+    return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+
+def filtrar_filas(pixeles):
+    # (filtro de cada fila, residuos) de una matriz (alto, ancho, canales):
+    # se prueban todos los filtros a la vez y cada fila se queda con el de
+    # menor suma de residuos (como enteros con signo) en valor absoluto
+    x = pixeles.astype(np.int16)
+    a = np.zeros_like(x)
+    a[:, 1:] = x[:, :-1]
+    b = np.zeros_like(x)
+    b[1:] = x[:-1]
+    c = np.zeros_like(x)
+    c[1:, 1:] = x[:-1, :-1]
+    predicciones = np.stack([np.zeros_like(x), a, b, _paeth(a, b, c)])
+    residuos = (x - predicciones).astype(np.uint8)
+    costos = np.abs(residuos.view(np.int8).astype(np.int16)).sum(axis=(2, 3))
+    filtros = np.argmin(costos, axis=0)
+    return filtros.astype(np.uint8), residuos[filtros, np.arange(len(filtros))]
+
+
+def _reconstruir_bloque(filtros, residuos, anterior):
+    # Reconstruye unas filas diagonal por diagonal, con `anterior` como fila
+    # de arriba de la primera. La matriz se guarda desplazada y traspuesta:
+    # el píxel (y, x) va en [x + y + 1, y + 1], así la diagonal k es una
+    # fila contigua y sus vecinos están en las dos filas anteriores (con
+    # ceros en los bordes). Empieza con los residuos y cada diagonal se
+    # reemplaza por los píxeles reconstruidos; `anterior` va como una fila
+    # más sin filtro, que queda tal cual
+    filtros = np.concatenate([[FILTRO_NINGUNO], filtros])
+    residuos = np.concatenate([anterior[None], residuos])
+    alto, ancho, canales = residuos.shape
+    filas = np.arange(alto)[:, None]
+    columnas = filas + np.arange(ancho) + 1
+    pixeles = np.zeros((ancho + alto + 1, alto + 1, canales), dtype=np.int16)
+    pixeles[columnas, filas + 1] = residuos
+    ninguno = filtros == FILTRO_NINGUNO
+    arriba = (filtros == FILTRO_ARRIBA)[:, None]
+    paeth = (filtros == FILTRO_PAETH)[:, None]
+    paeth_acumulados = np.concatenate([[0], np.cumsum(filtros == FILTRO_PAETH)])
+    for k in range(1, ancho + alto):
+        primera, ultima = max(0, k - ancho), min(alto, k)
+        a = pixeles[k - 1, primera + 1 : ultima + 1]
+        b = pixeles[k - 1, primera:ultima]
+        prediccion = np.where(arriba[primera:ultima], b, a)
+        # El predictor de Paeth es lo más caro: sólo si alguna fila lo usa
+        if paeth_acumulados[ultima] > paeth_acumulados[primera]:
+            c = pixeles[k - 2, primera:ultima]
+            prediccion = np.where(paeth[primera:ultima], _paeth(a, b, c), prediccion)
+        prediccion[ninguno[primera:ultima]] = 0
+        diagonal = pixeles[k, primera + 1 : ultima + 1]
+        diagonal += prediccion
+        diagonal &= 0xFF
+    return pixeles[columnas[1:], filas[1:] + 1].astype(np.uint8)
+
+
+def reconstruir_filas(filtros, residuos, anterior=None):
+    # Inverso de filtrar_filas, de a FILAS_POR_RECONSTRUCCION filas (el
+    # búfer de diagonales depende del ancho y no del alto); `anterior` es la
+    # fila de arriba de la primera (ceros si no se da)
+    alto, ancho, canales = residuos.shape
+    if anterior is None:
+        anterior = np.zeros((ancho, canales), dtype=np.uint8)
+    pixeles = np.empty((alto, ancho, canales), dtype=np.uint8)
+    for fila in range(0, alto, FILAS_POR_RECONSTRUCCION):
+        bloque = slice(fila, fila + FILAS_POR_RECONSTRUCCION)
+        pixeles[bloque] = _reconstruir_bloque(
+            filtros[bloque], residuos[bloque], anterior
+        )
+        anterior = pixeles[bloque][-1]
+    return pixeles
+
+
+def _teselas(ancho, alto, lado):
+    # Rectángulos (izquierda, arriba, derecha, abajo) de las teselas, fila
+    # por fila; con lado 0 la imagen entera es una sola tesela
+    if lado == 0:
+        return [(0, 0, ancho, alto)]
+    return [
+        (izquierda, arriba, min(izquierda + lado, ancho), min(arriba + lado, alto))
+        for arriba in range(0, alto, lado)
+        for izquierda in range(0, ancho, lado)
+    ]
+
+
+def _escribir_flujo(f, datos, entropia):
+    # Un flujo de bytes (arreglo uint8) por la etapa de entropía
+    if entropia == ENTROPIA_RANGOS:
+        rango.escribir(f, datos, 256)
+    elif entropia == ENTROPIA_HUFFMAN:
+        huffman_rapido.escribir_flujo(f, datos)
+    else:
+        huffman_rapido.escribir_varint(f, len(datos))
+        f.write(np.asarray(datos, dtype=np.uint8).tobytes())
+
+
+def _leer_flujo(f, entropia):
+    if entropia == ENTROPIA_RANGOS:
+        return rango.leer(f, 256).astype(np.uint8)
+    if entropia == ENTROPIA_HUFFMAN:
+        return huffman_rapido.leer_flujo(f).astype(np.uint8)
+    n = huffman_rapido.leer_varint(f)
+    datos = np.frombuffer(f.read(n), dtype=np.uint8)
+    if len(datos) != n:
+        raise ValueError("Archivo truncado: faltan datos de la tesela")
+    return datos
+
+
+def _escribir_ejecuciones(f, colores, repeticiones, entropia):
+    # Los dos flujos de unas ejecuciones: colores (un canal detrás de otro) y
+    # los bytes de sus repeticiones - 1
+    repeticiones = huffman_rapido.empaquetar_varints(repeticiones - 1)
+    _escribir_flujo(f, colores.T.ravel(), entropia)
+    _escribir_flujo(f, np.frombuffer(repeticiones, dtype=np.uint8), entropia)
+
+
+def _tesela_rle(pixeles, entropia):
+    # Los dos flujos de las ejecuciones de píxeles
+    salida = io.BytesIO()
+    salida.write(bytes([TESELA_RLE]))
+    _escribir_ejecuciones(salida, *comprimir_rle(pixeles), entropia)
+    return salida.getvalue()
+
+
+def _tesela_filtrada(pixeles, entropia):
+    # Filtro de cada fila y los dos flujos de las ejecuciones de residuos
+    filtros, residuos = filtrar_filas(pixeles)
+    salida = io.BytesIO()
+    salida.write(bytes([TESELA_FILTRADA]))
+    salida.write(filtros.tobytes())
+    _escribir_ejecuciones(salida, *comprimir_rle(residuos), entropia)
+    return salida.getvalue()
+
+
+def _tesela_paleta(pixeles, entropia):
+    # Tres flujos: la paleta (un canal detrás de otro), los índices de las
+    # ejecuciones (1 byte, o 2 en dos planos: bajos y altos) y los bytes de
+    # sus repeticiones - 1; None si la tesela tiene más de PALETA_MAX colores
+    paleta, indices = np.unique(
+        _empaquetar(pixeles.reshape(-1, pixeles.shape[-1])), return_inverse=True
+    )
+    if len(paleta) > PALETA_MAX:
+        return None
+    inicios, repeticiones = _ejecuciones(indices.ravel())
+    indices = indices.ravel()[inicios]
+    if len(paleta) > PALETA_CORTA_MAX:
+        indices = np.concatenate([indices & 0xFF, indices >> 8])
+    repeticiones = huffman_rapido.empaquetar_varints(repeticiones - 1)
+    salida = io.BytesIO()
+    salida.write(bytes([TESELA_PALETA]))
+    paleta = _desempaquetar(paleta, pixeles.shape[-1]).ravel()
+    _escribir_flujo(salida, paleta, entropia)
+    _escribir_flujo(salida, indices.astype(np.uint8), entropia)
+    _escribir_flujo(salida, np.frombuffer(repeticiones, dtype=np.uint8), entropia)
+    return salida.getvalue()
+
+
+def _comprimir_tesela(pixeles, filtrar, entropia):
+    # Datos de una tesela: la versión más chica entre RLE directo, con
+    # paleta (si tiene pocos colores) y, con `filtrar`, filtrada; ante un
+    # empate gana la que se decodifica más rápido (se ejecuta en los
+    # procesos del pool)
+    candidatas = [_tesela_rle(pixeles, entropia)]
+    if pixeles.size:
+        candidatas.append(_tesela_paleta(pixeles, entropia))
+        if filtrar:
+            candidatas.append(_tesela_filtrada(pixeles, entropia))
+    return min((datos for datos in candidatas if datos is not None), key=len)
+
+
+def _escribir_indice(f, posiciones):
+    # Índice de teselas: cantidad y distancia de cada tesela a la anterior
+    # como varints, seguido de la cola con la posición del índice
+    inicio = f.tell()
+    huffman_rapido.escribir_varint(f, len(posiciones))
+    f.write(huffman_rapido.empaquetar_varints(np.diff(posiciones, prepend=0)))
+    f.write(inicio.to_bytes(8, "little") + MAGIA_INDICE_IMAGEN)
+
+
+def _con_perdida(modo, pixeles, colores, tolerancia):
+    # (píxeles cuantizados y/o fundidos, PSNR frente a los originales); en
+    # I;16 e I;16B cada píxel es un solo valor de 16 bits y no dos bytes.
+    # Los modos de 32 bits (enteros con signo o flotantes) no se cuantizan
+    if modo in TIPOS_32_BITS:
+        raise ValueError(f"El modo con pérdida no admite imágenes en modo {modo}")
+    if modo in ("I;16", "I;16B"):
+        valores, pico = pixeles.view("<u2" if modo == "I;16" else ">u2"), 0xFFFF
+    else:
+        valores, pico = pixeles, 0xFF
+    if colores:
+        aproximados = cuantizacion.cuantizar(valores, colores)
+    else:
+        aproximados = valores.copy()
+    if tolerancia:
+        cuantizacion.fundir(aproximados, tolerancia)
+    if modo == "1":
+        # Sólo blanco o negro: un gris se tramaría al volver a modo "1"
+        aproximados = np.where(aproximados >= 128, 255, 0).astype(np.uint8)
+    psnr = cuantizacion.psnr(valores, aproximados, pico)
+    return aproximados.view(np.uint8), psnr
+
+
+def comprimir_imagen(
+    ruta_entrada,
+    archivo_salida,
+    lado_tesela=None,
+    procesos=None,
+    filtrar=True,
+    entropia=ENTROPIA_RANGOS,
+    colores=None,
+    tolerancia=0,
+):
+    # Comprime una imagen (cualquier formato que abra PIL) y devuelve sus
+    # dimensiones, el modo guardado y la PSNR de lo guardado frente al
+    # original en dB (ancho, alto, modo, psnr; infinita si no hubo pérdida).
+    # Con `lado_tesela` la imagen se parte en teselas de ese lado (0: una
+    # sola tesela); por omisión sólo se parte si tiene más de
+    # PIXELES_SIN_TESELAS píxeles. Las teselas se comprimen con `procesos`
+    # procesos (por omisión, uno por núcleo). Sin `filtrar` no se prueban
+    # los filtros de fila (más rápido, pero peor en degradados y fotos).
+    # `entropia` es la etapa de entropía de los flujos (ENTROPIA_*). Con
+    # pérdida: `colores` reduce la imagen a esa cantidad de colores (corte
+    # mediano) y `tolerancia` funde cada píxel con el anterior de su fila si
+    # ningún canal difiere en más de eso
+    if entropia not in (ENTROPIA_NINGUNA, ENTROPIA_HUFFMAN, ENTROPIA_RANGOS):
+        raise ValueError(f"Etapa de entropía desconocida: {entropia}")
+    with Image.open(ruta_entrada) as imagen:
+        modo, pixeles = _pixeles(imagen)
+    psnr = float("inf")
+    if colores or tolerancia:
+        pixeles, psnr = _con_perdida(modo, pixeles, colores, tolerancia)
+    alto, ancho = pixeles.shape[:2]
+    if lado_tesela is None:
+        lado_tesela = LADO_TESELA if ancho * alto > PIXELES_SIN_TESELAS else 0
+    procesos = procesos or os.cpu_count() or 1
+    teselas = _teselas(ancho, alto, lado_tesela)
+    tareas = (
+        (pixeles[arriba:abajo, izquierda:derecha], filtrar, entropia)
+        for izquierda, arriba, derecha, abajo in teselas
+    )
+
+    with open(archivo_salida, "wb") as f:
+        f.write(MAGIA_IMAGEN + bytes([VERSION_IMAGEN]))
+        f.write(bytes([len(modo)]) + modo.encode("ascii") + bytes([entropia]))
+        for valor in (ancho, alto, lado_tesela):
+            huffman_rapido.escribir_varint(f, valor)
+        if procesos > 1 and len(teselas) > 1:
+            datos = paralelo.en_paralelo(_comprimir_tesela, tareas, procesos)
+        else:
+            datos = (_comprimir_tesela(*tarea) for tarea in tareas)
+        posiciones = []
+        for tesela in datos:
+            posiciones.append(f.tell())
+            f.write(tesela)
+        _escribir_indice(f, posiciones)
+    return ancho, alto, modo, psnr
+
+
+def _leer_legado(mapa):
+    # Formato anterior: ancho y alto (4 + 4 bytes) y registros de 5 bytes;
+    # un registro incompleto al final se ignora
+    ancho = int.from_bytes(mapa[:4].tobytes(), byteorder="big")
+    alto = int.from_bytes(mapa[4:8].tobytes(), byteorder="big")
+    n = (len(mapa) - 8) // TIPO_EJECUCION_LEGADO.itemsize
+    registros = mapa[8 : 8 + n * TIPO_EJECUCION_LEGADO.itemsize]
+    ejecuciones = registros.view(TIPO_EJECUCION_LEGADO)
+    return ancho, alto, ejecuciones["color"], ejecuciones["repeticiones"]
+
+
+def _leer_encabezado(mapa):
+    # (modo, etapa de entropía, ancho, alto, lado de las teselas)
+    encabezado = io.BytesIO(mapa[:ENCABEZADO_MAX].tobytes())
+    encabezado.seek(len(MAGIA_IMAGEN))
+    version = encabezado.read(1)[0]
+    if version != VERSION_IMAGEN:
+        raise ValueError(f"Versión de archivo de imagen no soportada: {version}")
+    modo = encabezado.read(encabezado.read(1)[0]).decode("ascii")
+    if modo not in MODOS_NATIVOS:
+        raise ValueError(f"Modo de imagen no soportado: {modo}")
+    entropia = encabezado.read(1)[0]
+    if entropia not in (ENTROPIA_NINGUNA, ENTROPIA_HUFFMAN, ENTROPIA_RANGOS):
+        raise ValueError(f"Etapa de entropía desconocida: {entropia}")
+    ancho, alto, lado = (huffman_rapido.leer_varint(encabezado) for _ in range(3))
+    return modo, entropia, ancho, alto, lado
+
+
+def _leer_indice(mapa, n_teselas):
+    # Posiciones de inicio y fin de cada tesela según el índice de la cola
+    cola = 8 + len(MAGIA_INDICE_IMAGEN)
+    final = mapa[-cola:].tobytes()
+    if len(mapa) < cola or final[8:] != MAGIA_INDICE_IMAGEN:
+        raise ValueError("Archivo de imagen sin índice de teselas")
+    inicio = int.from_bytes(final[:8], "little")
+    indice = mapa[inicio : len(mapa) - cola]
+    cantidad, usados = huffman_rapido.desempaquetar_varints(indice[:10], 1)
+    if cantidad[0] != n_teselas:
+        raise ValueError("Índice de teselas corrupto")
+    saltos, _ = huffman_rapido.desempaquetar_varints(indice[usados:], n_teselas)
+    posiciones = np.cumsum(saltos)
+    return posiciones, np.append(posiciones[1:], inicio)
+
+
+def _leer_ejecuciones(f, canales, entropia):
+    # Inverso de _escribir_ejecuciones: (colores, repeticiones)
+    colores = _leer_flujo(f, entropia)
+    n = len(colores) // canales
+    repeticiones, _ = huffman_rapido.desempaquetar_varints(_leer_flujo(f, entropia), n)
+    return colores.reshape(canales, n).T, repeticiones + 1
+
+
+def _leer_filtrada(datos, alto, canales, entropia):
+    # (filtros, colores, repeticiones) de los datos de una tesela filtrada
+    f = io.BytesIO(datos.tobytes())
+    filtros = np.frombuffer(f.read(alto), dtype=np.uint8)
+    if len(filtros) != alto:
+        raise ValueError("Archivo truncado: faltan filtros")
+    return (filtros, *_leer_ejecuciones(f, canales, entropia))
+
+
+def _leer_paleta(datos, canales, entropia):
+    # (paleta, índices, repeticiones) de los datos de una tesela con paleta
+    f = io.BytesIO(datos.tobytes())
+    paleta = _leer_flujo(f, entropia)
+    n_colores = len(paleta) // canales
+    indices = _leer_flujo(f, entropia)
+    if n_colores > PALETA_CORTA_MAX:
+        bajos, altos = indices.reshape(2, -1).astype(np.uint16)
+        indices = bajos | (altos << 8)
+    repeticiones, _ = huffman_rapido.desempaquetar_varints(
+        _leer_flujo(f, entropia), len(indices)
+    )
+    return paleta.reshape(canales, n_colores).T, indices, repeticiones + 1
+
+
+def _expandir(valores, fines, desde, hasta):
+    # Elementos desde..hasta de la expansión de unas ejecuciones, dados sus
+    # valores y la posición acumulada donde termina cada una
+    primera = np.searchsorted(fines, desde, "right")
+    ultima = np.searchsorted(fines, hasta - 1, "right") + 1
+    repeticiones = np.diff(np.minimum(fines[primera:ultima], hasta), prepend=desde)
+    return np.repeat(valores[primera:ultima], repeticiones, axis=0)
+
+
+def _bandas_de_ejecuciones(
+    valores, repeticiones, ancho, alto, canales, paleta=None, por_banda=FILAS_POR_BANDA
+):
+    # Genera las filas de unas ejecuciones de píxeles (o de índices de
+    # `paleta`) de a `por_banda`, expandiendo sólo las de cada banda
+    fines = np.cumsum(repeticiones, dtype=np.int64)
+    if (fines[-1] if len(fines) else 0) != ancho * alto:
+        raise ValueError("Archivo de imagen corrupto: faltan o sobran píxeles")
+    for fila in range(0, alto, por_banda):
+        filas = min(por_banda, alto - fila)
+        banda = _expandir(valores, fines, fila * ancho, (fila + filas) * ancho)
+        if paleta is not None:
+            banda = np.take(paleta, banda, axis=0)
+        yield banda.reshape(filas, ancho, canales)
+
+
+def _en_bandas(pixeles):
+    # Filas de una matriz ya decodificada de a FILAS_POR_BANDA
+    for fila in range(0, len(pixeles), FILAS_POR_BANDA):
+        yield pixeles[fila : fila + FILAS_POR_BANDA]
+
+
+def _bandas_filtradas(filtros, colores, repeticiones, ancho, alto, canales):
+    # Genera las filas de una tesela filtrada de a FILAS_POR_BANDA: los
+    # residuos se expanden y reconstruyen de a FILAS_POR_RECONSTRUCCION
+    # filas, cada bloque con la última fila del anterior como fila de arriba
+    anterior = None
+    fila = 0
+    for residuos in _bandas_de_ejecuciones(
+        colores, repeticiones, ancho, alto, canales, por_banda=FILAS_POR_RECONSTRUCCION
+    ):
+        pixeles = reconstruir_filas(
+            filtros[fila : fila + len(residuos)], residuos, anterior
+        )
+        anterior = pixeles[-1]
+        fila += len(pixeles)
+        yield from _en_bandas(pixeles)
+
+
+def _bandas_tesela(archivo_entrada, entropia, inicio, fin, ancho, alto, canales):
+    # Genera las filas de la tesela guardada entre `inicio` y `fin` de a
+    # FILAS_POR_BANDA
+    mapa = np.memmap(archivo_entrada, dtype=np.uint8, mode="r")
+    tipo, datos = mapa[inicio], mapa[inicio + 1 : fin]
+    if tipo == TESELA_RLE:
+        ejecuciones = _leer_ejecuciones(io.BytesIO(datos.tobytes()), canales, entropia)
+        bandas = _bandas_de_ejecuciones(*ejecuciones, ancho, alto, canales)
+    elif tipo == TESELA_PALETA:
+        paleta, indices, repeticiones = _leer_paleta(datos, canales, entropia)
+        bandas = _bandas_de_ejecuciones(
+            indices, repeticiones, ancho, alto, canales, paleta
+        )
+    elif tipo == TESELA_FILTRADA:
+        filtrada = _leer_filtrada(datos, alto, canales, entropia)
+        bandas = _bandas_filtradas(*filtrada, ancho, alto, canales)
+    else:
+        raise ValueError(f"Tipo de tesela desconocido: {tipo}")
+    del mapa, datos
+    yield from bandas
+
+
+def _descomprimir_tesela(*tesela):
+    # Tesela entera (se ejecuta en los procesos del pool)
+    return np.concatenate(list(_bandas_tesela(*tesela)))
+
+
+def _caja(caja, ancho, alto):
+    # (izquierda, arriba, derecha, abajo) de la región pedida, o de la imagen
+    # entera si no se pidió ninguna
+    izquierda, arriba, derecha, abajo = caja or (0, 0, ancho, alto)
+    if not (0 <= izquierda <= derecha <= ancho and 0 <= arriba <= abajo <= alto):
+        raise ValueError("La región no está dentro de la imagen")
+    return izquierda, arriba, derecha, abajo
+
+
+def _armar_bandas(caja, teselas, bandas_por_tesela, canales):
+    # Genera las filas de la región de a lo sumo FILAS_POR_BANDA, juntando
+    # las bandas de las teselas de cada fila de teselas en un mismo búfer
+    # que se reutiliza (cada banda vale hasta pedir la siguiente)
+    izquierda, arriba, derecha, abajo = caja
+    bufer = np.empty((FILAS_POR_BANDA, derecha - izquierda, canales), dtype=np.uint8)
+    bandas_por_tesela = iter(bandas_por_tesela)
+    for y0, fila_teselas in itertools.groupby(teselas, key=lambda tesela: tesela[1]):
+        fila_teselas = list(fila_teselas)
+        generadores = [next(bandas_por_tesela) for _ in fila_teselas]
+        fila = y0
+        for bandas in zip(*generadores):
+            filas = len(bandas[0])
+            # Parte de la banda que cae dentro de la región
+            ya, yb = max(fila, arriba), min(fila + filas, abajo)
+            if ya < yb:
+                for (x0, _, x1, _), banda in zip(fila_teselas, bandas):
+                    xa, xb = max(x0, izquierda), min(x1, derecha)
+                    bufer[: yb - ya, xa - izquierda : xb - izquierda] = banda[
+                        ya - fila : yb - fila, xa - x0 : xb - x0
+                    ]
+                yield bufer[: yb - ya]
+            fila += filas
+
+
+def _bandas_region(archivo_entrada, caja, procesos):
+    # (modo, ancho, alto, caja, bandas con las filas de la región),
+    # decodificando sólo las teselas que la tocan; sin `caja` la región es
+    # la imagen entera. En paralelo cada proceso decodifica teselas enteras
+    mapa = np.memmap(archivo_entrada, dtype=np.uint8, mode="r")
+    if mapa[: len(MAGIA_IMAGEN)].tobytes() != MAGIA_IMAGEN:
+        ancho, alto, colores, repeticiones = _leer_legado(mapa)
+        caja = _caja(caja, ancho, alto)
+        bandas = _bandas_de_ejecuciones(colores, repeticiones, ancho, alto, 3)
+        teselas = [(0, 0, ancho, alto)]
+        return "RGB", ancho, alto, caja, _armar_bandas(caja, teselas, [bandas], 3)
+
+    modo, entropia, ancho, alto, lado = _leer_encabezado(mapa)
+    canales = bytes_por_pixel(modo)
+    teselas = _teselas(ancho, alto, lado)
+    inicios, fines = _leer_indice(mapa, len(teselas))
+    del mapa
+
+    izquierda, arriba, derecha, abajo = caja = _caja(caja, ancho, alto)
+    elegidas = [
+        (tesela, int(inicio), int(fin))
+        for tesela, inicio, fin in zip(teselas, inicios, fines)
+        if tesela[0] < derecha
+        and tesela[2] > izquierda
+        and tesela[1] < abajo
+        and tesela[3] > arriba
+    ]
+    tareas = (
+        (archivo_entrada, entropia, inicio, fin, x1 - x0, y1 - y0, canales)
+        for (x0, y0, x1, y1), inicio, fin in elegidas
+    )
+    procesos = procesos or os.cpu_count() or 1
+    if procesos > 1 and len(elegidas) > 1:
+        bandas = map(
+            _en_bandas, paralelo.en_paralelo(_descomprimir_tesela, tareas, procesos)
+        )
+    else:
+        bandas = (_bandas_tesela(*tarea) for tarea in tareas)
+    teselas = [tesela for tesela, _, _ in elegidas]
+    return modo, ancho, alto, caja, _armar_bandas(caja, teselas, bandas, canales)
+
+
+def _leer_region(archivo_entrada, caja, procesos):
+    # (modo, píxeles de la región)
+    modo, _, _, caja, bandas = _bandas_region(archivo_entrada, caja, procesos)
+    izquierda, arriba, derecha, abajo = caja
+    pixeles = np.empty(
+        (abajo - arriba, derecha - izquierda, bytes_por_pixel(modo)), dtype=np.uint8
+    )
+    fila = 0
+    for banda in bandas:
+        pixeles[fila : fila + len(banda)] = banda
+        fila += len(banda)
+    return modo, pixeles
+
+
+def _escribir_trozo_png(f, tipo, datos):
+    f.write(struct.pack(">I", len(datos)) + tipo + datos)
+    f.write(struct.pack(">I", zlib.crc32(tipo + datos)))
+
+
+def _escribir_png(f, modo, ancho, alto, bandas):
+    # PNG escrito banda por banda: cada banda se filtra con filtrar_filas
+    # (los mismos filtros de PNG, con la última fila de la banda anterior
+    # como fila de arriba) y pasa por un compresor zlib incremental
+    profundidad, tipo_color = TIPOS_PNG[modo]
+    f.write(FIRMA_PNG)
+    encabezado = struct.pack(">IIBBBBB", ancho, alto, profundidad, tipo_color, 0, 0, 0)
+    _escribir_trozo_png(f, b"IHDR", encabezado)
+    compresor = zlib.compressobj(NIVEL_PNG)
+    anterior = None
+    for banda in bandas:
+        # Bytes de cada fila como los pide PNG: 1 bit por píxel en modo "1"
+        # y muestras de 16 bits big-endian en I;16 (I;16B ya lo está)
+        if modo == "1":
+            filas = np.packbits(banda[..., 0] != 0, axis=1)[..., None]
+        elif modo == "I;16":
+            filas = banda[..., ::-1]
+        else:
+            filas = banda
+        if anterior is None:
+            filtros, residuos = filtrar_filas(filas)
+        else:
+            filtros, residuos = filtrar_filas(np.concatenate([anterior, filas]))
+            filtros, residuos = filtros[1:], residuos[1:]
+        anterior = filas[-1:].copy()
+        datos = np.empty((len(filas), 1 + filas[0].size), dtype=np.uint8)
+        datos[:, 0] = FILTROS_PNG[filtros]
+        datos[:, 1:] = residuos.reshape(len(filas), -1)
+        comprimido = compresor.compress(datos.tobytes())
+        if comprimido:
+            _escribir_trozo_png(f, b"IDAT", comprimido)
+    _escribir_trozo_png(f, b"IDAT", compresor.flush())
+    _escribir_trozo_png(f, b"IEND", b"")
+
+
+def descomprimir_imagen(archivo_entrada, archivo_salida, procesos=None):
+    # Reconstruye la imagen de un .bin y la guarda (el formato sale de la
+    # extensión de `archivo_salida`, que tiene que admitir el modo); devuelve
+    # (ancho, alto, modo). Las teselas se decodifican con `procesos`
+    # procesos. Un .png se escribe banda por banda sin tener nunca la imagen
+    # entera en memoria; los demás formatos se guardan con PIL
+    if os.path.splitext(archivo_salida)[1].lower() == ".png":
+        modo, ancho, alto, _, bandas = _bandas_region(archivo_entrada, None, procesos)
+        if modo not in TIPOS_PNG:
+            raise ValueError(f"PNG no admite imágenes en modo {modo} (usar .tif)")
+        with open(archivo_salida, "wb") as f:
+            _escribir_png(f, modo, ancho, alto, bandas)
+    else:
+        modo, pixeles = _leer_region(archivo_entrada, None, procesos)
+        alto, ancho = pixeles.shape[:2]
+        _imagen(modo, pixeles).save(archivo_salida)
+    return ancho, alto, modo
+
+
+def leer_region_imagen(archivo_entrada, caja, procesos=None):
+    # Imagen (PIL) con la región `caja` = (izquierda, arriba, derecha,
+    # abajo) de un .bin, como Image.crop; sólo se decodifican las teselas
+    # que la tocan
+    modo, pixeles = _leer_region(archivo_entrada, tuple(caja), procesos)
+    return _imagen(modo, pixeles)
@@ -1,6 +1,45 @@
 import heapq
-import pickle
-from collections import defaultdict
+import io
+import os
+import zlib
+
+import numpy as np
+
+from src import huffman_rapido, lz77, paralelo, rango
+
+# Encabezado de los archivos .bin: firma + versión del formato
+MAGIA_TEXTO = b"HTX"
+VERSION_TEXTO = 1
+# Modos: los símbolos son puntos de código Unicode o los bytes del archivo
+MODO_CARACTERES = 0
+MODO_BYTES = 1
+TIPOS_MODO = {MODO_CARACTERES: np.uint32, MODO_BYTES: np.uint8}
+# Símbolos por bloque: cada bloque se comprime por separado, así la memoria
+# usada no depende del tamaño del archivo
+SIMBOLOS_POR_BLOQUE = 1 << 21
+# Tipos de trama del formato por bloques
+TRAMA_FIN = 0
+TRAMA_TABLA_NUEVA = 1
+TRAMA_TABLA_ANTERIOR = 2
+TRAMA_LZ = 3
+TRAMA_RANGO = 4
+TRAMA_TABLA_DICCIONARIO = 5
+TRAMA_LZ_DICCIONARIO = 6
+# Cola del archivo: posición del índice de bloques (8 bytes) + esta firma
+MAGIA_INDICE = b"HTXI"
+# Salto de línea (para contar líneas por bloque en el índice)
+SALTO_DE_LINEA = ord("\n")
+# Archivos de diccionario: firma + versión del formato
+MAGIA_DICCIONARIO = b"HTXD"
+VERSION_DICCIONARIO = 1
+# Bytes de contenido de un diccionario (lo que LZ puede copiar), tamaño de
+# los segmentos que se eligen para armarlo y de los fragmentos que se
+# cuentan para puntuarlos
+TAMANO_DICCIONARIO = 1 << 15
+TAMANO_SEGMENTO = 64
+TAMANO_FRAGMENTO = 8
+# Clases que puede contener un .bin del formato anterior (pickle)
+CLASES_LEGADO = {("builtins", "bytearray")}
 
 
 class Nodo:
@@ -40,67 +79,827 @@ def generar_codigos(nodo, prefijo="", codigos=None):
     return codigos
 
 
-def comprimir_texto(texto, archivo_salida="comprimido.bin"):
-    # 1. Frecuencias
-    freqs = defaultdict(int)
-    for c in texto:
-        freqs[c] += 1
+def _codigos_como_enteros(codigos):
+    # Alfabeto (puntos de código) y códigos como enteros + longitudes
+    alfabeto = list(codigos)
+    puntos = np.array([ord(c) for c in alfabeto], dtype=np.uint32)
+    enteros = [int(codigos[c], 2) if codigos[c] else 0 for c in alfabeto]
+    longitudes = [len(codigos[c]) for c in alfabeto]
+    return puntos, enteros, longitudes
+
+
+def _puntos_de_codigo(texto):
+    return np.frombuffer(texto.encode("utf-32-le"), dtype=np.uint32)
+
+
+def _construir_tabla(conteos):
+    # Árbol -> longitudes de código -> códigos canónicos, con un índice
+    # símbolo -> posición en el alfabeto
+    alfabeto = np.flatnonzero(conteos)
+    raiz = construir_arbol({p: int(conteos[p]) for p in alfabeto.tolist()})
+    longitudes_arbol = {p: len(codigo) for p, codigo in generar_codigos(raiz).items()}
+    longitudes = np.array(
+        [max(longitudes_arbol[p], 1) for p in alfabeto.tolist()], dtype=np.int64
+    )
+    if longitudes.max() > huffman_rapido.LONGITUD_MAXIMA:
+        # Códigos demasiado largos para la tabla directa del decodificador
+        longitudes = huffman_rapido.longitudes_limitadas(conteos[alfabeto])
+    return _tabla(alfabeto, longitudes)
+
+
+def _tabla(alfabeto, longitudes):
+    # (alfabeto, longitudes, códigos canónicos, índice símbolo -> posición
+    # en el alfabeto)
+    tipo = np.uint8 if len(alfabeto) <= 256 else np.uint16
+    indice = np.zeros(int(alfabeto[-1]) + 1, dtype=tipo)
+    indice[alfabeto] = np.arange(len(alfabeto))
+    return alfabeto, longitudes, huffman_rapido.codigos_canonicos(longitudes), indice
+
+
+def _costo_con_tabla(conteos, tabla):
+    # Bits que ocuparía el bloque con una tabla ya existente (None si le
+    # faltan símbolos)
+    alfabeto, longitudes, _, indice = tabla
+    presentes = np.flatnonzero(conteos)
+    if presentes[-1] >= len(indice):
+        return None
+    posiciones = indice[presentes]
+    if not np.array_equal(alfabeto[posiciones], presentes):
+        return None
+    return int(conteos[presentes] @ longitudes[posiciones])
+
+
+def _trama_bloque(simbolos, tabla_anterior):
+    # Trama con el bloque comprimido; reutiliza la tabla anterior si el
+    # resultado no es más grande que guardar una tabla nueva
+    conteos = np.bincount(simbolos)
+
+    tabla = _construir_tabla(conteos)
+    encabezado = io.BytesIO()
+    huffman_rapido.escribir_tabla(encabezado, tabla[0], tabla[1])
+    costo_nuevo = _costo_con_tabla(conteos, tabla) + 8 * len(encabezado.getbuffer())
+    if tabla_anterior is not None:
+        costo_anterior = _costo_con_tabla(conteos, tabla_anterior)
+        if costo_anterior is not None and costo_anterior <= costo_nuevo:
+            tabla = tabla_anterior
+
+    _, longitudes, enteros, indice = tabla
+    datos, n_bits = huffman_rapido.codificar(indice[simbolos], enteros, longitudes)
+
+    trama = io.BytesIO()
+    if tabla is tabla_anterior:
+        trama.write(bytes([TRAMA_TABLA_ANTERIOR]))
+    else:
+        trama.write(bytes([TRAMA_TABLA_NUEVA]))
+        trama.write(encabezado.getbuffer())
+    huffman_rapido.escribir_varint(trama, n_bits)
+    trama.write(datos)
+    return trama.getvalue(), tabla
+
+
+def _literales(tipo):
+    # Valores posibles de un literal: bytes o puntos de código Unicode
+    return 1 << 8 if np.dtype(tipo) == np.uint8 else 0x110000
+
+
+def _escribir_flujo(f, valores):
+    # Flujo de enteros no negativos con su propia tabla Huffman
+    if len(valores) == 0:
+        huffman_rapido.escribir_tabla(f, [], [])
+        huffman_rapido.escribir_varint(f, 0)
+        return
+    alfabeto, longitudes, enteros, indice = _construir_tabla(np.bincount(valores))
+    huffman_rapido.escribir_tabla(f, alfabeto, longitudes)
+    datos, n_bits = huffman_rapido.codificar(indice[valores], enteros, longitudes)
+    huffman_rapido.escribir_varint(f, n_bits)
+    f.write(datos)
+
+
+def _trama_lz(simbolos, ventana, profundidad):
+    # Trama LZ: literales/longitudes y distancias (cada flujo con su tabla
+    # Huffman) más los bits extra
+    litlen, distancias, datos_extra, n_bits_extra = lz77.analizar(
+        simbolos, _literales(simbolos.dtype), ventana, profundidad
+    )
+    trama = io.BytesIO()
+    trama.write(bytes([TRAMA_LZ]))
+    _escribir_flujo(trama, litlen)
+    _escribir_flujo(trama, distancias)
+    huffman_rapido.escribir_varint(trama, n_bits_extra)
+    trama.write(datos_extra)
+    return trama.getvalue()
+
+
+def _trama_rango(simbolos):
+    # Trama con el codificador por rangos: alfabeto del bloque e índices de
+    # símbolo; si el alfabeto no entra en sus frecuencias se usa Huffman
+    conteos = np.bincount(simbolos)
+    alfabeto = np.flatnonzero(conteos)
+    if len(alfabeto) > rango.ALFABETO_MAX:
+        return _trama_bloque(simbolos, None)[0]
+    indice = np.zeros(len(conteos), dtype=np.int64)
+    indice[alfabeto] = np.arange(len(alfabeto))
+
+    trama = io.BytesIO()
+    trama.write(bytes([TRAMA_RANGO]))
+    huffman_rapido.escribir_valores(trama, alfabeto)
+    rango.escribir(trama, indice[simbolos], len(alfabeto))
+    return trama.getvalue()
+
+
+def _codificar_con_tabla(f, valores, tabla):
+    # n_bits + datos de `valores` con una tabla ya conocida por el lector
+    _, longitudes, enteros, indice = tabla
+    datos, n_bits = huffman_rapido.codificar(indice[valores], enteros, longitudes)
+    huffman_rapido.escribir_varint(f, n_bits)
+    f.write(datos)
+
 
-    # 2. Árbol y códigos
-    raiz = construir_arbol(freqs)
-    codigos = generar_codigos(raiz)
+def _trama_con_diccionario(simbolos, diccionario, opciones_lz):
+    # Trama que usa las tablas del diccionario (y con LZ su contenido) en
+    # lugar de guardar las propias; sólo lleva el ID del diccionario
+    trama = io.BytesIO()
+    if opciones_lz is None:
+        trama.write(bytes([TRAMA_TABLA_DICCIONARIO]))
+        trama.write(diccionario.identificador.to_bytes(4, "little"))
+        _codificar_con_tabla(trama, simbolos, diccionario.tabla)
+        return trama.getvalue()
 
-    # 3. Codificar el texto
-    bits = "".join(codigos[c] for c in texto)
+    ventana, profundidad = opciones_lz
+    litlen, distancias, datos_extra, n_bits_extra = lz77.analizar(
+        simbolos, 1 << 8, ventana, profundidad, diccionario.contenido
+    )
+    trama.write(bytes([TRAMA_LZ_DICCIONARIO]))
+    trama.write(diccionario.identificador.to_bytes(4, "little"))
+    _codificar_con_tabla(trama, litlen, diccionario.tabla_litlen)
+    _codificar_con_tabla(trama, distancias, diccionario.tabla_distancias)
+    huffman_rapido.escribir_varint(trama, n_bits_extra)
+    trama.write(datos_extra)
+    return trama.getvalue()
 
-    # 4. Padding a múltiplo de 8
-    extra_padding = 8 - len(bits) % 8
-    bits += "0" * extra_padding
-    padded_info = "{0:08b}".format(extra_padding)
-    bits = padded_info + bits
 
-    # 5. Convertir a bytes
-    b = bytearray()
-    for i in range(0, len(bits), 8):
-        byte = bits[i : i + 8]
-        b.append(int(byte, 2))
+def _codificador(lz, por_rangos, ventana, profundidad, diccionario=None):
+    # Trama autónoma a usar por bloque según las opciones (None: Huffman
+    # encadenando tablas)
+    if lz and por_rangos:
+        raise ValueError("LZ y el codificador por rangos no se pueden combinar")
+    if diccionario is not None:
+        if por_rangos:
+            raise ValueError("El codificador por rangos no usa diccionarios")
+        opciones_lz = (ventana, profundidad) if lz else None
+        return _trama_con_diccionario, diccionario, opciones_lz
+    if lz:
+        return _trama_lz, ventana, profundidad
+    if por_rangos:
+        return (_trama_rango,)
+    return None
 
-    # 6. Guardar en binario (pickle guarda codigos + data)
+
+def _trama_independiente(simbolos, codificador):
+    # Trama que no depende de otras (se ejecuta en los procesos del pool)
+    if codificador is None:
+        return _trama_bloque(simbolos, None)[0]
+    funcion, *argumentos = codificador
+    return funcion(simbolos, *argumentos)
+
+
+def _medidas(simbolos):
+    # (bytes originales, saltos de línea) de un bloque, para el índice; en
+    # modo caracteres se cuentan los bytes UTF-8 de cada punto de código
+    n_bytes = len(simbolos)
+    if simbolos.dtype != np.uint8:
+        for limite in (0x80, 0x800, 0x10000):
+            n_bytes += int(np.count_nonzero(simbolos >= limite))
+    return n_bytes, int(np.count_nonzero(simbolos == SALTO_DE_LINEA))
+
+
+def _trama_con_medidas(simbolos, codificador):
+    # (trama independiente, medidas del bloque), para el pool de procesos
+    return _trama_independiente(simbolos, codificador), _medidas(simbolos)
+
+
+def _tramas_secuenciales(bloques, codificador):
+    # Genera (trama, tabla, medidas) encadenando cada bloque con la tabla del
+    # anterior
+    tabla = None
+    for simbolos in bloques:
+        if codificador is None:
+            trama, tabla = _trama_bloque(simbolos, tabla)
+        else:
+            trama = _trama_independiente(simbolos, codificador)
+        yield trama, tabla, _medidas(simbolos)
+
+
+def _escribir_indice(f, indice):
+    # Índice de bloques: (posición de la trama, distancia a la trama con su
+    # tabla, bytes originales, saltos de línea) como varints, seguido de la
+    # cola con la posición del índice
+    inicio = f.tell()
+    huffman_rapido.escribir_varint(f, len(indice))
+    anterior = 0
+    for posicion, posicion_tabla, n_bytes, n_lineas in indice:
+        huffman_rapido.escribir_varint(f, posicion - anterior)
+        huffman_rapido.escribir_varint(f, posicion - posicion_tabla)
+        huffman_rapido.escribir_varint(f, n_bytes)
+        huffman_rapido.escribir_varint(f, n_lineas)
+        anterior = posicion
+    f.write(inicio.to_bytes(8, "little") + MAGIA_INDICE)
+
+
+def _escribir_tramas(f, tramas, modo):
+    # Firma + modo + una trama por bloque + trama de fin + índice; devuelve
+    # la última tabla usada. Con un solo bloque no hay nada que saltear y el
+    # índice se omite (el archivo termina en la trama de fin y los lectores
+    # lo recorren en orden)
+    f.write(MAGIA_TEXTO + bytes([VERSION_TEXTO, modo]))
+    indice = []
+    tabla = posicion_tabla = None
+    for trama, tabla, medidas in tramas:
+        posicion = f.tell()
+        if trama[0] != TRAMA_TABLA_ANTERIOR:
+            posicion_tabla = posicion
+        indice.append((posicion, posicion_tabla, *medidas))
+        f.write(trama)
+    f.write(bytes([TRAMA_FIN]))
+    if len(indice) > 1:
+        _escribir_indice(f, indice)
+    return tabla
+
+
+def _bloques_de_archivo(f, simbolos_por_bloque, modo):
+    # Lee un archivo abierto por bloques de símbolos: bytes (archivo binario)
+    # o caracteres (archivo de texto)
+    while True:
+        bloque = f.read(simbolos_por_bloque)
+        if not bloque:
+            return
+        if modo == MODO_BYTES:
+            yield np.frombuffer(bloque, dtype=np.uint8)
+        else:
+            yield _puntos_de_codigo(bloque)
+
+
+def comprimir_texto(
+    texto, archivo_salida="comprimido.bin", lz=False, por_rangos=False, diccionario=None
+):
+    # Con `diccionario` (ruta o el resultado de cargar_diccionario) el texto
+    # se comprime como bytes UTF-8 con las tablas del diccionario
+    diccionario = _diccionario(diccionario)
+    if diccionario is None:
+        modo = MODO_CARACTERES
+        bloques = (
+            _puntos_de_codigo(texto[inicio : inicio + SIMBOLOS_POR_BLOQUE])
+            for inicio in range(0, len(texto), SIMBOLOS_POR_BLOQUE)
+        )
+    else:
+        modo = MODO_BYTES
+        datos = np.frombuffer(texto.encode("utf-8"), dtype=np.uint8)
+        bloques = (
+            datos[inicio : inicio + SIMBOLOS_POR_BLOQUE]
+            for inicio in range(0, len(datos), SIMBOLOS_POR_BLOQUE)
+        )
+    codificador = _codificador(
+        lz, por_rangos, lz77.VENTANA, lz77.PROFUNDIDAD, diccionario
+    )
     with open(archivo_salida, "wb") as f:
-        pickle.dump((codigos, b), f)
+        tramas = _tramas_secuenciales(bloques, codificador)
+        tabla = _escribir_tramas(f, tramas, modo)
 
     print(f"Texto comprimido y guardado en {archivo_salida}")
-    return codigos
+    # Códigos de la última tabla usada (la única si el texto cabe en un bloque)
+    if tabla is None:
+        return {}
+    alfabeto, longitudes, enteros, _ = tabla
+    return {
+        chr(p): format(int(c), f"0{l}b")
+        for p, c, l in zip(alfabeto.tolist(), enteros, longitudes.tolist())
+    }
+
+
+def comprimir_archivo_texto(
+    archivo_entrada,
+    archivo_salida,
+    simbolos_por_bloque=SIMBOLOS_POR_BLOQUE,
+    procesos=None,
+    modo=MODO_BYTES,
+    lz=False,
+    ventana=lz77.VENTANA,
+    profundidad=lz77.PROFUNDIDAD,
+    por_rangos=False,
+    diccionario=None,
+):
+    # Comprime un archivo bloque a bloque sin cargarlo entero; con varios
+    # procesos cada bloque se comprime en paralelo con tabla propia. En modo
+    # bytes el alfabeto son los 256 valores de byte y el archivo no necesita
+    # ser UTF-8 válido. Con `lz` cada bloque pasa antes por LZ77 (ventana y
+    # profundidad de la cadena de hash configurables); con `por_rangos` se
+    # usa el codificador por rangos de orden 0/1 en lugar de Huffman; con
+    # `diccionario` (sólo en modo bytes) se usan sus tablas y su contenido
+    procesos = procesos or os.cpu_count() or 1
+    diccionario = _diccionario(diccionario)
+    if diccionario is not None and modo != MODO_BYTES:
+        raise ValueError("Los diccionarios sólo se usan en modo bytes")
+    codificador = _codificador(lz, por_rangos, ventana, profundidad, diccionario)
+    varios_bloques = (
+        procesos > 1 and os.path.getsize(archivo_entrada) > simbolos_por_bloque
+    )
+    if modo == MODO_BYTES:
+        entrada = open(archivo_entrada, "rb")
+    else:
+        entrada = open(archivo_entrada, "r", encoding="utf-8", newline="")
+    with entrada:
+        bloques = _bloques_de_archivo(entrada, simbolos_por_bloque, modo)
+        if varios_bloques:
+            tareas = ((simbolos, codificador) for simbolos in bloques)
+            tramas = (
+                (trama, None, medidas)
+                for trama, medidas in paralelo.en_paralelo(
+                    _trama_con_medidas, tareas, procesos
+                )
+            )
+        else:
+            tramas = _tramas_secuenciales(bloques, codificador)
+        with open(archivo_salida, "wb") as salida:
+            _escribir_tramas(salida, tramas, modo)
+
+    print(f"Texto comprimido y guardado en {archivo_salida}")
+
+
+def _leer_tabla(f, tipo):
+    # Tabla canónica guardada -> (alfabeto, codigos, longitudes)
+    alfabeto, longitudes = huffman_rapido.leer_tabla(f)
+    enteros = huffman_rapido.codigos_canonicos(longitudes)
+    return alfabeto.astype(tipo), enteros, longitudes
+
+
+def _leer_datos(f, n_bits):
+    datos = f.read((n_bits + 7) // 8)
+    if len(datos) * 8 < n_bits:
+        raise ValueError("Archivo truncado: faltan datos del bloque")
+    return datos
+
+
+def _leer_encabezado(f):
+    # Firma, versión y modo -> (versión, tipo de los símbolos); versión 0 si
+    # es el formato anterior sin firma
+    encabezado = f.read(len(MAGIA_TEXTO) + 1)
+    if encabezado[: len(MAGIA_TEXTO)] != MAGIA_TEXTO:
+        return 0, np.uint32
+    version = encabezado[-1]
+    if version != VERSION_TEXTO:
+        raise ValueError(f"Versión de archivo no soportada: {version}")
+    modo = f.read(1)
+    if not modo or modo[0] not in TIPOS_MODO:
+        raise ValueError("Modo de archivo no válido")
+    return version, TIPOS_MODO[modo[0]]
+
+
+def _leer_bloques(f, diccionario=None):
+    # Genera los símbolos decodificados de cada bloque
+    version, tipo = _leer_encabezado(f)
+    if version == 0:
+        # Formato anterior: pickle de (codigos, bytes con padding al inicio)
+        f.seek(0)
+        codigos, b = huffman_rapido.cargar_legado(f, CLASES_LEGADO)
+        alfabeto, enteros, longitudes = _codigos_como_enteros(codigos)
+        n_bits = (len(b) - 1) * 8 - b[0]
+        indices = huffman_rapido.decodificar(bytes(b[1:]), n_bits, enteros, longitudes)
+        yield alfabeto[indices]
+        return
 
+    tabla = None
+    while True:
+        trama = _leer_trama(f, tabla, tipo, diccionario)
+        if trama is None:
+            return
+        tabla, simbolos = trama
+        yield simbolos
 
-def descomprimir_texto(archivo_entrada="comprimido.bin", archivo_salida="salida.txt"):
+
+def _leer_flujo(f):
+    # Inverso de _escribir_flujo
+    alfabeto, enteros, longitudes = _leer_tabla(f, np.int64)
+    n_bits = huffman_rapido.leer_varint(f)
+    datos = _leer_datos(f, n_bits)
+    return alfabeto[huffman_rapido.decodificar(datos, n_bits, enteros, longitudes)]
+
+
+def _leer_con_tabla(f, tabla, decodificacion, tipo):
+    # Inverso de _codificar_con_tabla (`decodificacion` es la tabla de
+    # decodificación ya armada del diccionario)
+    alfabeto, longitudes, enteros, _ = tabla
+    n_bits = huffman_rapido.leer_varint(f)
+    datos = _leer_datos(f, n_bits)
+    indices = huffman_rapido.decodificar(
+        datos, n_bits, enteros, longitudes, tabla=decodificacion
+    )
+    return alfabeto.astype(tipo)[indices]
+
+
+def _comprobar_diccionario(f, diccionario):
+    # Lee el ID de una trama con diccionario y comprueba que sea el recibido
+    identificador = int.from_bytes(f.read(4), "little")
+    if diccionario is None or diccionario.identificador != identificador:
+        raise ValueError(f"El archivo necesita el diccionario {identificador:08x}")
+
+
+def _leer_trama(f, tabla, tipo, diccionario=None):
+    # Lee y decodifica una trama: (tabla vigente, símbolos), o None en la
+    # trama de fin
+    tipo_trama = f.read(1)
+    if not tipo_trama:
+        raise ValueError("Archivo truncado: falta la trama de fin")
+    if tipo_trama[0] == TRAMA_FIN:
+        return None
+    if tipo_trama[0] == TRAMA_LZ:
+        litlen = _leer_flujo(f)
+        distancias = _leer_flujo(f)
+        datos_extra = _leer_datos(f, huffman_rapido.leer_varint(f))
+        simbolos = lz77.reconstruir(
+            litlen, distancias, datos_extra, _literales(tipo), tipo
+        )
+        return tabla, simbolos
+    if tipo_trama[0] == TRAMA_RANGO:
+        alfabeto = huffman_rapido.leer_valores(f).astype(tipo)
+        return tabla, alfabeto[rango.leer(f, len(alfabeto))]
+    if tipo_trama[0] == TRAMA_TABLA_DICCIONARIO:
+        _comprobar_diccionario(f, diccionario)
+        simbolos = _leer_con_tabla(
+            f, diccionario.tabla, diccionario.decodificacion, tipo
+        )
+        return tabla, simbolos
+    if tipo_trama[0] == TRAMA_LZ_DICCIONARIO:
+        _comprobar_diccionario(f, diccionario)
+        litlen = _leer_con_tabla(
+            f, diccionario.tabla_litlen, diccionario.decodificacion_litlen, np.int64
+        )
+        distancias = _leer_con_tabla(
+            f,
+            diccionario.tabla_distancias,
+            diccionario.decodificacion_distancias,
+            np.int64,
+        )
+        datos_extra = _leer_datos(f, huffman_rapido.leer_varint(f))
+        simbolos = lz77.reconstruir(
+            litlen, distancias, datos_extra, 1 << 8, tipo, diccionario.contenido
+        )
+        return tabla, simbolos
+    if tipo_trama[0] == TRAMA_TABLA_NUEVA:
+        tabla = _leer_tabla(f, tipo)
+    elif tipo_trama[0] != TRAMA_TABLA_ANTERIOR or tabla is None:
+        raise ValueError(f"Trama no válida: {tipo_trama[0]}")
+    alfabeto, enteros, longitudes = tabla
+    n_bits = huffman_rapido.leer_varint(f)
+    datos = _leer_datos(f, n_bits)
+    indices = huffman_rapido.decodificar(datos, n_bits, enteros, longitudes)
+    return tabla, alfabeto[indices]
+
+
+def _leer_indice(f):
+    # (lista de (posición de la trama, posición de su tabla, bytes
+    # originales, saltos de línea), tipo de los símbolos), o None si el
+    # archivo no tiene índice de bloques
+    f.seek(0)
+    version, tipo = _leer_encabezado(f)
+    cola = 8 + len(MAGIA_INDICE)
+    tamano = f.seek(0, os.SEEK_END)
+    if version == 0 or tamano < len(MAGIA_TEXTO) + 1 + cola:
+        return None
+    f.seek(tamano - cola)
+    final = f.read(cola)
+    if final[8:] != MAGIA_INDICE:
+        return None
+
+    f.seek(int.from_bytes(final[:8], "little"))
+    indice = []
+    posicion = 0
+    for _ in range(huffman_rapido.leer_varint(f)):
+        posicion += huffman_rapido.leer_varint(f)
+        posicion_tabla = posicion - huffman_rapido.leer_varint(f)
+        n_bytes = huffman_rapido.leer_varint(f)
+        n_lineas = huffman_rapido.leer_varint(f)
+        indice.append((posicion, posicion_tabla, n_bytes, n_lineas))
+    return indice, tipo
+
+
+def _bytes_de_simbolos(simbolos):
+    # Bytes originales de un bloque (UTF-8 en modo caracteres)
+    if simbolos.dtype == np.uint8:
+        return simbolos.tobytes()
+    return simbolos.tobytes().decode("utf-32-le").encode("utf-8")
+
+
+def _decodificar_trama(f, posicion, posicion_tabla, tipo, diccionario=None):
+    # Bytes originales de un bloque suelto a partir del índice
+    tabla = None
+    if posicion_tabla != posicion:
+        f.seek(posicion_tabla + 1)
+        tabla = _leer_tabla(f, tipo)
+    f.seek(posicion)
+    _, simbolos = _leer_trama(f, tabla, tipo, diccionario)
+    return _bytes_de_simbolos(simbolos)
+
+
+def _descomprimir_trama(archivo_entrada, posicion, posicion_tabla, tipo, diccionario):
+    # Decodifica un bloque suelto (se ejecuta en los procesos del pool)
+    with open(archivo_entrada, "rb") as f:
+        return _decodificar_trama(f, posicion, posicion_tabla, tipo, diccionario)
+
+
+def _contar_caracteres(datos):
+    # Caracteres UTF-8: todos los bytes que no son de continuación
+    return int(np.count_nonzero(np.frombuffer(datos, dtype=np.uint8) & 0xC0 != 0x80))
+
+
+def descomprimir_texto(
+    archivo_entrada="comprimido.bin", archivo_salida="salida.txt", diccionario=None
+):
+    diccionario = _diccionario(diccionario)
     with open(archivo_entrada, "rb") as f:
-        codigos, b = pickle.load(f)
-
-    # Invertir diccionario
-    reverse = {v: k for k, v in codigos.items()}
-
-    # Bytes → string de bits
-    bit_string = ""
-    for byte in b:
-        bit_string += f"{byte:08b}"
-
-    # Quitar padding
-    extra_padding = int(bit_string[:8], 2)
-    bit_string = bit_string[8:]
-    bit_string = bit_string[:-extra_padding]
-
-    # Decodificar
-    current = ""
-    texto = ""
-    for bit in bit_string:
-        current += bit
-        if current in reverse:
-            texto += reverse[current]
-            current = ""
+        datos = _texto_completo(f, diccionario)
+    texto = datos.decode("utf-8")
 
     with open(archivo_salida, "w", encoding="utf-8") as f:
         f.write(texto)
 
     print(f"Texto descomprimido y guardado en {archivo_salida}")
     return texto
+
+
+def descomprimir_archivo_texto(
+    archivo_entrada, archivo_salida, procesos=None, diccionario=None
+):
+    # Descomprime bloque a bloque escribiendo la salida a medida que avanza;
+    # con varios procesos y un índice de bloques, los decodifica en paralelo.
+    # Devuelve la cantidad de caracteres recuperados
+    procesos = procesos or os.cpu_count() or 1
+    diccionario = _diccionario(diccionario)
+    caracteres = 0
+    with open(archivo_entrada, "rb") as entrada, open(archivo_salida, "wb") as salida:
+        indice = _leer_indice(entrada) if procesos > 1 else None
+        if indice is not None and len(indice[0]) > 1:
+            posiciones, tipo = indice
+            tareas = (
+                (archivo_entrada, posicion, posicion_tabla, tipo, diccionario)
+                for posicion, posicion_tabla, _, _ in posiciones
+            )
+            bloques = paralelo.en_paralelo(_descomprimir_trama, tareas, procesos)
+        else:
+            entrada.seek(0)
+            bloques = (
+                _bytes_de_simbolos(bloque)
+                for bloque in _leer_bloques(entrada, diccionario)
+            )
+        for datos in bloques:
+            salida.write(datos)
+            caracteres += _contar_caracteres(datos)
+
+    print(f"Texto descomprimido y guardado en {archivo_salida}")
+    return caracteres
+
+
+def _decodificar_bloques(f, entradas, tipo, primero, ultimo, diccionario):
+    # Bytes originales de los bloques primero..ultimo (inclusive)
+    return b"".join(
+        _decodificar_trama(f, posicion, posicion_tabla, tipo, diccionario)
+        for posicion, posicion_tabla, _, _ in entradas[primero : ultimo + 1]
+    )
+
+
+def _texto_completo(f, diccionario):
+    f.seek(0)
+    return b"".join(
+        _bytes_de_simbolos(bloque) for bloque in _leer_bloques(f, diccionario)
+    )
+
+
+def leer_bytes_texto(archivo_entrada, inicio=0, fin=None, diccionario=None):
+    # Bytes [inicio, fin) del texto original (índices como en un slice,
+    # también negativos) decodificando sólo los bloques que abarcan. Los
+    # archivos sin índice (un solo bloque o formato anterior) se decodifican
+    # enteros
+    diccionario = _diccionario(diccionario)
+    with open(archivo_entrada, "rb") as f:
+        indice = _leer_indice(f)
+        if indice is None:
+            return _texto_completo(f, diccionario)[inicio:fin]
+        entradas, tipo = indice
+        finales = np.cumsum([entrada[2] for entrada in entradas], dtype=np.int64)
+        total = int(finales[-1]) if len(finales) else 0
+        inicio, fin, _ = slice(inicio, fin).indices(total)
+        if inicio >= fin:
+            return b""
+        primero = int(np.searchsorted(finales, inicio, "right"))
+        ultimo = int(np.searchsorted(finales, fin - 1, "right"))
+        datos = _decodificar_bloques(f, entradas, tipo, primero, ultimo, diccionario)
+    base = int(finales[primero]) - entradas[primero][2]
+    return datos[inicio - base : fin - base]
+
+
+def leer_lineas_texto(archivo_entrada, inicio=0, fin=None, diccionario=None):
+    # Líneas [inicio, fin) del texto original, con sus saltos de línea,
+    # decodificando sólo los bloques que abarcan; con índices negativos se
+    # cuenta desde el final (por ejemplo inicio=-100 para las últimas 100)
+    diccionario = _diccionario(diccionario)
+    with open(archivo_entrada, "rb") as f:
+        indice = _leer_indice(f)
+        if indice is None:
+            lineas = _texto_completo(f, diccionario).splitlines(keepends=True)
+            return b"".join(lineas[inicio:fin])
+        entradas, tipo = indice
+        if not entradas:
+            return b""
+        # Saltos de línea acumulados hasta el final de cada bloque
+        saltos = np.cumsum([entrada[3] for entrada in entradas], dtype=np.int64)
+        total = int(saltos[-1])
+        if inicio < 0 or (fin is not None and fin < 0):
+            # Hace falta el total de líneas: la última puede no tener salto
+            ultimo_bloque = len(entradas) - 1
+            final = _decodificar_bloques(
+                f, entradas, tipo, ultimo_bloque, ultimo_bloque, diccionario
+            )
+            total += not final.endswith(b"\n")
+        else:
+            total += 1
+        inicio, fin, _ = slice(inicio, fin).indices(total)
+        if inicio >= fin or inicio > int(saltos[-1]):
+            return b""
+
+        # La línea i empieza tras el salto número i y termina en el número
+        # fin: sólo se decodifican los bloques entre ambos
+        primero = int(np.searchsorted(saltos, inicio, "left"))
+        ultimo = min(int(np.searchsorted(saltos, fin, "left")), len(entradas) - 1)
+        datos = _decodificar_bloques(f, entradas, tipo, primero, ultimo, diccionario)
+    previos = int(saltos[primero - 1]) if primero else 0
+    posiciones = np.flatnonzero(np.frombuffer(datos, dtype=np.uint8) == SALTO_DE_LINEA)
+    saltar = inicio - previos
+    desde = int(posiciones[saltar - 1]) + 1 if saltar else 0
+    hasta_salto = saltar + fin - inicio - 1
+    hasta = (
+        int(posiciones[hasta_salto]) + 1
+        if hasta_salto < len(posiciones)
+        else len(datos)
+    )
+    return datos[desde:hasta]
+
+
+class Diccionario:
+    # Tablas Huffman entrenadas (bytes, literales/longitudes LZ y códigos de
+    # distancia) y contenido que LZ puede copiar; el ID es el CRC-32 de todo
+    # ello, y es lo único que guardan los archivos que lo usan. Las tablas de
+    # decodificación se arman una sola vez acá: con textos cortos armarlas
+    # cuesta más que decodificar
+    def __init__(self, tabla, tabla_litlen, tabla_distancias, contenido):
+        self.tabla = tabla
+        self.tabla_litlen = tabla_litlen
+        self.tabla_distancias = tabla_distancias
+        self.contenido = contenido
+        self.identificador = zlib.crc32(self._cuerpo())
+        (
+            self.decodificacion,
+            self.decodificacion_litlen,
+            self.decodificacion_distancias,
+        ) = (
+            huffman_rapido.TablaDecodificacion(enteros, longitudes)
+            for _, longitudes, enteros, _ in (tabla, tabla_litlen, tabla_distancias)
+        )
+
+    def __reduce__(self):
+        # Al pasarlo a otro proceso viajan sólo las tablas canónicas y el
+        # contenido; las de decodificación se vuelven a armar allá
+        return Diccionario, (
+            self.tabla,
+            self.tabla_litlen,
+            self.tabla_distancias,
+            self.contenido,
+        )
+
+    def _cuerpo(self):
+        cuerpo = io.BytesIO()
+        for alfabeto, longitudes, _, _ in (
+            self.tabla,
+            self.tabla_litlen,
+            self.tabla_distancias,
+        ):
+            huffman_rapido.escribir_tabla(cuerpo, alfabeto, longitudes)
+        huffman_rapido.escribir_varint(cuerpo, len(self.contenido))
+        cuerpo.write(self.contenido.tobytes())
+        return cuerpo.getvalue()
+
+    def guardar(self, archivo):
+        with open(archivo, "wb") as f:
+            f.write(MAGIA_DICCIONARIO + bytes([VERSION_DICCIONARIO]))
+            f.write(self.identificador.to_bytes(4, "little"))
+            f.write(self._cuerpo())
+
+
+def cargar_diccionario(archivo):
+    # Lee un diccionario guardado por entrenar_diccionario; conviene cargarlo
+    # una vez y pasar el resultado en cada llamada
+    with open(archivo, "rb") as f:
+        encabezado = f.read(len(MAGIA_DICCIONARIO) + 1)
+        if encabezado[: len(MAGIA_DICCIONARIO)] != MAGIA_DICCIONARIO:
+            raise ValueError("No es un archivo de diccionario")
+        if encabezado[-1] != VERSION_DICCIONARIO:
+            raise ValueError(f"Versión de diccionario no soportada: {encabezado[-1]}")
+        identificador = int.from_bytes(f.read(4), "little")
+        tablas = [_tabla(*huffman_rapido.leer_tabla(f)) for _ in range(3)]
+        n = huffman_rapido.leer_varint(f)
+        contenido = np.frombuffer(f.read(n), dtype=np.uint8)
+    if len(contenido) != n:
+        raise ValueError("Archivo truncado: falta el contenido del diccionario")
+    diccionario = Diccionario(*tablas, contenido)
+    if diccionario.identificador != identificador:
+        raise ValueError("Diccionario corrupto: el ID no coincide")
+    return diccionario
+
+
+def _diccionario(diccionario):
+    # Acepta un diccionario cargado, la ruta de uno o None
+    if diccionario is None or isinstance(diccionario, Diccionario):
+        return diccionario
+    return cargar_diccionario(diccionario)
+
+
+def _fragmentos(datos):
+    # Los TAMANO_FRAGMENTO bytes que empiezan en cada posición, como uint64
+    ventanas = np.lib.stride_tricks.sliding_window_view(datos, TAMANO_FRAGMENTO)
+    return np.ascontiguousarray(ventanas).view(np.uint64).ravel()
+
+
+def _contenido_entrenado(muestras, tamano):
+    # Segmentos de las muestras con los fragmentos más frecuentes del corpus,
+    # elegidos de a uno (como el algoritmo COVER de zstd): al elegir un
+    # segmento sus fragmentos dejan de puntuar, así no se repite contenido.
+    # Los mejores quedan al final, a menor distancia de lo que se comprime
+    n_elegir = tamano // TAMANO_SEGMENTO
+    muestras = [m for m in muestras if len(m) >= TAMANO_SEGMENTO]
+    if n_elegir == 0 or not muestras:
+        return np.empty(0, dtype=np.uint8)
+    fragmentos = [_fragmentos(m) for m in muestras]
+    claves, conteos = np.unique(np.concatenate(fragmentos), return_counts=True)
+
+    # Fragmentos de cada segmento completo, como posiciones en `claves`
+    por_segmento = TAMANO_SEGMENTO - TAMANO_FRAGMENTO + 1
+    segmentos, contenidos = [], []
+    for muestra, propios in zip(muestras, fragmentos):
+        inicios = np.arange(0, len(muestra) - TAMANO_SEGMENTO + 1, TAMANO_SEGMENTO)
+        posiciones = inicios[:, None] + np.arange(por_segmento)
+        segmentos.append(np.searchsorted(claves, propios[posiciones]))
+        contenidos.extend(muestra[i : i + TAMANO_SEGMENTO] for i in inicios)
+    segmentos = np.concatenate(segmentos)
+
+    # Sólo compiten los mejor puntuados de entrada; un fragmento visto una
+    # sola vez no puntúa
+    pesos = conteos - 1
+    candidatos = np.argsort(-pesos[segmentos].sum(axis=1), kind="stable")
+    candidatos = candidatos[: 4 * n_elegir]
+    elegidos = []
+    for _ in range(n_elegir):
+        puntajes = pesos[segmentos[candidatos]].sum(axis=1)
+        mejor = candidatos[int(np.argmax(puntajes))]
+        if puntajes.max() == 0:
+            break
+        elegidos.append(contenidos[mejor])
+        pesos[segmentos[mejor]] = 0
+    if not elegidos:
+        return np.empty(0, dtype=np.uint8)
+    return np.concatenate(elegidos[::-1])
+
+
+def entrenar_diccionario(
+    archivos_muestra, archivo_diccionario, tamano=TAMANO_DICCIONARIO
+):
+    # Entrena un diccionario con un corpus de ejemplo (archivos parecidos a
+    # los que se van a comprimir) y lo guarda; devuelve su ID. Las tablas
+    # cubren todos los valores posibles (se cuenta 1 más cada uno), así que
+    # sirven aunque un archivo tenga bytes que no estaban en el corpus
+    muestras = []
+    for archivo in archivos_muestra:
+        with open(archivo, "rb") as f:
+            muestras.append(np.frombuffer(f.read(), dtype=np.uint8))
+    contenido = _contenido_entrenado(muestras, tamano)
+
+    n_litlen = (1 << 8) + lz77.n_codigos(lz77.LONGITUD_MAX - lz77.LONGITUD_MIN)
+    n_distancias = lz77.n_codigos(lz77.VENTANA_MAX - 1)
+    bytes_vistos = np.ones(1 << 8, dtype=np.int64)
+    litlen_vistos = np.ones(n_litlen, dtype=np.int64)
+    distancias_vistas = np.ones(n_distancias, dtype=np.int64)
+    for muestra in muestras:
+        bytes_vistos += np.bincount(muestra, minlength=1 << 8)
+        litlen, distancias, _, _ = lz77.analizar(muestra, 1 << 8, prefijo=contenido)
+        litlen_vistos += np.bincount(litlen, minlength=n_litlen)
+        distancias_vistas += np.bincount(distancias, minlength=n_distancias)
+
+    diccionario = Diccionario(
+        _construir_tabla(bytes_vistos),
+        _construir_tabla(litlen_vistos),
+        _construir_tabla(distancias_vistas),
+        contenido,
+    )
+    diccionario.guardar(archivo_diccionario)
+    print(
+        f"Diccionario {diccionario.identificador:08x} guardado en "
+        f"{archivo_diccionario}"
+    )
+    return diccionario.identificador
@@ -0,0 +1,149 @@
+import numpy as np
+
+# Cuantización de colores con pérdida para imágenes, vectorizada con NumPy.
+#
+# La paleta sale de un corte mediano sobre una muestra de píxeles: se parte
+# una y otra vez la caja (grupo de colores de la muestra) con más
+# píxeles × rango por la mediana de su canal de mayor rango, hasta tener
+# los colores pedidos; el color de cada caja es el promedio de la muestra
+# que cayó en ella. Los cortes se hacen sobre los bits altos de cada canal
+# (a lo sumo BITS_CLAVE_MAX bits entre todos), así el árbol de cortes se
+# recorre una sola vez para cada combinación posible, todas a la vez con
+# NumPy, y cuantizar cada píxel de la imagen es una consulta a esa tabla.
+#
+# Además se pueden fundir píxeles vecinos casi iguales: recorriendo las
+# columnas (todas las filas a la vez), un píxel que difiere del anterior de
+# su fila en a lo sumo `tolerancia` en cada canal toma su color, así las
+# ejecuciones del RLE se alargan.
+
+# Píxeles de la muestra sobre la que se arma la paleta (las imágenes más
+# chicas se usan enteras)
+MUESTRA_MAX = 1 << 16
+# Colores máximos de la paleta (índices de 1 byte en las teselas con paleta)
+COLORES_MAX = 256
+# Bits máximos de la clave de un píxel (bits altos de todos sus canales):
+# la tabla de cuantización tiene 2^BITS_CLAVE_MAX entradas como mucho
+BITS_CLAVE_MAX = 20
+# Píxeles que se procesan a la vez (limita la memoria temporal)
+PIXELES_POR_TRAMO = 1 << 20
+
+
+def _caja(nodo, indices, claves):
+    # (peso, canal de mayor rango, nodo, índices en la muestra) de una hoja;
+    # peso 0 si todas sus claves son iguales y no se puede partir
+    valores = claves[indices]
+    rangos = valores.max(axis=0) - valores.min(axis=0)
+    canal = int(rangos.argmax())
+    return int(rangos[canal]) * len(indices), canal, nodo, indices
+
+
+def _arbol(claves, muestra, colores):
+    # Corte mediano de la muestra según sus claves: arreglos por nodo con el
+    # canal (-1 en las hojas), el umbral, el hijo con claves menores al
+    # umbral, el hijo con el resto, y el color de las hojas
+    canales, umbrales, menores, mayores = [-1], [0], [0], [0]
+    cajas = [_caja(0, np.arange(len(claves)), claves)]
+    while len(cajas) < colores:
+        mayor = max(range(len(cajas)), key=lambda i: cajas[i][0])
+        if cajas[mayor][0] == 0:
+            break
+        _, canal, nodo, indices = cajas.pop(mayor)
+        columna = claves[indices, canal]
+        umbral = int(np.partition(columna, len(columna) // 2)[len(columna) // 2])
+        if umbral == columna.min():
+            umbral = int(columna[columna > umbral].min())
+        hijo = len(canales)
+        canales[nodo], umbrales[nodo] = canal, umbral
+        menores[nodo], mayores[nodo] = hijo, hijo + 1
+        canales += [-1, -1]
+        umbrales += [0, 0]
+        menores += [0, 0]
+        mayores += [0, 0]
+        cajas.append(_caja(hijo, indices[columna < umbral], claves))
+        cajas.append(_caja(hijo + 1, indices[columna >= umbral], claves))
+
+    paleta = np.zeros((len(canales), muestra.shape[1]), dtype=np.int64)
+    for _, _, nodo, indices in cajas:
+        paleta[nodo] = np.rint(muestra[indices].mean(axis=0))
+    arbol = (canales, umbrales, menores, mayores)
+    return [np.array(arreglo, dtype=np.int64) for arreglo in arbol], paleta
+
+
+def _hojas(puntos, arbol):
+    # Hoja del árbol a la que llega cada punto (n, canales)
+    canales, umbrales, menores, mayores = arbol
+    nodos = np.zeros(len(puntos), dtype=np.int64)
+    pendientes = np.arange(len(puntos))
+    while len(pendientes):
+        actuales = nodos[pendientes]
+        internos = canales[actuales] >= 0
+        pendientes, actuales = pendientes[internos], actuales[internos]
+        arriba = puntos[pendientes, canales[actuales]] >= umbrales[actuales]
+        nodos[pendientes] = np.where(arriba, mayores[actuales], menores[actuales])
+    return nodos
+
+
+def cuantizar(valores, colores):
+    # Copia de `valores` (alto, ancho, canales; enteros sin signo) con a lo
+    # sumo `colores` colores distintos
+    if not 1 <= colores <= COLORES_MAX:
+        raise ValueError(f"La cantidad de colores debe estar entre 1 y {COLORES_MAX}")
+    n_canales = valores.shape[-1]
+    planos = valores.reshape(-1, n_canales)
+    if len(planos) == 0:
+        return valores.copy()
+    bits_valor = 8 * valores.dtype.itemsize
+    bits = min(bits_valor, BITS_CLAVE_MAX // n_canales)
+    corrimiento = bits_valor - bits
+
+    muestra = planos
+    if len(planos) > MUESTRA_MAX:
+        elegidos = np.random.default_rng(0).integers(0, len(planos), MUESTRA_MAX)
+        muestra = planos[elegidos]
+    muestra = muestra.astype(np.int64)
+    arbol, paleta = _arbol(muestra >> corrimiento, muestra, colores)
+
+    # Color de cada clave posible (los bits del primer canal son los altos)
+    celdas = np.indices((1 << bits,) * n_canales).reshape(n_canales, -1).T
+    tabla = paleta.astype(valores.dtype)[_hojas(celdas, arbol)]
+
+    salida = np.empty_like(planos)
+    for inicio in range(0, len(planos), PIXELES_POR_TRAMO):
+        tramo = planos[inicio : inicio + PIXELES_POR_TRAMO]
+        claves = np.zeros(len(tramo), dtype=np.int64)
+        for canal in range(n_canales):
+            claves <<= bits
+            claves |= tramo[:, canal] >> corrimiento
+        salida[inicio : inicio + len(tramo)] = tabla[claves]
+    return salida.reshape(valores.shape)
+
+
+def fundir(valores, tolerancia):
+    # Funde en el lugar cada píxel de `valores` (alto, ancho, canales) con
+    # el anterior de su fila si no difiere en más de `tolerancia` en ningún
+    # canal
+    if valores.shape[1] == 0:
+        return
+    anterior = valores[:, 0]
+    for x in range(1, valores.shape[1]):
+        columna = valores[:, x]
+        diferencias = np.abs(columna.astype(np.int32) - anterior)
+        cerca = (diferencias <= tolerancia).all(axis=1)
+        columna[cerca] = anterior[cerca]
+        anterior = columna
+
+
+def psnr(originales, aproximados, pico):
+    # Relación señal/ruido pico en dB entre dos imágenes del mismo tamaño
+    # (infinita si son iguales)
+    if originales.size == 0:
+        return float("inf")
+    filas = max(1, PIXELES_POR_TRAMO // max(1, originales[0].size))
+    error = 0.0
+    for fila in range(0, len(originales), filas):
+        diferencias = originales[fila : fila + filas].astype(np.float64)
+        diferencias -= aproximados[fila : fila + filas]
+        error += float(np.vdot(diferencias.ravel(), diferencias.ravel()))
+    if error == 0:
+        return float("inf")
+    return float(10 * np.log10(pico**2 * originales.size / error))
@@ -0,0 +1,616 @@
+import io
+import pickle
+
+import numpy as np
+
+# Motor de Huffman vectorizado con NumPy, compartido por los compresores.
+#
+# La codificación trabaja con los códigos como enteros (código, longitud) y los
+# empaqueta directamente en palabras de 64 bits, sin cadenas de '0'/'1'.
+#
+# La decodificación lee una ventana de bits por paso y la resuelve con tablas
+# construidas a partir de las longitudes de código: cada entrada indica cuántos
+# bits avanzar y qué símbolos (hasta SIMBOLOS_POR_PASO) salen de esa ventana.
+# Para aprovechar NumPy el flujo se divide en "carriles" que se decodifican a
+# la vez; cada carril arranca en una posición estimada y, como los códigos de
+# Huffman se autosincronizan, basta con repetir los carriles cuyo inicio no
+# coincide con el final real del carril anterior hasta que todo es consistente.
+
+# Bits máximos de la ventana de la tabla directa (2^16 entradas)
+BITS_TABLA = 16
+# Símbolos máximos resueltos por cada entrada de la tabla directa
+SIMBOLOS_POR_PASO = 4
+# Bits mínimos que recorre cada carril
+BITS_CARRIL_MIN = 1024
+# Bits mínimos de los carriles cuyo inicio guarda escribir_flujo (cada
+# inicio ocupa unos 2 bytes)
+BITS_CARRIL_GUARDADO = 8192
+# Carriles máximos decodificados en paralelo
+CARRILES_MAX = 8192
+# Carriles expandidos a la vez al armar la salida (limita la memoria temporal)
+CARRILES_POR_TANDA = 1024
+# Símbolos empaquetados a la vez al codificar (limita la memoria temporal)
+SIMBOLOS_POR_TANDA = 1 << 20
+# Longitud máxima de código por defecto al limitar las longitudes: así la
+# decodificación usa siempre la tabla directa (una consulta por ventana)
+LONGITUD_MAXIMA = 15
+
+
+class TablaDecodificacion:
+    def __init__(self, codigos, longitudes, bits=BITS_TABLA):
+        # Tablas indexadas por los siguientes `bits` bits del flujo
+        codigos = np.asarray(codigos, dtype=np.int64)
+        longitudes = np.asarray(longitudes, dtype=np.int64)
+        self.longitud_maxima = max(int(longitudes.max()), 1)
+        tipo_simbolo = np.uint16 if len(longitudes) <= 1 << 16 else np.uint32
+
+        if self.longitud_maxima <= BITS_TABLA:
+            self.bits = max(self.longitud_maxima, min(bits, BITS_TABLA))
+            n_ventanas = 1 << self.bits
+
+            # Un símbolo por ventana; las entradas libres (códigos incompletos
+            # o datos corruptos) avanzan un bit para que ningún carril se atasque
+            primero = np.zeros(n_ventanas, dtype=np.uint16)
+            longitud_primero = np.ones(n_ventanas, dtype=np.int64)
+            for simbolo, (codigo, longitud) in enumerate(zip(codigos, longitudes)):
+                libres = self.bits - int(longitud)
+                inicio = int(codigo) << libres
+                primero[inicio : inicio + (1 << libres)] = simbolo
+                longitud_primero[inicio : inicio + (1 << libres)] = longitud
+
+            # Encadenar símbolos mientras quepan completos en la ventana
+            ventanas = np.arange(n_ventanas, dtype=np.int64)
+            simbolos = np.empty((n_ventanas, SIMBOLOS_POR_PASO), np.uint16)
+            self.longitudes = np.zeros((n_ventanas, SIMBOLOS_POR_PASO), np.uint8)
+            self.cuantos = np.zeros(n_ventanas, dtype=np.uint8)
+            consumidos = np.zeros(n_ventanas, dtype=np.int64)
+            validos = np.ones(n_ventanas, dtype=bool)
+            for k in range(SIMBOLOS_POR_PASO):
+                resto = (ventanas << consumidos) & (n_ventanas - 1)
+                longitud = longitud_primero[resto]
+                validos &= consumidos + longitud <= self.bits
+                simbolos[:, k] = primero[resto]
+                self.longitudes[:, k] = longitud * validos
+                self.cuantos += validos
+                consumidos += longitud * validos
+            self.avance = consumidos.astype(np.uint8)
+            # Los 4 símbolos de cada entrada (y cuáles son válidos) empaquetados
+            # en una sola palabra, para expandir con una lectura por ventana
+            self.paquetes = simbolos.view(np.uint64).ravel()
+            presentes = np.arange(SIMBOLOS_POR_PASO) < self.cuantos[:, None]
+            self.presentes = presentes.view(np.uint32).ravel()
+            self.inicios = None
+        else:
+            # Códigos largos: alineados a la izquierda cada uno cubre un
+            # intervalo disjunto de ventanas, así que basta una búsqueda binaria
+            self.bits = self.longitud_maxima
+            self.longitudes_codigo = longitudes
+            inicios = codigos << (self.bits - longitudes)
+            self.orden = np.argsort(inicios, kind="stable").astype(tipo_simbolo)
+            self.inicios = inicios[self.orden]
+
+    def _buscar(self, ventanas):
+        posiciones = np.searchsorted(self.inicios, ventanas, side="right") - 1
+        return self.orden[np.maximum(posiciones, 0)]
+
+    def avanzar(self, ventanas):
+        # Bits consumidos por cada ventana
+        if self.inicios is None:
+            return self.avance[ventanas]
+        return self.longitudes_codigo[self._buscar(ventanas)]
+
+    def expandir(self, ventanas):
+        # (longitudes, cuantos) de cada ventana; el último eje de `longitudes`
+        # recorre los símbolos resueltos por la ventana
+        if self.inicios is None:
+            return self.longitudes[ventanas], self.cuantos[ventanas]
+        longitudes = self.longitudes_codigo[self._buscar(ventanas)]
+        return longitudes[..., None], np.ones_like(longitudes)
+
+    def simbolos(self, ventanas):
+        # (simbolos, presentes) de cada ventana; `presentes` marca los válidos
+        if self.inicios is None:
+            forma = ventanas.shape + (SIMBOLOS_POR_PASO,)
+            simbolos = self.paquetes[ventanas].view(np.uint16)
+            presentes = self.presentes[ventanas].view(bool)
+            return simbolos.reshape(forma), presentes.reshape(forma)
+        simbolos = self._buscar(ventanas)[..., None]
+        return simbolos, np.ones(simbolos.shape, dtype=bool)
+
+
+def _palabras(datos, bits_ventana):
+    # Palabra big-endian que empieza en cada byte del flujo, con palabras de
+    # relleno al final para los carriles que terminan cerca del último byte
+    ancho = 4 if bits_ventana <= 25 else 8
+    n = len(datos) + ancho
+    n_alineado = -(-n // ancho) * ancho
+    relleno = np.zeros(n_alineado + ancho, dtype=np.uint8)
+    relleno[: len(datos)] = datos
+    palabras = np.empty(n_alineado, dtype=np.uint32 if ancho == 4 else np.uint64)
+    for k in range(ancho):
+        palabras[k::ancho] = relleno[k : k + n_alineado].view(f">u{ancho}")
+    return palabras, ancho * 8
+
+
+def _decodificar_carriles(palabras, ancho_bits, tabla, inicios, fines):
+    # Avanza todos los carriles una ventana por paso hasta alcanzar su fin.
+    # Devuelve las ventanas leídas; los símbolos se expanden al final.
+    desplazamiento = ancho_bits - tabla.bits
+    mascara = (1 << tabla.bits) - 1
+    tipo_ventana = np.uint16 if tabla.bits <= 16 else np.int64
+    posiciones = inicios.copy()
+    pasos = np.zeros(len(inicios), dtype=np.int64)
+    columnas = []
+
+    while True:
+        activos = posiciones < fines
+        if not activos.any():
+            break
+        corrimientos = desplazamiento - (posiciones & 7)
+        if ancho_bits == 64:
+            corrimientos = corrimientos.astype(np.uint64)
+        ventanas = (palabras[posiciones >> 3] >> corrimientos) & mascara
+        ventanas = ventanas.astype(np.int64, copy=False)
+        posiciones += tabla.avanzar(ventanas) * activos
+        pasos += activos
+        columnas.append(ventanas.astype(tipo_ventana))
+
+    if columnas:
+        matriz = np.stack(columnas)
+    else:
+        matriz = np.empty((0, len(inicios)), dtype=tipo_ventana)
+
+    # El último paso puede haber leído símbolos más allá del fin del carril:
+    # quedarse con los necesarios para alcanzarlo y corregir la posición final
+    cuantos_ultimo = np.zeros(len(inicios), dtype=np.int64)
+    con_pasos = np.flatnonzero(pasos)
+    if len(con_pasos):
+        ultimas = matriz[pasos[con_pasos] - 1, con_pasos].astype(np.int64)
+        longitudes, cuantos = tabla.expandir(ultimas)
+        acumuladas = np.cumsum(longitudes, axis=1, dtype=np.int64)
+        previas = posiciones[con_pasos] - acumuladas[:, -1]
+        acumuladas += previas[:, None]
+        filas = np.arange(len(con_pasos))
+        alcanzado = acumuladas >= fines[con_pasos, None]
+        alcanzado[filas, cuantos.astype(np.int64) - 1] = True
+        necesarios = alcanzado.argmax(axis=1)
+        cuantos_ultimo[con_pasos] = necesarios + 1
+        posiciones[con_pasos] = acumuladas[filas, necesarios]
+
+    return posiciones, pasos, cuantos_ultimo, matriz
+
+
+def _simbolos_de_carriles(tabla, matriz, pasos, cuantos_ultimo):
+    # Expande las ventanas de varios carriles a sus símbolos, en orden de carril
+    ventanas = np.ascontiguousarray(matriz.T)
+    simbolos, presentes = tabla.simbolos(ventanas)
+    presentes[np.arange(ventanas.shape[1]) >= pasos[:, None]] = False
+    con_pasos = np.flatnonzero(pasos)
+    presentes[con_pasos, pasos[con_pasos] - 1] = (
+        np.arange(presentes.shape[2]) < cuantos_ultimo[con_pasos, None]
+    )
+    cuentas = presentes.sum(axis=(1, 2))
+    return np.compress(presentes.ravel(), simbolos.ravel()), cuentas
+
+
+def decodificar(datos, n_bits, codigos, longitudes, inicios=None, tabla=None):
+    # Decodifica `n_bits` bits de `datos` y devuelve los índices de símbolo;
+    # con `inicios` (bit donde empieza cada carril, el primero en 0) los
+    # carriles arrancan ya sincronizados. `tabla` es una TablaDecodificacion
+    # ya armada para estos códigos (si se decodifican muchos flujos con los
+    # mismos), así no se reconstruye en cada llamada
+    datos = np.frombuffer(datos, dtype=np.uint8)
+    longitudes = np.asarray(longitudes, dtype=np.int64)
+    tipo_simbolo = np.uint16 if len(longitudes) <= 1 << 16 else np.uint32
+    if n_bits == 0:
+        return np.empty(0, dtype=tipo_simbolo)
+
+    if tabla is None:
+        # Flujos cortos no amortizan una tabla de 2^16 entradas
+        tabla = TablaDecodificacion(
+            codigos, longitudes, bits=int(n_bits).bit_length() - 6
+        )
+    palabras, ancho_bits = _palabras(datos, tabla.bits)
+
+    if inicios is None:
+        # Los inicios estimados se alinean al mcd de las longitudes para que
+        # los códigos de longitud fija (que nunca se resincronizan) caigan en
+        # frontera
+        paso = int(np.gcd.reduce(longitudes[longitudes > 0]))
+        bits_carril = max(BITS_CARRIL_MIN, -(-n_bits // CARRILES_MAX))
+        bits_carril = -(-bits_carril // paso) * paso
+        n_carriles = -(-n_bits // bits_carril)
+        inicios = np.arange(n_carriles, dtype=np.int64) * bits_carril
+    else:
+        inicios = np.asarray(inicios, dtype=np.int64)
+        n_carriles = len(inicios)
+    fines = np.append(inicios[1:], n_bits)
+
+    # Sincronización: repetir los carriles cuyo inicio cambió
+    salidas = np.empty(n_carriles, dtype=np.int64)
+    ultimo_pase = np.empty(n_carriles, dtype=np.int64)
+    pases = []
+    pendientes = np.arange(n_carriles)
+    while len(pendientes):
+        posiciones, pasos, cuantos_ultimo, matriz = _decodificar_carriles(
+            palabras, ancho_bits, tabla, inicios[pendientes], fines[pendientes]
+        )
+        salidas[pendientes] = posiciones
+        ultimo_pase[pendientes] = len(pases)
+        pases.append((pendientes, pasos, cuantos_ultimo, matriz))
+
+        nuevos_inicios = inicios.copy()
+        nuevos_inicios[1:] = salidas[:-1]
+        pendientes = np.flatnonzero(nuevos_inicios != inicios)
+        inicios = nuevos_inicios
+
+    if salidas[-1] != n_bits:
+        raise ValueError("Flujo Huffman corrupto: los bits no coinciden")
+
+    # Expandir los carriles vigentes de cada pase, por tandas
+    tandas = []
+    cuentas = np.empty(n_carriles, dtype=np.int64)
+    for indice, (carriles, pasos, cuantos_ultimo, matriz) in enumerate(pases):
+        vigentes = np.flatnonzero(ultimo_pase[carriles] == indice)
+        for inicio in range(0, len(vigentes), CARRILES_POR_TANDA):
+            tanda = vigentes[inicio : inicio + CARRILES_POR_TANDA]
+            simbolos, cuentas[carriles[tanda]] = _simbolos_de_carriles(
+                tabla, matriz[:, tanda], pasos[tanda], cuantos_ultimo[tanda]
+            )
+            tandas.append((carriles[tanda], simbolos))
+        pases[indice] = None
+
+    # Dispersar los símbolos de cada tanda en el buffer de salida preasignado:
+    # los de un carril van desde donde terminan los carriles anteriores
+    comienzos = np.cumsum(cuentas) - cuentas
+    salida = np.empty(int(cuentas.sum()), dtype=tipo_simbolo)
+    for carriles, simbolos in tandas:
+        if len(carriles) == carriles[-1] - carriles[0] + 1:
+            # Carriles consecutivos: sus símbolos ya están en orden
+            salida[comienzos[carriles[0]] :][: len(simbolos)] = simbolos
+        else:
+            desplazamientos = comienzos[carriles] - (
+                np.cumsum(cuentas[carriles]) - cuentas[carriles]
+            )
+            destinos = np.repeat(desplazamientos, cuentas[carriles])
+            destinos += np.arange(len(simbolos))
+            salida[destinos] = simbolos
+    return salida
+
+
+def codificar(simbolos, codigos, longitudes):
+    # Empaqueta los códigos de `simbolos` en bytes; devuelve (datos, n_bits)
+    simbolos = np.asarray(simbolos)
+    longitudes = np.asarray(longitudes, dtype=np.uint64)
+    if len(simbolos) == 0:
+        return b"", 0
+
+    # Cada código alineado a la izquierda en una palabra de 64 bits
+    alineados = np.asarray(codigos, dtype=np.uint64) << (64 - longitudes)
+    apariciones = np.bincount(simbolos, minlength=len(longitudes))
+    n_bits = int(apariciones @ longitudes.astype(np.int64))
+    palabras = np.zeros(-(-n_bits // 64) + 1, dtype=np.uint64)
+
+    base = 0
+    for inicio in range(0, len(simbolos), SIMBOLOS_POR_TANDA):
+        tanda = simbolos[inicio : inicio + SIMBOLOS_POR_TANDA]
+        largos = longitudes[tanda]
+        finales = np.cumsum(largos, dtype=np.uint64) + np.uint64(base)
+        posiciones = finales - largos
+        base = int(finales[-1])
+        valores = alineados[tanda]
+        desfases = posiciones & np.uint64(63)
+
+        # Parte de cada código que cae en la palabra donde empieza. Ningún
+        # código cubre una palabra entera, así que cada palabra del tramo
+        # tiene códigos que empiezan en ella (contiguos) y se combinan con OR.
+        primera = int(posiciones[0]) >> 6
+        ultima = int(posiciones[-1]) >> 6
+        limites = np.arange(primera, ultima + 1, dtype=np.uint64) << np.uint64(6)
+        grupos = np.searchsorted(posiciones, limites)
+        altas = valores >> desfases
+        palabras[primera : ultima + 1] |= np.bitwise_or.reduceat(altas, grupos)
+
+        # Resto de los códigos que cruzan a la palabra siguiente
+        cruzan = np.flatnonzero(desfases + largos > 64)
+        siguientes = (posiciones[cruzan] >> np.uint64(6)) + np.uint64(1)
+        palabras[siguientes] |= valores[cruzan] << (64 - desfases[cruzan])
+
+    datos = palabras.astype(">u8").tobytes()[: -(-n_bits // 8)]
+    return datos, n_bits
+
+
+def empaquetar_bits(valores, anchos):
+    # Empaqueta campos de bits crudos (de 0 a 32 bits cada uno) uno detrás
+    # de otro; devuelve (datos, n_bits)
+    anchos = np.asarray(anchos, dtype=np.int64)
+    usados = np.flatnonzero(anchos)
+    valores = np.asarray(valores, dtype=np.uint64)[usados]
+    return codificar(np.arange(len(usados)), valores, anchos[usados])
+
+
+def desempaquetar_bits(datos, anchos):
+    # Inverso de empaquetar_bits: lee los campos de los anchos indicados
+    anchos = np.asarray(anchos, dtype=np.uint64)
+    if len(anchos) == 0:
+        return np.empty(0, dtype=np.uint64)
+    finales = np.cumsum(anchos)
+    if int(finales[-1]) > len(datos) * 8:
+        raise ValueError("Archivo truncado: faltan bits extra")
+    posiciones = finales - anchos
+    palabras, _ = _palabras(np.frombuffer(datos, dtype=np.uint8), 64)
+    ventanas = palabras[posiciones >> np.uint64(3)] << (posiciones & np.uint64(7))
+    # Los campos de 0 bits desplazarían 64 posiciones: se anulan aparte
+    valores = ventanas >> (np.uint64(64) - np.maximum(anchos, np.uint64(1)))
+    return np.where(anchos > 0, valores, np.uint64(0))
+
+
+def longitudes_huffman(conteos):
+    # Longitudes de código de Huffman (sin límite) sin armar el árbol ni los
+    # códigos: con los conteos ordenados, los nodos internos salen en orden
+    # creciente de peso, así que alcanzan dos colas (hojas e internos) para
+    # fusionar siempre los dos más livianos. Cada nodo guarda su padre, que
+    # se crea después que él, y la longitud de cada hoja es su profundidad
+    conteos = np.asarray(conteos, dtype=np.int64)
+    n = len(conteos)
+    if n <= 2:
+        return np.ones(n, dtype=np.int64)
+    orden = np.argsort(conteos, kind="stable")
+    pesos = conteos[orden].tolist()
+    padres = [0] * (2 * n - 1)
+    internos = []
+    hoja = interno = 0
+    for nodo in range(n, 2 * n - 1):
+        peso = 0
+        for _ in range(2):
+            if hoja < n and (
+                interno == len(internos) or pesos[hoja] <= internos[interno]
+            ):
+                hijo, hoja = hoja, hoja + 1
+                peso += pesos[hijo]
+            else:
+                hijo, interno = n + interno, interno + 1
+                peso += internos[hijo - n]
+            padres[hijo] = nodo
+        internos.append(peso)
+
+    profundidades = [0] * (2 * n - 1)
+    for nodo in range(2 * n - 3, -1, -1):
+        profundidades[nodo] = profundidades[padres[nodo]] + 1
+    longitudes = np.empty(n, dtype=np.int64)
+    longitudes[orden] = profundidades[:n]
+    return longitudes
+
+
+def longitudes_limitadas(conteos, longitud_maxima=LONGITUD_MAXIMA):
+    # Longitudes de código óptimas sin pasar de `longitud_maxima` bits
+    # (package-merge). Cada nivel mezcla los pesos de los símbolos con los
+    # paquetes (pares) del nivel anterior; de los 2n - 2 elementos más
+    # livianos del último nivel se baja contando cuántos son paquetes, y cada
+    # símbolo suma un bit por nivel en el que quedó elegido. En cada nivel los
+    # símbolos elegidos son siempre los más livianos, así que basta guardar
+    # cuántos son. Si hay más de 2^longitud_maxima símbolos se usa la menor
+    # longitud en la que caben
+    conteos = np.asarray(conteos, dtype=np.int64)
+    n = len(conteos)
+    longitud_maxima = max(longitud_maxima, (n - 1).bit_length())
+    longitudes = np.ones(n, dtype=np.int64)
+    if n <= 2:
+        return longitudes
+    orden = np.argsort(conteos, kind="stable")
+    pesos = conteos[orden]
+
+    niveles = []
+    actual = pesos
+    hojas = np.ones(n, dtype=bool)
+    for _ in range(longitud_maxima - 1):
+        niveles.append(hojas)
+        paquetes = actual[0 : len(actual) - 1 : 2] + actual[1::2]
+        mezcla = np.concatenate((pesos, paquetes))
+        posiciones = np.argsort(mezcla, kind="stable")
+        actual = mezcla[posiciones]
+        hojas = posiciones < n
+    niveles.append(hojas)
+
+    elegidos = 2 * n - 2
+    longitudes_ordenadas = np.zeros(n, dtype=np.int64)
+    for hojas in reversed(niveles):
+        cuantas = int(np.count_nonzero(hojas[:elegidos]))
+        longitudes_ordenadas[:cuantas] += 1
+        elegidos = 2 * (elegidos - cuantas)
+    longitudes[orden] = longitudes_ordenadas
+    return longitudes
+
+
+def codigos_canonicos(longitudes):
+    # Códigos canónicos: se asignan en orden (longitud, posición en la tabla),
+    # así que basta guardar las longitudes para reconstruirlos
+    longitudes = np.asarray(longitudes, dtype=np.int64)
+    orden = np.argsort(longitudes, kind="stable")
+    codigos = np.zeros(len(longitudes), dtype=np.int64)
+    codigo = 0
+    longitud_anterior = int(longitudes[orden[0]]) if len(orden) else 0
+    for simbolo in orden.tolist():
+        longitud = int(longitudes[simbolo])
+        codigo <<= longitud - longitud_anterior
+        codigos[simbolo] = codigo
+        codigo += 1
+        longitud_anterior = longitud
+    return codigos
+
+
+def escribir_varint(f, valor):
+    # Entero no negativo en grupos de 7 bits (el bit alto indica que sigue otro)
+    salida = bytearray()
+    while valor >= 0x80:
+        salida.append((valor & 0x7F) | 0x80)
+        valor >>= 7
+    salida.append(valor)
+    f.write(salida)
+
+
+def leer_varint(f):
+    valor = 0
+    desplazamiento = 0
+    while True:
+        byte = f.read(1)
+        if not byte:
+            raise ValueError("Archivo truncado: se esperaba un entero")
+        valor |= (byte[0] & 0x7F) << desplazamiento
+        if byte[0] < 0x80:
+            return valor
+        desplazamiento += 7
+
+
+def empaquetar_varints(valores):
+    # Varints (como escribir_varint) de muchos enteros no negativos de una
+    # vez, concatenados en un solo bloque de bytes
+    valores = np.asarray(valores, dtype=np.uint64)
+    anchos = np.ones(len(valores), dtype=np.int64)
+    for k in range(1, 10):
+        anchos += valores >= np.uint64(1 << (7 * k))
+    inicios = np.cumsum(anchos) - anchos
+    posiciones = np.arange(int(anchos.sum())) - np.repeat(inicios, anchos)
+    grupos = np.repeat(valores, anchos) >> (7 * posiciones).astype(np.uint64)
+    siguen = posiciones < np.repeat(anchos, anchos) - 1
+    return (
+        ((grupos & np.uint64(0x7F)) | (siguen.astype(np.uint64) << np.uint64(7)))
+        .astype(np.uint8)
+        .tobytes()
+    )
+
+
+def desempaquetar_varints(datos, n):
+    # Inverso de empaquetar_varints: lee `n` varints del principio de
+    # `datos` (bytes o arreglo uint8, p. ej. un memmap); devuelve (valores,
+    # bytes usados)
+    datos = np.frombuffer(datos, dtype=np.uint8) if isinstance(datos, bytes) else datos
+    if n == 0:
+        return np.empty(0, dtype=np.int64), 0
+    finales = np.flatnonzero(datos < 0x80)[:n]
+    if len(finales) < n:
+        raise ValueError("Archivo truncado: faltan enteros")
+    usados = int(finales[-1]) + 1
+    inicios = np.empty(n, dtype=np.int64)
+    inicios[0] = 0
+    inicios[1:] = finales[:-1] + 1
+    posiciones = np.arange(usados) - np.repeat(inicios, finales - inicios + 1)
+    partes = (datos[:usados].astype(np.int64) & 0x7F) << (7 * posiciones)
+    return np.add.reduceat(partes, inicios), usados
+
+
+def leer_varints(f, n):
+    # `n` varints seguidos de un archivo con seek: se lee un tramo que seguro
+    # los contiene y se devuelve al archivo lo que sobró
+    tramo = f.read(10 * n)
+    valores, usados = desempaquetar_varints(tramo, n)
+    f.seek(usados - len(tramo), io.SEEK_CUR)
+    return valores
+
+
+def escribir_valores(f, valores):
+    # Enteros ordenados: cantidad, el primero en zigzag (admite negativos) y
+    # el resto como diferencias
+    valores = [int(valor) for valor in valores]
+    escribir_varint(f, len(valores))
+    if valores:
+        primero = valores[0]
+        escribir_varint(f, (primero << 1) ^ (primero >> 63))
+        for anterior, valor in zip(valores, valores[1:]):
+            escribir_varint(f, valor - anterior)
+
+
+def leer_valores(f):
+    # Inverso de escribir_valores
+    n = leer_varint(f)
+    valores = np.empty(n, dtype=np.int64)
+    if n:
+        zigzag = leer_varint(f)
+        valor = (zigzag >> 1) ^ -(zigzag & 1)
+        valores[0] = valor
+        for i in range(1, n):
+            valor += leer_varint(f)
+            valores[i] = valor
+    return valores
+
+
+def escribir_tabla(f, valores, longitudes):
+    # Tabla canónica compacta: los valores ordenados y un byte de longitud
+    # por símbolo
+    escribir_valores(f, valores)
+    f.write(bytes(np.asarray(longitudes, dtype=np.uint8)))
+
+
+def leer_tabla(f):
+    # Devuelve (valores, longitudes) escritos por escribir_tabla
+    valores = leer_valores(f)
+    n = len(valores)
+    longitudes = np.frombuffer(f.read(n), dtype=np.uint8).astype(np.int64)
+    if len(longitudes) != n:
+        raise ValueError("Archivo truncado: tabla de longitudes incompleta")
+    return valores, longitudes
+
+
+def escribir_flujo(f, valores):
+    # Flujo de enteros no negativos con su propia tabla canónica (longitudes
+    # limitadas): tabla, cantidad de bits, el bit donde empieza cada carril
+    # (cantidad y saltos como varints) y los códigos. Con los inicios
+    # guardados la decodificación no tiene que resincronizar carriles, que
+    # con distribuciones casi planas (bytes de fotos) lleva cientos de
+    # pasadas
+    valores = np.asarray(valores, dtype=np.int64)
+    conteos = np.bincount(valores)
+    alfabeto = np.flatnonzero(conteos)
+    longitudes = longitudes_limitadas(conteos[alfabeto])
+    escribir_tabla(f, alfabeto, longitudes)
+    if len(valores) == 0:
+        escribir_varint(f, 0)
+        return
+    indice = np.zeros(len(conteos), dtype=np.int64)
+    indice[alfabeto] = np.arange(len(alfabeto))
+    simbolos = indice[valores]
+    datos, n_bits = codificar(simbolos, codigos_canonicos(longitudes), longitudes)
+
+    bits_carril = max(BITS_CARRIL_GUARDADO, -(-n_bits // CARRILES_MAX))
+    por_carril = max(1, len(simbolos) * bits_carril // n_bits)
+    bits = longitudes[simbolos]
+    inicios = (np.cumsum(bits) - bits)[::por_carril]
+    escribir_varint(f, n_bits)
+    escribir_varint(f, len(inicios))
+    f.write(empaquetar_varints(np.diff(inicios, prepend=0)))
+    f.write(datos)
+
+
+def leer_flujo(f):
+    # Inverso de escribir_flujo: devuelve los valores (int64)
+    alfabeto, longitudes = leer_tabla(f)
+    n_bits = leer_varint(f)
+    if n_bits == 0:
+        return np.empty(0, dtype=np.int64)
+    inicios = np.cumsum(leer_varints(f, leer_varint(f)))
+    if len(inicios) == 0 or inicios[0] != 0 or inicios[-1] >= n_bits:
+        raise ValueError("Flujo Huffman corrupto: inicios de carril inválidos")
+    datos = f.read((n_bits + 7) // 8)
+    if len(datos) * 8 < n_bits:
+        raise ValueError("Archivo truncado: faltan datos del flujo")
+    simbolos = decodificar(
+        datos, n_bits, codigos_canonicos(longitudes), longitudes, inicios
+    )
+    return alfabeto[simbolos]
+
+
+class _CargadorLegado(pickle.Unpickler):
+    def __init__(self, f, permitidos):
+        super().__init__(f)
+        self.permitidos = permitidos
+
+    def find_class(self, modulo, nombre):
+        # Sólo se reconstruyen las clases que usaban los formatos anteriores
+        if (modulo, nombre) in self.permitidos:
+            return super().find_class(modulo, nombre)
+        raise pickle.UnpicklingError(f"Clase no permitida: {modulo}.{nombre}")
+
+
+def cargar_legado(f, permitidos):
+    # Lee un archivo del formato anterior (pickle) sin ejecutar código arbitrario
+    return _CargadorLegado(f, permitidos).load()
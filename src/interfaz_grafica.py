@@ -7,16 +7,23 @@ from PyQt6.QtWidgets import (
     QWidget,
     QPushButton,
     QVBoxLayout,
+    QHBoxLayout,
+    QSpinBox,
     QLabel,
     QFileDialog,
     QMessageBox,
 )
 from PyQt6.QtCore import Qt
 from PyQt6.QtGui import QFont
-from PIL import Image
 
 # Importar módulos de compresión
-from src.compresion_texto import comprimir_texto, descomprimir_texto
+from src.compresion_texto import comprimir_archivo_texto, descomprimir_archivo_texto
+from src.compresion_imagen import (
+    bytes_por_pixel,
+    comprimir_imagen,
+    descomprimir_imagen,
+)
+from src.cuantizacion import COLORES_MAX
 from src.compresion_audio import CompresorAudioOptimizado
 
 
@@ -180,11 +187,7 @@ class VentanaCompresionTexto(QWidget):
             return
 
         try:
-            # Leer el archivo
-            with open(self.ruta_archivo, "r", encoding="utf-8") as f:
-                texto = f.read()
-
-            if not texto:
+            if os.path.getsize(self.ruta_archivo) == 0:
                 QMessageBox.warning(self, "Advertencia", "El archivo está vacío")
                 return
 
@@ -200,8 +203,8 @@ class VentanaCompresionTexto(QWidget):
                 directorio_comprimidos, nombre_base + "_comprimido.bin"
             )
 
-            # Comprimir
-            comprimir_texto(texto, archivo_salida)
+            # Comprimir (por bloques, sin cargar el archivo entero)
+            comprimir_archivo_texto(self.ruta_archivo, archivo_salida)
 
             # Calcular estadísticas
             tamaño_original = os.path.getsize(self.ruta_archivo)
@@ -269,11 +272,11 @@ class VentanaCompresionTexto(QWidget):
             )
 
             # Descomprimir
-            texto = descomprimir_texto(ruta_archivo, archivo_salida)
+            caracteres = descomprimir_archivo_texto(ruta_archivo, archivo_salida)
 
             texto_resultado = "Descompresión exitosa!\n"
             texto_resultado += f"Archivo guardado en: archivos/descomprimidos/{os.path.basename(archivo_salida)}\n"
-            texto_resultado += f"Caracteres recuperados: {len(texto)}"
+            texto_resultado += f"Caracteres recuperados: {caracteres}"
 
             self.etiqueta_resultado_descompresion.setText(texto_resultado)
             QMessageBox.information(self, "Éxito", "Texto descomprimido exitosamente")
@@ -315,6 +318,19 @@ class VentanaCompresionImagen(QWidget):
         self.etiqueta_archivo.setAlignment(Qt.AlignmentFlag.AlignCenter)
         diseño.addWidget(self.etiqueta_archivo)
 
+        # Modo con pérdida: colores de la paleta (0 = sin pérdida) y
+        # tolerancia para fundir píxeles vecinos casi iguales
+        fila_perdida = QHBoxLayout()
+        fila_perdida.addWidget(QLabel("Colores (0 = sin pérdida):"))
+        self.selector_colores = QSpinBox()
+        self.selector_colores.setRange(0, COLORES_MAX)
+        fila_perdida.addWidget(self.selector_colores)
+        fila_perdida.addWidget(QLabel("Tolerancia:"))
+        self.selector_tolerancia = QSpinBox()
+        self.selector_tolerancia.setRange(0, 255)
+        fila_perdida.addWidget(self.selector_tolerancia)
+        diseño.addLayout(fila_perdida)
+
         btn_comprimir = QPushButton("Comprimir")
         btn_comprimir.setMinimumHeight(40)
         btn_comprimir.clicked.connect(self.comprimir_imagen_metodo)
@@ -365,32 +381,6 @@ class VentanaCompresionImagen(QWidget):
             self.ruta_archivo = ruta_archivo
             self.etiqueta_archivo.setText(f"Archivo: {os.path.basename(ruta_archivo)}")
 
-    def aplanar_imagen(self, imagen):
-        # Aplana matriz de imagen
-        return [pixel for fila in imagen for pixel in fila]
-
-    def comprimir_rle(self, secuencia):
-        # Compresión RLE
-        comprimidos = []
-        actual = secuencia[0]
-        conteo = 1
-        for pixel in secuencia[1:]:
-            if pixel == actual:
-                conteo += 1
-            else:
-                comprimidos.append((actual, conteo))
-                actual = pixel
-                conteo = 1
-        comprimidos.append((actual, conteo))
-        return comprimidos
-
-    def descomprimir_rle(self, comprimidos):
-        # Descompresión RLE
-        secuencia = []
-        for color, cantidad in comprimidos:
-            secuencia.extend([color] * cantidad)
-        return secuencia
-
     def comprimir_imagen_metodo(self):
         # Comprime la imagen seleccionada
         if not self.ruta_archivo:
@@ -400,19 +390,6 @@ class VentanaCompresionImagen(QWidget):
             return
 
         try:
-            # Cargar y convertir imagen
-            imagen = Image.open(self.ruta_archivo)
-            imagen = imagen.convert("RGB")
-
-            ancho, alto = imagen.size
-            pixeles = [
-                [imagen.getpixel((x, y)) for x in range(ancho)] for y in range(alto)
-            ]
-
-            # Comprimir
-            imagen_aplanada = self.aplanar_imagen(pixeles)
-            ejecuciones_globales = self.comprimir_rle(imagen_aplanada)
-
             # Crear carpeta comprimidos si no existe
             directorio_comprimidos = os.path.join(
                 os.getcwd(), "archivos", "comprimidos"
@@ -425,18 +402,17 @@ class VentanaCompresionImagen(QWidget):
                 directorio_comprimidos, nombre_base + "_comprimido.bin"
             )
 
-            # Guardar
-            with open(archivo_salida, "wb") as f:
-                # Guardar dimensiones primero
-                f.write(ancho.to_bytes(4, byteorder="big"))
-                f.write(alto.to_bytes(4, byteorder="big"))
-                # Guardar datos RLE
-                for color, rep in ejecuciones_globales:
-                    f.write(bytes(color))
-                    f.write(rep.to_bytes(2, byteorder="big"))
+            # Comprimir y guardar
+            ancho, alto, modo, psnr = comprimir_imagen(
+                self.ruta_archivo,
+                archivo_salida,
+                colores=self.selector_colores.value() or None,
+                tolerancia=self.selector_tolerancia.value(),
+            )
 
             # Calcular estadísticas CORRECTAMENTE
-            tamaño_raw = ancho * alto * 3  # Tamaño sin comprimir (RAW RGB)
+            # Tamaño sin comprimir (RAW en el modo de la imagen)
+            tamaño_raw = ancho * alto * bytes_por_pixel(modo)
             tamaño_png = os.path.getsize(
                 self.ruta_archivo
             )  # Tamaño del PNG/JPG original
@@ -447,7 +423,7 @@ class VentanaCompresionImagen(QWidget):
             )
 
             texto_resultado = "Compresión exitosa!\n"
-            texto_resultado += f"Dimensiones: {ancho} × {alto}\n"
+            texto_resultado += f"Dimensiones: {ancho} × {alto} ({modo})\n"
             texto_resultado += "━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
             texto_resultado += f"Tamaño RAW (sin comprimir): {tamaño_raw:,} bytes ({tamaño_raw / 1024:.2f} KB)\n"
             texto_resultado += f"Tamaño PNG/JPG original: {tamaño_png:,} bytes ({tamaño_png / 1024:.2f} KB)\n"
@@ -455,6 +431,10 @@ class VentanaCompresionImagen(QWidget):
             texto_resultado += "━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
             texto_resultado += f"Ratio compresión (vs RAW): {ratio:.2f}:1\n"
             texto_resultado += f"Porcentaje de reducción (Comprimido vs RAW): {ahorro_porcentaje:.1f}%\n"
+            if psnr == float("inf"):
+                texto_resultado += "PSNR: ∞ (sin pérdida)\n"
+            else:
+                texto_resultado += f"PSNR: {psnr:.2f} dB (con pérdida)\n"
             texto_resultado += "━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
             texto_resultado += f"Archivo guardado en: archivos/comprimidos/{os.path.basename(archivo_salida)}"
 
@@ -489,38 +469,6 @@ class VentanaCompresionImagen(QWidget):
             return
 
         try:
-            # Leer archivo comprimido
-            with open(ruta_archivo, "rb") as f:
-                # Leer dimensiones
-                ancho = int.from_bytes(f.read(4), byteorder="big")
-                alto = int.from_bytes(f.read(4), byteorder="big")
-
-                # Leer datos RLE
-                ejecuciones = []
-                while True:
-                    bytes_color = f.read(3)
-                    if not bytes_color or len(bytes_color) < 3:
-                        break
-                    bytes_rep = f.read(2)
-                    if not bytes_rep or len(bytes_rep) < 2:
-                        break
-                    color = tuple(bytes_color)
-                    rep = int.from_bytes(bytes_rep, byteorder="big")
-                    ejecuciones.append((color, rep))
-
-            # Descomprimir
-            pixeles_recuperados = self.descomprimir_rle(ejecuciones)
-
-            # Reconstruir imagen
-            matriz_recuperada = [
-                pixeles_recuperados[i * ancho : (i + 1) * ancho] for i in range(alto)
-            ]
-
-            imagen_reconstruida = Image.new("RGB", (ancho, alto))
-            for y in range(alto):
-                for x in range(ancho):
-                    imagen_reconstruida.putpixel((x, y), matriz_recuperada[y][x])
-
             # Crear carpeta descomprimidos si no existe
             directorio_descomprimidos = os.path.join(
                 os.getcwd(), "archivos", "descomprimidos"
@@ -535,10 +483,11 @@ class VentanaCompresionImagen(QWidget):
             archivo_salida = os.path.join(
                 directorio_descomprimidos, nombre_base + "_descomprimido.png"
             )
-            imagen_reconstruida.save(archivo_salida)
+            # Descomprimir y guardar
+            ancho, alto, modo = descomprimir_imagen(ruta_archivo, archivo_salida)
 
             texto_resultado = "Descompresión exitosa!\n"
-            texto_resultado += f"Dimensiones: {ancho} × {alto}\n"
+            texto_resultado += f"Dimensiones: {ancho} × {alto} ({modo})\n"
             texto_resultado += f"Archivo guardado en: archivos/descomprimidos/{os.path.basename(archivo_salida)}"
 
             self.etiqueta_resultado_descompresion.setText(texto_resultado)
@@ -0,0 +1,265 @@
+import numpy as np
+
+from src import huffman_rapido
+
+# Etapa LZ77/LZSS vectorizada con NumPy, previa a Huffman.
+#
+# Las coincidencias se buscan con cadenas de hash: cada posición apunta a la
+# anterior con los mismos LONGITUD_MIN símbolos, y se prueban hasta
+# `profundidad` candidatos dentro de la ventana. La longitud de cada
+# coincidencia sólo se calcula (comparando palabras de varios símbolos) al
+# final de cada tramo de posiciones consecutivas con la misma distancia; el
+# resto del tramo la hereda de su sucesora (una menos por posición).
+#
+# El resultado sigue el esquema de DEFLATE: un flujo de literales/longitudes
+# (los literales son los propios símbolos; las longitudes se guardan como
+# `literales + código`), un flujo de códigos de distancia y los bits extra de
+# ambos. La descompresión recorre sólo las coincidencias y copia tramos de
+# bytes, sin tocar la salida símbolo a símbolo.
+
+# Longitudes mínima y máxima de una coincidencia
+LONGITUD_MIN = 4
+LONGITUD_MAX = 258
+# Distancia máxima por defecto y límite de la ventana
+VENTANA = 1 << 16
+VENTANA_MAX = 1 << 24
+# Candidatos de la cadena de hash probados por posición
+PROFUNDIDAD = 4
+
+
+def _a_codigos(valores):
+    # Valor -> (código, ancho de los bits extra, bits extra). Los valores
+    # menores que 4 son su propio código; el resto se agrupa en dos códigos
+    # por potencia de 2 (bit más alto en la posición k -> 2k o 2k + 1 según
+    # el bit siguiente) con k - 1 bits extra
+    valores = np.asarray(valores, dtype=np.int64)
+    k = np.frexp(valores.astype(np.float64))[1].astype(np.int64) - 1
+    grandes = valores >= 4
+    anchos = np.where(grandes, k - 1, 0)
+    siguiente = (valores >> np.maximum(k - 1, 0)) & 1
+    codigos = np.where(grandes, 2 * k + siguiente, valores)
+    extras = valores & ((np.int64(1) << anchos) - 1)
+    return codigos, anchos, extras
+
+
+def _anchos_extra(codigos):
+    return np.where(codigos >= 4, (codigos >> 1) - 1, 0)
+
+
+def _de_codigos(codigos, extras):
+    # Inverso de _a_codigos
+    anchos = _anchos_extra(codigos)
+    bases = np.where(codigos >= 4, (2 | (codigos & 1)) << anchos, codigos)
+    return bases + extras
+
+
+def n_codigos(maximo):
+    # Códigos necesarios para representar los valores de 0 a `maximo`
+    return int(_a_codigos([maximo])[0][0]) + 1
+
+
+def _claves(simbolos):
+    # Hash de los LONGITUD_MIN símbolos que empiezan en cada posición
+    m = len(simbolos) - LONGITUD_MIN + 1
+    claves = np.zeros(m, dtype=np.uint64)
+    for k in range(LONGITUD_MIN):
+        claves = claves * np.uint64(0x100000001B3) + simbolos[k : k + m]
+    return claves
+
+
+def _palabras(simbolos):
+    # Palabra de 64 bits con los símbolos que empiezan en cada posición (el
+    # primero en los bits bajos), para comparar varios símbolos a la vez
+    n = len(simbolos)
+    bits = 8 * simbolos.itemsize
+    relleno = np.zeros(n + 64 // bits, dtype=np.uint64)
+    relleno[:n] = simbolos
+    palabras = np.zeros(n, dtype=np.uint64)
+    for k in range(64 // bits):
+        palabras |= relleno[k : k + n] << np.uint64(bits * k)
+    return palabras, bits
+
+
+def _extender(palabras, bits, posiciones, candidatos, maximo):
+    # Longitud de coincidencia entre cada posición y su candidato, comparando
+    # una palabra de símbolos por paso
+    n = len(palabras)
+    por_palabra = 64 // bits
+    longitudes = np.zeros(len(posiciones), dtype=np.int64)
+    activos = np.arange(len(posiciones))
+    while len(activos):
+        desde = posiciones[activos] + longitudes[activos]
+        diferencia = (
+            palabras[desde] ^ palabras[candidatos[activos] + longitudes[activos]]
+        )
+        # Símbolos iguales antes del primer bit distinto
+        bajo = diferencia & (~diferencia + np.uint64(1))
+        iguales = np.frexp(bajo.astype(np.float64))[1] - 1
+        avance = np.where(diferencia == 0, por_palabra, iguales // bits)
+        longitudes[activos] += avance
+        seguir = (diferencia == 0) & (longitudes[activos] < maximo)
+        activos = activos[seguir & (desde + por_palabra < n)]
+    # El relleno del final puede contar como coincidencia: se recorta
+    return np.minimum(np.minimum(longitudes, n - posiciones), maximo)
+
+
+def _longitudes(simbolos, palabras, bits, posiciones, candidatos):
+    # Longitud de coincidencia para posiciones crecientes. Si la posición
+    # siguiente usa la misma distancia y el primer símbolo coincide, la
+    # longitud es la de la siguiente más uno: sólo se extienden las colas
+    distancias = posiciones - candidatos
+    iguales = simbolos[posiciones] == simbolos[candidatos]
+    continua = np.zeros(len(posiciones), dtype=bool)
+    continua[:-1] = (
+        (posiciones[1:] == posiciones[:-1] + 1)
+        & (distancias[1:] == distancias[:-1])
+        & iguales[:-1]
+    )
+    colas = np.flatnonzero(~continua)
+    largos = np.zeros(len(posiciones), dtype=np.int64)
+    largos[colas] = _extender(
+        palabras, bits, posiciones[colas], candidatos[colas], LONGITUD_MAX
+    )
+    # Cola de cada tramo: la primera que no continúa desde cada posición
+    marcas = np.where(continua, len(posiciones), np.arange(len(posiciones)))
+    cola = np.minimum.accumulate(marcas[::-1])[::-1]
+    return np.minimum(largos[cola] + posiciones[cola] - posiciones, LONGITUD_MAX)
+
+
+def buscar_coincidencias(simbolos, ventana=VENTANA, profundidad=PROFUNDIDAD):
+    # Mejor coincidencia (longitud, distancia) que empieza en cada posición
+    n = len(simbolos)
+    longitudes = np.zeros(n, dtype=np.int64)
+    distancias = np.zeros(n, dtype=np.int64)
+    if n < LONGITUD_MIN:
+        return longitudes, distancias
+
+    # Cadena de hash: posición anterior con la misma clave
+    claves = _claves(simbolos)
+    orden = np.argsort(claves, kind="stable")
+    mismas = claves[orden[1:]] == claves[orden[:-1]]
+    anterior = np.full(len(claves), -1, dtype=np.int64)
+    anterior[orden[1:][mismas]] = orden[:-1][mismas]
+
+    palabras, bits = _palabras(simbolos)
+    posiciones = np.flatnonzero(anterior >= 0)
+    candidatos = anterior[posiciones]
+    for _ in range(profundidad):
+        dentro = posiciones - candidatos <= ventana
+        posiciones, candidatos = posiciones[dentro], candidatos[dentro]
+        if len(posiciones) == 0:
+            break
+        largos = _longitudes(simbolos, palabras, bits, posiciones, candidatos)
+        mejores = largos > longitudes[posiciones]
+        longitudes[posiciones[mejores]] = largos[mejores]
+        distancias[posiciones[mejores]] = (posiciones - candidatos)[mejores]
+
+        # Siguiente candidato, salvo si ya hay una coincidencia máxima
+        siguientes = anterior[candidatos]
+        quedan = (siguientes >= 0) & (longitudes[posiciones] < LONGITUD_MAX)
+        posiciones, candidatos = posiciones[quedan], siguientes[quedan]
+
+    longitudes[longitudes < LONGITUD_MIN] = 0
+    return longitudes, distancias
+
+
+def analizar(
+    simbolos, literales, ventana=VENTANA, profundidad=PROFUNDIDAD, prefijo=None
+):
+    # Análisis voraz: en cada posición se toma la coincidencia si la hay.
+    # Devuelve (literales/longitudes, códigos de distancia, bits extra,
+    # n_bits extra); las longitudes valen `literales + código`. Con `prefijo`
+    # (el contenido de un diccionario) las coincidencias también pueden
+    # copiar de él, como si precediera a los símbolos
+    if not 0 < ventana <= VENTANA_MAX:
+        raise ValueError(f"Ventana fuera de rango: {ventana}")
+    simbolos = np.asarray(simbolos)
+    n = len(simbolos)
+    if prefijo is None:
+        longitudes, distancias = buscar_coincidencias(simbolos, ventana, profundidad)
+    else:
+        todos = np.concatenate((np.asarray(prefijo, dtype=simbolos.dtype), simbolos))
+        longitudes, distancias = buscar_coincidencias(todos, ventana, profundidad)
+        longitudes = longitudes[len(prefijo) :]
+        distancias = distancias[len(prefijo) :]
+
+    # Siguiente posición con coincidencia; sólo se itera por coincidencias
+    marcas = np.where(longitudes > 0, np.arange(n), n)
+    siguiente = np.minimum.accumulate(marcas[::-1])[::-1].tolist()
+    largos = longitudes.tolist()
+    inicios = []
+    posicion = 0
+    while posicion < n:
+        posicion = siguiente[posicion]
+        if posicion == n:
+            break
+        inicios.append(posicion)
+        posicion += largos[posicion]
+    inicios = np.array(inicios, dtype=np.int64)
+    largos = longitudes[inicios]
+
+    # Fichas en orden: literales sueltos y el inicio de cada coincidencia
+    bordes = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(bordes, inicios, 1)
+    np.add.at(bordes, inicios + largos, -1)
+    cubiertos = np.cumsum(bordes[:-1]) > 0
+    fichas = ~cubiertos
+    fichas[inicios] = True
+    posiciones = np.flatnonzero(fichas)
+
+    codigos_largo, anchos_largo, extras_largo = _a_codigos(largos - LONGITUD_MIN)
+    codigos_dist, anchos_dist, extras_dist = _a_codigos(distancias[inicios] - 1)
+    litlen = simbolos[posiciones].astype(np.int64)
+    litlen[cubiertos[posiciones]] = literales + codigos_largo
+
+    # Bits extra intercalados: longitud y distancia de cada coincidencia
+    anchos = np.column_stack((anchos_largo, anchos_dist)).ravel()
+    extras = np.column_stack((extras_largo, extras_dist)).ravel()
+    datos_extra, n_bits_extra = huffman_rapido.empaquetar_bits(extras, anchos)
+    return litlen, codigos_dist, datos_extra, n_bits_extra
+
+
+def reconstruir(litlen, codigos_dist, datos_extra, literales, tipo, prefijo=None):
+    # Inverso de analizar: devuelve los símbolos originales
+    litlen = np.asarray(litlen, dtype=np.int64)
+    codigos_dist = np.asarray(codigos_dist, dtype=np.int64)
+    coincidencias = litlen >= literales
+    codigos_largo = litlen[coincidencias] - literales
+    if len(codigos_largo) != len(codigos_dist):
+        raise ValueError("Flujo LZ corrupto: faltan distancias")
+
+    anchos = np.column_stack(
+        (_anchos_extra(codigos_largo), _anchos_extra(codigos_dist))
+    ).ravel()
+    extras = huffman_rapido.desempaquetar_bits(datos_extra, anchos)
+    extras = extras.astype(np.int64).reshape(-1, 2)
+    largos = _de_codigos(codigos_largo, extras[:, 0]) + LONGITUD_MIN
+    distancias = _de_codigos(codigos_dist, extras[:, 1]) + 1
+
+    # Se recorren sólo las coincidencias, copiando bytes por tramos: los
+    # literales previos de golpe y la copia (repitiendo el patrón si se
+    # solapa con lo que está escribiendo)
+    ancho = np.dtype(tipo).itemsize
+    largos = (largos * ancho).tolist()
+    distancias = (distancias * ancho).tolist()
+    literales_previos = np.flatnonzero(coincidencias) - np.arange(len(largos))
+    cortes = (literales_previos * ancho).tolist()
+    datos_literales = litlen[~coincidencias].astype(tipo).tobytes()
+
+    salida = bytearray()
+    if prefijo is not None:
+        salida += np.asarray(prefijo, dtype=tipo).tobytes()
+    inicio_salida = len(salida)
+    anterior = 0
+    for corte, largo, distancia in zip(cortes, largos, distancias):
+        salida += datos_literales[anterior:corte]
+        anterior = corte
+        inicio = len(salida) - distancia
+        if inicio < 0:
+            raise ValueError("Flujo LZ corrupto: distancia fuera del texto")
+        if distancia >= largo:
+            salida += salida[inicio : inicio + largo]
+        else:
+            salida += (salida[inicio:] * (largo // distancia + 1))[:largo]
+    salida += datos_literales[anterior:]
+    return np.frombuffer(salida, dtype=tipo)[inicio_salida // ancho :]
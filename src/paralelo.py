@@ -0,0 +1,19 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Ejecución de tareas independientes en un pool de procesos (bloques de
+# texto, teselas de imagen), compartida por los compresores.
+
+
+def en_paralelo(funcion, tareas, procesos):
+    # Aplica funcion a cada tarea en un pool de procesos y devuelve los
+    # resultados en orden; a lo sumo dos tareas por proceso en vuelo para
+    # que la memoria no dependa del tamaño del archivo
+    with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+        pendientes = deque()
+        for tarea in tareas:
+            pendientes.append(ejecutor.submit(funcion, *tarea))
+            if len(pendientes) >= 2 * procesos:
+                yield pendientes.popleft().result()
+        while pendientes:
+            yield pendientes.popleft().result()
@@ -0,0 +1,378 @@
+import io
+
+import numpy as np
+
+from src import huffman_rapido, rice
+
+# Predicción lineal sin pérdida para audio (al estilo FLAC), vectorizada con
+# NumPy.
+#
+# Cada canal se parte en tramas de TAMANO_TRAMA muestras y cada trama se
+# guarda como el residuo de un predictor: uno fijo (diferencias sucesivas
+# de orden 0 a ORDEN_FIJO_MAX) o uno LPC con coeficientes cuantizados
+# (Levinson-Durbin sobre la autocorrelación de la trama con ventana de
+# Hann). Todos los candidatos se evalúan para todas las tramas a la vez y
+# cada trama se queda con el de menos bits estimados. Las tramas son
+# independientes: antes de la primera muestra se supone silencio, así no
+# hace falta guardar muestras de arranque aparte.
+#
+# Las tramas cuyas muestras valen todas lo mismo (silencio digital, huecos)
+# guardan ese valor una vez y no tienen residuos.
+#
+# Deshacer un predictor fijo son sumas acumuladas; el LPC es recursivo y se
+# reconstruye muestra a muestra, pero con todas las tramas LPC a la vez.
+#
+# Los residuos (en zigzag) van a un flujo Huffman con su tabla o a un
+# código de Rice con un parámetro por partición (src/rice.py); en modo
+# automático cada canal prueba los dos y se queda con el más chico (Rice
+# suele ganar con ruido y Huffman con señales tonales o de 8 bits).
+#
+# En estéreo cada trama puede guardar, en lugar de (izquierdo, derecho),
+# el par con lateral = izquierdo - derecho y/o medio = (izquierdo +
+# derecho) >> 1 que menos bits estime con los predictores fijos; el bit
+# bajo del medio perdido es el de lateral, así que la transformación no
+# pierde nada.
+
+# Muestras por trama
+TAMANO_TRAMA = 4096
+# Orden máximo de los predictores fijos
+ORDEN_FIJO_MAX = 4
+# Órdenes LPC candidatos
+ORDENES_LPC = (8, 12)
+# Bits con signo de cada coeficiente LPC cuantizado
+PRECISION_LPC = 15
+# Corrimiento máximo de los coeficientes LPC
+DESPLAZAMIENTO_MAX = 15
+# Bit del byte de predictor que marca una trama LPC (el resto es el orden)
+PREDICTOR_LPC = 0x80
+# Byte de predictor de una trama constante
+PREDICTOR_CONSTANTE = 0x40
+# Tramas que se analizan a la vez (limita la memoria temporal)
+TRAMAS_POR_BLOQUE = 256
+# Codificadores de residuos; con el automático cada canal guarda un byte
+# con el que eligió
+RESIDUOS_HUFFMAN = 0
+RESIDUOS_RICE = 1
+RESIDUOS_AUTOMATICO = 2
+CODIFICADORES_RESIDUOS = (RESIDUOS_HUFFMAN, RESIDUOS_RICE, RESIDUOS_AUTOMATICO)
+# Modos estéreo de una trama: (primera, segunda) señal codificada
+ESTEREO_IZQUIERDO_DERECHO = 0
+ESTEREO_IZQUIERDO_LATERAL = 1
+ESTEREO_LATERAL_DERECHO = 2
+ESTEREO_MEDIO_LATERAL = 3
+
+
+def _zigzag(valores):
+    return (valores << 1) ^ (valores >> 63)
+
+
+def _deszigzag(valores):
+    return (valores >> 1) ^ -(valores & 1)
+
+
+def _bits_estimados(residuos):
+    # Bits aproximados del residuo de cada trama: para una distribución de
+    # Laplace un código de Rice gasta ~log2(media |r|) + 2 bits por muestra
+    medias = np.abs(residuos).mean(axis=1)
+    return residuos.shape[1] * (np.log2(1 + medias) + 2)
+
+
+def _tramas(muestras, tamano, tipo=np.int64):
+    # Matriz (tramas, tamano), con ceros después de la última muestra
+    n = len(muestras)
+    tramas = np.zeros(-(-n // tamano) * tamano, dtype=tipo)
+    tramas[:n] = muestras
+    return tramas.reshape(-1, tamano)
+
+
+def _constantes(tramas, n):
+    # Tramas cuyas n primeras muestras (las reales; el resto es relleno de
+    # la última trama) valen todas lo mismo
+    iguales = tramas == tramas[:, :1]
+    iguales[-1, n - (len(tramas) - 1) * tramas.shape[1] :] = True
+    return iguales.all(axis=1)
+
+
+def _bits_estereo(izquierdo, derecho):
+    # Bits estimados de cada trama de izquierdo, derecho, lateral y medio
+    # con su mejor predictor fijo (4, tramas). Los residuos fijos son
+    # lineales: los del lateral y el medio salen de los de los canales (los
+    # del medio, aproximados por el redondeo)
+    bits = None
+    for orden in range(ORDEN_FIJO_MAX + 1):
+        if orden:
+            izquierdo = np.diff(izquierdo, axis=1, prepend=0)
+            derecho = np.diff(derecho, axis=1, prepend=0)
+        senales = (izquierdo, derecho, izquierdo - derecho, (izquierdo + derecho) >> 1)
+        candidatos = np.stack([_bits_estimados(senal) for senal in senales])
+        bits = candidatos if bits is None else np.minimum(bits, candidatos)
+    return bits
+
+
+def _coeficientes_lpc(tramas, orden):
+    # Coeficientes cuantizados (tramas, orden) y su corrimiento por trama:
+    # la predicción de x[n] es (sum_j q[j] * x[n - 1 - j]) >> corrimiento
+    n_tramas, tamano = tramas.shape
+    ventanas = tramas * np.hanning(tamano + 2)[1:-1]
+    autocorrelacion = np.empty((n_tramas, orden + 1))
+    for retardo in range(orden + 1):
+        autocorrelacion[:, retardo] = np.einsum(
+            "ij,ij->i", ventanas[:, retardo:], ventanas[:, : tamano - retardo]
+        )
+    # Levinson-Durbin para todas las tramas a la vez (un ruido mínimo en el
+    # retardo 0 evita divisiones por cero en tramas de silencio)
+    error = autocorrelacion[:, 0] * (1 + 1e-9) + 1e-9
+    a = np.zeros((n_tramas, orden))
+    for i in range(orden):
+        reflexion = autocorrelacion[:, i + 1] - np.einsum(
+            "ij,ij->i", a[:, :i], autocorrelacion[:, i:0:-1]
+        )
+        reflexion /= error
+        if i:
+            a[:, :i] -= reflexion[:, None] * a[:, i - 1 :: -1]
+        a[:, i] = reflexion
+        error *= np.maximum(1 - reflexion**2, 1e-9)
+
+    maximos = np.abs(a).max(axis=1)
+    enteros = np.ceil(np.log2(np.maximum(maximos, 1e-9))).astype(np.int64)
+    desplazamientos = np.clip(PRECISION_LPC - 1 - enteros, 0, DESPLAZAMIENTO_MAX)
+    limite = (1 << (PRECISION_LPC - 1)) - 1
+    coeficientes = np.clip(
+        np.rint(a * (1 << desplazamientos)[:, None]), -limite, limite
+    ).astype(np.int64)
+    return coeficientes, desplazamientos
+
+
+def _residuos_lpc(tramas, coeficientes, desplazamientos):
+    prediccion = np.zeros_like(tramas)
+    for j in range(coeficientes.shape[1]):
+        prediccion[:, j + 1 :] += coeficientes[:, j, None] * tramas[:, : -j - 1]
+    return tramas - (prediccion >> desplazamientos[:, None])
+
+
+def _analizar(tramas):
+    # Mejor predictor de cada trama: (bytes de predictor, coeficientes LPC
+    # por trama, corrimientos, residuos)
+    residuos = tramas.copy()
+    bits = _bits_estimados(residuos)
+    predictores = np.zeros(len(tramas), dtype=np.uint8)
+    candidatos = tramas
+    for orden in range(1, ORDEN_FIJO_MAX + 1):
+        # El predictor fijo de orden k deja la k-ésima diferencia
+        candidatos = np.diff(candidatos, axis=1, prepend=0)
+        bits_candidatos = _bits_estimados(candidatos)
+        mejores = bits_candidatos < bits
+        residuos[mejores] = candidatos[mejores]
+        bits[mejores] = bits_candidatos[mejores]
+        predictores[mejores] = orden
+
+    coeficientes = [None] * len(tramas)
+    desplazamientos = np.zeros(len(tramas), dtype=np.int64)
+    for orden in ORDENES_LPC:
+        q, corrimientos = _coeficientes_lpc(tramas, orden)
+        candidatos = _residuos_lpc(tramas, q, corrimientos)
+        bits_candidatos = _bits_estimados(candidatos) + orden * PRECISION_LPC
+        mejores = bits_candidatos < bits
+        residuos[mejores] = candidatos[mejores]
+        bits[mejores] = bits_candidatos[mejores]
+        predictores[mejores] = PREDICTOR_LPC | orden
+        desplazamientos[mejores] = corrimientos[mejores]
+        for i in np.flatnonzero(mejores).tolist():
+            coeficientes[i] = q[i]
+    return predictores, coeficientes, desplazamientos, residuos
+
+
+def _reconstruir_lpc(residuos, coeficientes, desplazamientos):
+    # Deshace el LPC muestra a muestra para todas las tramas a la vez; las
+    # tramas van en columnas (filas contiguas por muestra) y los
+    # coeficientes de orden menor se completan con ceros
+    orden = coeficientes.shape[1]
+    tamano = residuos.shape[1]
+    muestras = np.zeros((orden + tamano, len(residuos)), dtype=np.int64)
+    pesos = np.ascontiguousarray(coeficientes[:, ::-1].T)
+    columnas = np.ascontiguousarray(residuos.T)
+    for n in range(tamano):
+        prediccion = np.einsum("ij,ij->j", muestras[n : n + orden], pesos)
+        muestras[n + orden] = columnas[n] + (prediccion >> desplazamientos)
+    return muestras[orden:].T
+
+
+def _escribir_residuos(f, valores, codificador):
+    # Residuos en zigzag con `codificador`; el automático antepone el byte
+    # del codificador que ocupa menos
+    if codificador == RESIDUOS_AUTOMATICO:
+        candidatos = []
+        for elegido in (RESIDUOS_HUFFMAN, RESIDUOS_RICE):
+            salida = io.BytesIO()
+            salida.write(bytes([elegido]))
+            _escribir_residuos(salida, valores, elegido)
+            candidatos.append(salida.getvalue())
+        f.write(min(candidatos, key=len))
+    elif codificador == RESIDUOS_RICE:
+        rice.escribir(f, valores)
+    else:
+        huffman_rapido.escribir_flujo(f, valores)
+
+
+def _leer_residuos(f, codificador):
+    # Inverso de _escribir_residuos
+    if codificador == RESIDUOS_AUTOMATICO:
+        elegido = f.read(1)
+        if not elegido or elegido[0] not in (RESIDUOS_HUFFMAN, RESIDUOS_RICE):
+            raise ValueError("Codificador de residuos inválido")
+        codificador = elegido[0]
+    if codificador == RESIDUOS_RICE:
+        return rice.leer(f)
+    return huffman_rapido.leer_flujo(f)
+
+
+def escribir(f, muestras, codificador=RESIDUOS_AUTOMATICO, tamano=TAMANO_TRAMA):
+    # Codifica las muestras enteras de un canal: tamaño de trama, un byte de
+    # predictor por trama, el corrimiento de cada trama LPC, sus
+    # coeficientes y el valor de cada trama constante (varints en zigzag) y
+    # los residuos de las demás tramas con `codificador`
+    if codificador not in CODIFICADORES_RESIDUOS:
+        raise ValueError(f"Codificador de residuos desconocido: {codificador}")
+    n = len(muestras)
+    tramas = _tramas(muestras, tamano)
+    n_tramas = len(tramas)
+
+    predictores, coeficientes, desplazamientos, valores = [], [], [], []
+    residuos = np.empty(n_tramas * tamano, dtype=np.int64)
+    for inicio in range(0, n_tramas, TRAMAS_POR_BLOQUE):
+        bloque = tramas[inicio : inicio + TRAMAS_POR_BLOQUE]
+        elegidos, q, corrimientos, residuos_bloque = _analizar(bloque)
+        constantes = _constantes(bloque, n - inicio * tamano)
+        elegidos[constantes] = PREDICTOR_CONSTANTE
+        lpc = elegidos >= PREDICTOR_LPC
+        predictores.append(elegidos)
+        coeficientes += [q[i] for i in np.flatnonzero(lpc).tolist()]
+        desplazamientos.append(corrimientos[lpc])
+        valores.append(bloque[constantes, 0])
+        residuos[inicio * tamano : inicio * tamano + bloque.size] = (
+            residuos_bloque.ravel()
+        )
+
+    vacio = [np.empty(0, dtype=np.int64)]
+    predictores = np.concatenate(predictores + [vacio[0].astype(np.uint8)])
+    huffman_rapido.escribir_varint(f, tamano)
+    f.write(predictores.tobytes())
+    f.write(np.concatenate(desplazamientos + vacio).astype(np.uint8).tobytes())
+    f.write(
+        huffman_rapido.empaquetar_varints(_zigzag(np.concatenate(coeficientes + vacio)))
+    )
+    f.write(huffman_rapido.empaquetar_varints(_zigzag(np.concatenate(valores + vacio))))
+    # Los residuos de las tramas constantes y del relleno de la última trama
+    # no se guardan: la predicción es causal y ninguna muestra real depende
+    # de ellos
+    guardados = np.repeat(predictores != PREDICTOR_CONSTANTE, tamano)[:n]
+    _escribir_residuos(f, _zigzag(residuos[:n][guardados]), codificador)
+
+
+def leer(f, n, codificador=RESIDUOS_AUTOMATICO):
+    # Inverso de escribir: devuelve las n muestras del canal (int64)
+    tamano = huffman_rapido.leer_varint(f)
+    if tamano == 0:
+        raise ValueError("Tamaño de trama de audio inválido")
+    n_tramas = -(-n // tamano) if n else 0
+    predictores = np.frombuffer(f.read(n_tramas), dtype=np.uint8)
+    if len(predictores) != n_tramas:
+        raise ValueError("Archivo truncado: faltan predictores")
+    lpc = predictores >= PREDICTOR_LPC
+    constantes = predictores == PREDICTOR_CONSTANTE
+    ordenes = (predictores & ~np.uint8(PREDICTOR_LPC)).astype(np.int64)
+    if np.any(ordenes[~lpc & ~constantes] > ORDEN_FIJO_MAX):
+        raise ValueError("Predictor de audio inválido")
+    desplazamientos = np.frombuffer(f.read(int(lpc.sum())), dtype=np.uint8)
+    if len(desplazamientos) != lpc.sum():
+        raise ValueError("Archivo truncado: faltan corrimientos LPC")
+    coeficientes = _deszigzag(huffman_rapido.leer_varints(f, int(ordenes[lpc].sum())))
+    valores = _deszigzag(huffman_rapido.leer_varints(f, int(constantes.sum())))
+    residuos = _deszigzag(_leer_residuos(f, codificador))
+    guardados = np.repeat(~constantes, tamano)[:n]
+    if len(residuos) != np.count_nonzero(guardados):
+        raise ValueError("Archivo truncado: faltan residuos")
+
+    tramas = np.zeros(n_tramas * tamano, dtype=np.int64)
+    tramas[:n][guardados] = residuos
+    tramas = tramas.reshape(n_tramas, tamano)
+    tramas[constantes] = valores[:, None]
+    for orden in range(1, ORDEN_FIJO_MAX + 1):
+        elegidas = np.flatnonzero(~lpc & (ordenes == orden))
+        for _ in range(orden):
+            tramas[elegidas] = np.cumsum(tramas[elegidas], axis=1)
+
+    elegidas = np.flatnonzero(lpc)
+    if len(elegidas):
+        # Coeficientes de cada trama LPC en una matriz completada con ceros
+        ordenes_lpc = ordenes[elegidas]
+        matriz = np.zeros((len(elegidas), int(ordenes_lpc.max())), dtype=np.int64)
+        columnas = np.arange(matriz.shape[1])
+        matriz[columnas < ordenes_lpc[:, None]] = coeficientes
+        tramas[elegidas] = _reconstruir_lpc(
+            tramas[elegidas], matriz, desplazamientos.astype(np.int64)
+        )
+    return tramas.ravel()[:n]
+
+
+def codificar(muestras, codificador=RESIDUOS_AUTOMATICO):
+    # escribir a bytes (para los procesos del pool)
+    salida = io.BytesIO()
+    escribir(salida, muestras, codificador)
+    return salida.getvalue()
+
+
+def decodificar(datos, n, codificador=RESIDUOS_AUTOMATICO):
+    # leer desde bytes (para los procesos del pool)
+    return leer(io.BytesIO(datos), n, codificador)
+
+
+def estereo(izquierdo, derecho, tamano=TAMANO_TRAMA):
+    # Elige el modo estéreo de cada trama; devuelve (modos, primera señal,
+    # segunda señal), las señales como int32 del largo de los canales
+    n = len(izquierdo)
+    modos = np.empty(-(-n // tamano), dtype=np.uint8)
+    primera = np.empty(len(modos) * tamano, dtype=np.int32)
+    segunda = np.empty(len(modos) * tamano, dtype=np.int32)
+    por_bloque = TRAMAS_POR_BLOQUE * tamano
+    for inicio in range(0, n, por_bloque):
+        fin = min(n, inicio + por_bloque)
+        izq = _tramas(izquierdo[inicio:fin], tamano, np.int32)
+        der = _tramas(derecho[inicio:fin], tamano, np.int32)
+        lat = izq - der
+        med = (izq + der) >> 1
+        bits_izq, bits_der, bits_lat, bits_med = _bits_estereo(izq, der)
+        costos = np.stack(
+            [
+                bits_izq + bits_der,
+                bits_izq + bits_lat,
+                bits_lat + bits_der,
+                bits_med + bits_lat,
+            ]
+        )
+        elegidos = costos.argmin(axis=0)
+        primeras = np.choose(elegidos[:, None], [izq, izq, lat, med])
+        segundas = np.choose(elegidos[:, None], [der, lat, der, lat])
+        trama = inicio // tamano
+        modos[trama : trama + len(elegidos)] = elegidos
+        primera[inicio : inicio + primeras.size] = primeras.ravel()
+        segunda[inicio : inicio + segundas.size] = segundas.ravel()
+    return modos, primera[:n], segunda[:n]
+
+
+def desestereo(modos, primera, segunda, tamano=TAMANO_TRAMA):
+    # Inverso de estereo: devuelve (izquierdo, derecho) como int64
+    n = len(primera)
+    if len(modos) != -(-n // tamano) or np.any(modos > ESTEREO_MEDIO_LATERAL):
+        raise ValueError("Modos estéreo inválidos")
+    izquierdo, derecho = _tramas(primera, tamano), _tramas(segunda, tamano)
+    filas = modos == ESTEREO_IZQUIERDO_LATERAL
+    derecho[filas] = izquierdo[filas] - derecho[filas]
+    filas = modos == ESTEREO_LATERAL_DERECHO
+    izquierdo[filas] += derecho[filas]
+    filas = modos == ESTEREO_MEDIO_LATERAL
+    lateral = derecho[filas]
+    doble_medio = (izquierdo[filas] << 1) | (lateral & 1)
+    izquierdo[filas] = (doble_medio + lateral) >> 1
+    derecho[filas] = (doble_medio - lateral) >> 1
+    return izquierdo.ravel()[:n], derecho.ravel()[:n]
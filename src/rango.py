@@ -0,0 +1,261 @@
+import io
+
+import numpy as np
+
+from src import huffman_rapido
+
+# Codificador por rangos (variante rANS) con modelos de contexto de orden 0 u
+# orden 1, vectorizado con NumPy.
+#
+# Las frecuencias se cuentan por bloque y se cuantizan a ESCALA; así se gasta
+# la fracción de bit que Huffman pierde por símbolo y, en orden 1, cada
+# símbolo se codifica con las estadísticas del símbolo anterior. Para usar
+# NumPy el bloque se reparte en carriles contiguos con un estado de 32 bits
+# cada uno: en cada paso se codifica (o decodifica) un símbolo de todos los
+# carriles a la vez, con aritmética entera, y la renormalización de todos
+# los carriles emite (o lee) palabras de 16 bits en una sola operación.
+
+# Bits de precisión de las frecuencias cuantizadas
+ESCALA_BITS = 15
+ESCALA = 1 << ESCALA_BITS
+# Símbolos distintos máximos por contexto (cada uno necesita frecuencia >= 1)
+ALFABETO_MAX = ESCALA
+# Límite inferior del estado; por debajo se lee una palabra de 16 bits
+ESTADO_MIN = 1 << 16
+# Carriles máximos y símbolos mínimos por carril (cada carril guarda su
+# estado final: 4 bytes)
+CARRILES_MAX = 1024
+SIMBOLOS_POR_CARRIL_MIN = 2048
+# Claves (contexto, símbolo) posibles hasta las que el modelo se cuenta con
+# un arreglo directo en vez de ordenando el bloque
+CLAVES_DIRECTAS_MAX = 1 << 20
+
+
+def _cuantizar(conteos):
+    # Frecuencias >= 1 que suman exactamente ESCALA
+    frecuencias = np.maximum(conteos * ESCALA // conteos.sum(), 1)
+    sobra = int(frecuencias.sum()) - ESCALA
+    if sobra < 0:
+        frecuencias[np.argmax(conteos)] -= sobra
+    elif sobra > 0:
+        # Se descuenta de las mayores sin bajar ninguna de 1
+        orden = np.argsort(-frecuencias, kind="stable")
+        disponibles = np.cumsum(frecuencias[orden] - 1)
+        frecuencias[orden] -= np.diff(np.minimum(disponibles, sobra), prepend=0)
+    return frecuencias
+
+
+def _contextos(simbolos, n_simbolos, por_carril, orden):
+    # Contexto de cada posición: el símbolo anterior del mismo carril (el
+    # primero de cada carril usa el contexto extra `n_simbolos`), o 0
+    if orden == 0:
+        return np.zeros(len(simbolos), dtype=np.int64)
+    contextos = np.empty(len(simbolos), dtype=np.int64)
+    contextos[1:] = simbolos[:-1]
+    contextos[::por_carril] = n_simbolos
+    return contextos
+
+
+def _inicios(contextos, frecuencias):
+    # Frecuencia acumulada (exclusiva) dentro del contexto de cada entrada
+    acumuladas = np.cumsum(frecuencias) - frecuencias
+    primeras = np.flatnonzero(np.diff(contextos, prepend=-1))
+    grupo = np.cumsum(np.diff(contextos, prepend=-1) != 0) - 1
+    return acumuladas - acumuladas[primeras][grupo]
+
+
+def _modelo(simbolos, contextos, n_simbolos):
+    # Entradas (contexto, símbolo, frecuencia, inicio acumulado) ordenadas,
+    # y la entrada que usa cada posición
+    claves = contextos * n_simbolos + simbolos
+    if (n_simbolos + 1) * n_simbolos <= CLAVES_DIRECTAS_MAX:
+        # Conteo directo por clave, sin ordenar el bloque
+        conteos = np.bincount(claves)
+        presentes = np.flatnonzero(conteos)
+        numeros = np.zeros(len(conteos), dtype=np.int64)
+        numeros[presentes] = np.arange(len(presentes))
+        claves, posiciones, conteos = presentes, numeros[claves], conteos[presentes]
+    else:
+        claves, posiciones, conteos = np.unique(
+            claves, return_inverse=True, return_counts=True
+        )
+    entrada_contexto = claves // n_simbolos
+    cortes = np.flatnonzero(np.diff(entrada_contexto)) + 1
+    frecuencias = np.concatenate(
+        [_cuantizar(parte) for parte in np.split(conteos, cortes)]
+    )
+    return (
+        entrada_contexto,
+        claves % n_simbolos,
+        frecuencias,
+        _inicios(entrada_contexto, frecuencias),
+        posiciones.ravel(),
+        conteos,
+    )
+
+
+def _escribir_modelo(f, contextos, simbolos, frecuencias):
+    # Por cada contexto usado: salto desde el anterior, cantidad de símbolos
+    # y (salto de símbolo, frecuencia - 1) de cada uno; todo como varints
+    # armados de una vez
+    n = len(contextos)
+    if n == 0:
+        return
+    primeras = np.flatnonzero(np.diff(contextos, prepend=-1))
+    grupo = np.cumsum(np.diff(contextos, prepend=-1) != 0) - 1
+    saltos_simbolo = np.diff(simbolos, prepend=0)
+    saltos_simbolo[primeras] = simbolos[primeras]
+    valores = np.empty(2 * (len(primeras) + n), dtype=np.int64)
+    posiciones = 2 * (np.arange(n) + grupo + 1)
+    valores[posiciones] = saltos_simbolo
+    valores[posiciones + 1] = frecuencias - 1
+    encabezados = 2 * (primeras + np.arange(len(primeras)))
+    valores[encabezados] = np.diff(contextos[primeras], prepend=0)
+    valores[encabezados + 1] = np.diff(primeras, append=n)
+    f.write(huffman_rapido.empaquetar_varints(valores))
+
+
+def _leer_modelo(f, n_grupos):
+    # Los pares (salto de símbolo, frecuencia - 1) de cada contexto se leen
+    # de una vez
+    contextos, simbolos, frecuencias = [], [], []
+    contexto = 0
+    for _ in range(n_grupos):
+        contexto += huffman_rapido.leer_varint(f)
+        cantidad = huffman_rapido.leer_varint(f)
+        valores = huffman_rapido.leer_varints(f, 2 * cantidad)
+        contextos.append(np.full(cantidad, contexto, dtype=np.int64))
+        simbolos.append(np.cumsum(valores[0::2]))
+        frecuencias.append(valores[1::2] + 1)
+    vacio = [np.empty(0, dtype=np.int64)]
+    contextos = np.concatenate(contextos + vacio)
+    frecuencias = np.concatenate(frecuencias + vacio)
+    simbolos = np.concatenate(simbolos + vacio)
+    return contextos, simbolos, frecuencias, _inicios(contextos, frecuencias)
+
+
+def _carriles(n):
+    carriles = max(1, min(CARRILES_MAX, n // SIMBOLOS_POR_CARRIL_MIN))
+    return carriles, -(-n // carriles)
+
+
+def _activos(n, por_carril, paso):
+    # Los carriles activos en un paso son siempre un prefijo
+    return -(-(n - paso) // por_carril)
+
+
+def _codificar(frecuencias, inicios, n, carriles, por_carril):
+    # rANS entrelazado: recorre los pasos de atrás hacia adelante; devuelve
+    # (estados finales, palabras en el orden en que las leerá el decodificador)
+    matriz = np.zeros(carriles * por_carril, dtype=np.int64)
+    matriz[:n] = np.arange(n)
+    matriz = matriz.reshape(carriles, por_carril).T
+    tabla_f = frecuencias.astype(np.uint64)[matriz]
+    tabla_i = inicios.astype(np.uint64)[matriz]
+
+    estados = np.full(carriles, ESTADO_MIN, dtype=np.uint64)
+    limite = np.uint64((ESTADO_MIN >> ESCALA_BITS) << 16)
+    palabras = []
+    for paso in range(por_carril - 1, -1, -1):
+        activos = _activos(n, por_carril, paso)
+        x = estados[:activos]
+        f = tabla_f[paso, :activos]
+        desborda = x >= limite * f
+        palabras.append(x[desborda] & np.uint64(0xFFFF))
+        x = np.where(desborda, x >> np.uint64(16), x)
+        estados[:activos] = (
+            ((x // f) << np.uint64(ESCALA_BITS)) + x % f + tabla_i[paso, :activos]
+        )
+    palabras = np.concatenate(palabras)[::-1] if palabras else np.empty(0)
+    return estados, palabras.astype(np.uint16)
+
+
+def _costo(conteos, frecuencias, modelo):
+    # Bits estimados: contenido según las frecuencias cuantizadas + modelo
+    contenido = conteos @ (ESCALA_BITS - np.log2(frecuencias))
+    return contenido + 8 * len(modelo)
+
+
+def escribir(f, simbolos, n_simbolos):
+    # Codifica índices de símbolo (0 .. n_simbolos - 1) eligiendo el orden
+    # del modelo (0 u 1) que dé el resultado más pequeño
+    simbolos = np.asarray(simbolos, dtype=np.int64)
+    n = len(simbolos)
+    carriles, por_carril = _carriles(n)
+
+    mejor = None
+    for orden in (0, 1):
+        contextos = _contextos(simbolos, n_simbolos, por_carril, orden)
+        modelo = _modelo(simbolos, contextos, n_simbolos)
+        if n and np.bincount(modelo[0]).max() > ALFABETO_MAX:
+            raise ValueError("Demasiados símbolos para el codificador por rangos")
+        tabla = io.BytesIO()
+        _escribir_modelo(tabla, *modelo[:3])
+        costo = _costo(modelo[5], modelo[2], tabla.getbuffer())
+        if mejor is None or costo < mejor[0]:
+            mejor = (costo, orden, modelo, tabla.getvalue())
+    _, orden, modelo, tabla = mejor
+
+    contextos, _, frecuencias, inicios, posiciones, _ = modelo
+    estados, palabras = _codificar(
+        frecuencias[posiciones], inicios[posiciones], n, carriles, por_carril
+    )
+    f.write(bytes([orden]))
+    huffman_rapido.escribir_varint(f, n)
+    huffman_rapido.escribir_varint(f, carriles)
+    huffman_rapido.escribir_varint(f, len(np.unique(contextos)))
+    f.write(tabla)
+    f.write(estados.astype("<u4").tobytes())
+    huffman_rapido.escribir_varint(f, len(palabras))
+    f.write(palabras.astype("<u2").tobytes())
+
+
+def leer(f, n_simbolos):
+    # Inverso de escribir: devuelve los índices de símbolo
+    orden = f.read(1)[0]
+    n = huffman_rapido.leer_varint(f)
+    carriles = huffman_rapido.leer_varint(f)
+    n_grupos = huffman_rapido.leer_varint(f)
+    contextos, simbolos, frecuencias, inicios = _leer_modelo(f, n_grupos)
+    datos = f.read(4 * carriles)
+    if len(datos) != 4 * carriles:
+        raise ValueError("Archivo truncado: faltan estados del codificador")
+    estados = np.frombuffer(datos, dtype="<u4").astype(np.uint64)
+    n_palabras = huffman_rapido.leer_varint(f)
+    datos = f.read(2 * n_palabras)
+    if len(datos) != 2 * n_palabras:
+        raise ValueError("Archivo truncado: faltan datos del codificador")
+    palabras = np.frombuffer(datos, dtype="<u2").astype(np.uint64)
+
+    # Búsqueda de la entrada: clave (contexto, inicio acumulado) ordenada
+    claves = contextos * ESCALA + inicios
+    frecuencias = frecuencias.astype(np.uint64)
+    inicios = inicios.astype(np.uint64)
+    mascara = np.uint64(ESCALA - 1)
+
+    por_carril = -(-n // carriles) if n else 0
+    salida = np.zeros((por_carril, carriles), dtype=np.int64)
+    contexto = np.full(carriles, n_simbolos if orden else 0, dtype=np.int64)
+    leidas = 0
+    for paso in range(por_carril):
+        activos = _activos(n, por_carril, paso)
+        x = estados[:activos]
+        ranura = x & mascara
+        buscadas = contexto[:activos] * ESCALA + ranura.astype(np.int64)
+        entradas = np.searchsorted(claves, buscadas, "right") - 1
+        x = frecuencias[entradas] * (x >> np.uint64(ESCALA_BITS)) + (
+            ranura - inicios[entradas]
+        )
+        # Los carriles que bajan del mínimo leen una palabra (en orden inverso
+        # al que se escribieron)
+        bajos = np.flatnonzero(x < ESTADO_MIN)[::-1]
+        x[bajos] = (x[bajos] << np.uint64(16)) | palabras[leidas : leidas + len(bajos)]
+        leidas += len(bajos)
+        estados[:activos] = x
+        salida[paso, :activos] = simbolos[entradas]
+        if orden:
+            contexto[:activos] = simbolos[entradas]
+
+    if leidas != n_palabras or np.any(estados != ESTADO_MIN):
+        raise ValueError("Flujo del codificador por rangos corrupto")
+    return salida.T.ravel()[:n]
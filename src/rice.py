@@ -0,0 +1,177 @@
+import numpy as np
+
+from src import huffman_rapido
+
+# Codificador de Rice adaptativo para enteros no negativos (residuos de
+# predicción en zigzag), vectorizado con NumPy.
+#
+# Los valores se reparten en particiones de MUESTRAS_POR_PARTICION (filas
+# de una matriz) y cada partición usa el parámetro k que sale de su media:
+# cada valor u se guarda como el cociente u >> k en unario (unos
+# terminados en un cero) y los k bits bajos tal cual. Sólo se guarda un
+# byte (k) por partición, sin tabla ni árbol. Los cocientes y los restos
+# van en flujos de bits separados, así ninguno se recorre valor por valor:
+# los cocientes salen de las posiciones de los ceros del flujo unario y los
+# restos se agrupan por k, con un ancho fijo dentro de cada grupo. Los
+# cocientes desde COCIENTE_MAX (valores atípicos) se escapan: el unario se
+# corta ahí y el cociente va aparte como varint. Las particiones de sólo
+# ceros (silencio) se marcan con PARAMETRO_CEROS y no ocupan nada más.
+
+# Valores por partición (cada una guarda un byte con su parámetro)
+MUESTRAS_POR_PARTICION = 256
+# Parámetro de Rice máximo
+PARAMETRO_MAX = 32
+# Parámetro que marca una partición de sólo ceros (sin cocientes ni restos)
+PARAMETRO_CEROS = PARAMETRO_MAX + 1
+# Cociente desde el cual el valor se escapa
+COCIENTE_MAX = 32
+
+
+def _parametros(matriz, n):
+    # k de cada partición: para una distribución geométrica de media m el
+    # óptimo es ~log2(m * ln 2); se corrige en ±1 según los bits exactos
+    # (suma de los cocientes + k + 1 por valor)
+    cantidades = np.full(len(matriz), matriz.shape[1])
+    cantidades[-1] = n - (len(matriz) - 1) * matriz.shape[1]
+    medias = matriz.sum(axis=1) / cantidades
+    estimados = np.floor(np.log2(np.maximum(medias * np.log(2), 1))).astype(np.int64)
+    mejores, costos = estimados, None
+    for k in (estimados - 1, estimados, estimados + 1):
+        k = np.clip(k, 0, PARAMETRO_MAX)
+        costo = (matriz >> k[:, None]).sum(axis=1) + cantidades * (k + 1)
+        if costos is not None:
+            k = np.where(costo < costos, k, mejores)
+            costo = np.minimum(costo, costos)
+        mejores, costos = k, costo
+    mejores[matriz.max(axis=1) == 0] = PARAMETRO_CEROS
+    return mejores
+
+
+def _grupos(parametros, particion, n):
+    # (k, particiones, restos) de cada parámetro usado, de menor a mayor;
+    # la última partición puede estar incompleta y siempre cierra su grupo
+    # (k = 0 y las particiones de ceros no tienen restos)
+    orden = np.argsort(parametros, kind="stable")
+    cortes = np.flatnonzero(np.diff(parametros[orden])) + 1
+    for filas in np.split(orden, cortes):
+        ancho = int(parametros[filas[0]])
+        cuantos = len(filas) * particion
+        if filas[-1] == len(parametros) - 1:
+            cuantos -= len(parametros) * particion - n
+        if 0 < ancho <= PARAMETRO_MAX:
+            yield ancho, filas, cuantos
+
+
+def _tipo(ancho):
+    # Entero sin signo más chico que contiene `ancho` bits
+    return np.uint8 if ancho <= 8 else np.uint16 if ancho <= 16 else np.uint32
+
+
+def _empaquetar(restos, ancho):
+    # Campos de `ancho` bits seguidos, armados bit a bit (un paso por bit
+    # sobre todos los restos, en el tipo más chico que alcanza)
+    restos = restos.astype(_tipo(ancho))
+    bits = np.empty((len(restos), ancho), dtype=np.uint8)
+    for j in range(ancho):
+        bits[:, j] = (restos >> (ancho - 1 - j)) & 1
+    return np.packbits(bits).tobytes()
+
+
+def _desempaquetar(datos, n, ancho):
+    # Inverso de _empaquetar: n campos de `ancho` bits
+    bits = np.unpackbits(datos)[: n * ancho].reshape(n, ancho)
+    restos = np.zeros(n, dtype=_tipo(ancho))
+    for j in range(ancho):
+        restos <<= 1
+        restos |= bits[:, j]
+    return restos
+
+
+def escribir(f, valores, particion=MUESTRAS_POR_PARTICION):
+    # Cantidad, tamaño de partición, parámetros, cocientes escapados,
+    # flujo unario y flujo de restos
+    valores = np.asarray(valores, dtype=np.int64)
+    n = len(valores)
+    huffman_rapido.escribir_varint(f, n)
+    huffman_rapido.escribir_varint(f, particion)
+    if n == 0:
+        return
+    n_particiones = -(-n // particion)
+    matriz = np.zeros(n_particiones * particion, dtype=np.int64)
+    matriz[:n] = valores
+    matriz = matriz.reshape(n_particiones, particion)
+    parametros = _parametros(matriz, n)
+    f.write(parametros.astype(np.uint8).tobytes())
+
+    # Sólo las particiones que no son de ceros guardan cocientes
+    guardados = np.repeat(parametros != PARAMETRO_CEROS, particion)[:n]
+    cocientes = (matriz >> parametros[:, None]).ravel()[:n][guardados]
+    escapados = np.flatnonzero(cocientes >= COCIENTE_MAX)
+    huffman_rapido.escribir_varint(f, len(escapados))
+    f.write(huffman_rapido.empaquetar_varints(np.diff(escapados, prepend=0)))
+    f.write(huffman_rapido.empaquetar_varints(cocientes[escapados] - COCIENTE_MAX))
+    cocientes[escapados] = COCIENTE_MAX
+
+    # Unario: el cero que cierra cada valor está a cociente + 1 del anterior
+    ceros = np.cumsum(cocientes + 1) - 1
+    bits = np.ones(int(ceros[-1]) + 1 if len(ceros) else 0, dtype=np.uint8)
+    bits[ceros] = 0
+    unario = np.packbits(bits)
+    huffman_rapido.escribir_varint(f, len(unario))
+    f.write(unario.tobytes())
+
+    # Restos agrupados por parámetro, cada grupo en campos de ancho fijo
+    for ancho, filas, cuantos in _grupos(parametros, particion, n):
+        restos = (matriz[filas] & ((1 << ancho) - 1)).ravel()[:cuantos]
+        f.write(_empaquetar(restos, ancho))
+
+
+def leer(f):
+    # Inverso de escribir: devuelve los valores (int64)
+    n = huffman_rapido.leer_varint(f)
+    particion = huffman_rapido.leer_varint(f)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    if particion == 0:
+        raise ValueError("Flujo Rice corrupto: partición vacía")
+    n_particiones = -(-n // particion)
+    parametros = np.frombuffer(f.read(n_particiones), dtype=np.uint8)
+    if len(parametros) != n_particiones:
+        raise ValueError("Archivo truncado: faltan parámetros de Rice")
+    if parametros.max() > PARAMETRO_CEROS:
+        raise ValueError("Flujo Rice corrupto: parámetro inválido")
+    parametros = parametros.astype(np.int64)
+
+    n_escapados = huffman_rapido.leer_varint(f)
+    escapados = np.cumsum(huffman_rapido.leer_varints(f, n_escapados))
+    extras = huffman_rapido.leer_varints(f, n_escapados)
+
+    n_unario = huffman_rapido.leer_varint(f)
+    unario = np.frombuffer(f.read(n_unario), dtype=np.uint8)
+    if len(unario) != n_unario:
+        raise ValueError("Archivo truncado: faltan cocientes de Rice")
+    # Los cocientes guardados son los de las particiones que no son de ceros
+    guardados = np.repeat(parametros != PARAMETRO_CEROS, particion)[:n]
+    n_guardados = int(np.count_nonzero(guardados))
+    ceros = np.flatnonzero(np.unpackbits(unario) == 0)[:n_guardados]
+    if len(ceros) != n_guardados:
+        raise ValueError("Archivo truncado: faltan cocientes de Rice")
+    leidos = np.diff(ceros, prepend=-1) - 1
+    if n_escapados and (
+        escapados[-1] >= n_guardados or np.any(leidos[escapados] != COCIENTE_MAX)
+    ):
+        raise ValueError("Flujo Rice corrupto: escapes inválidos")
+    leidos[escapados] += extras
+    cocientes = np.zeros(n_particiones * particion, dtype=np.int64)
+    cocientes[:n][guardados] = leidos
+
+    matriz = cocientes.reshape(n_particiones, particion) << parametros[:, None]
+    for ancho, filas, cuantos in _grupos(parametros, particion, n):
+        n_bytes = -(-cuantos * ancho // 8)
+        datos = np.frombuffer(f.read(n_bytes), dtype=np.uint8)
+        if len(datos) != n_bytes:
+            raise ValueError("Archivo truncado: faltan restos de Rice")
+        restos = np.zeros(len(filas) * particion, dtype=np.int64)
+        restos[:cuantos] = _desempaquetar(datos, cuantos, ancho)
+        matriz[filas] |= restos.reshape(len(filas), particion)
+    return matriz.ravel()[:n]
@@ -0,0 +1,190 @@
+import io
+import shutil
+import wave
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src import prediccion
+
+# Ida y vuelta bit a bit de los codecs de audio: predicción lineal y
+# archivos .hac completos (8, 16 y 24 bits). Los de archivo completo
+# necesitan pyaudio (lo importa src/compresion_audio.py)
+
+
+def _paseo(n, semilla=0, paso=300):
+    # Señal de 16 bits con correlación entre muestras (paseo aleatorio)
+    rng = np.random.default_rng(semilla)
+    return np.clip(np.cumsum(rng.integers(-paso, paso + 1, n)), -32768, 32767)
+
+
+def _tonal(n):
+    # Suma de senoidales con un poco de ruido (le conviene el LPC)
+    t = np.arange(n)
+    rng = np.random.default_rng(1)
+    senal = 8000 * np.sin(t * 0.031) + 3000 * np.sin(t * 0.17) + rng.normal(0, 4, n)
+    return np.rint(senal).astype(np.int64)
+
+
+def _ida_y_vuelta(muestras, codificador):
+    f = io.BytesIO()
+    prediccion.escribir(f, muestras, codificador)
+    datos = f.getvalue()
+    f.seek(0)
+    recuperadas = prediccion.leer(f, len(muestras), codificador)
+    assert f.read() == b""
+    return recuperadas, datos
+
+
+@pytest.mark.parametrize("codificador", prediccion.CODIFICADORES_RESIDUOS)
+@pytest.mark.parametrize("n", [0, 1, 4095, 4096, 4097, 3 * 4096 + 5])
+def test_prediccion_ida_y_vuelta(codificador, n):
+    muestras = _paseo(n)
+    recuperadas, _ = _ida_y_vuelta(muestras, codificador)
+    np.testing.assert_array_equal(recuperadas, muestras)
+
+
+@pytest.mark.parametrize("codificador", prediccion.CODIFICADORES_RESIDUOS)
+def test_prediccion_tonal_usa_lpc(codificador):
+    muestras = _tonal(5 * 4096)
+    recuperadas, datos = _ida_y_vuelta(muestras, codificador)
+    np.testing.assert_array_equal(recuperadas, muestras)
+    assert np.any(np.frombuffer(datos[2:7], np.uint8) >= prediccion.PREDICTOR_LPC)
+
+
+def test_prediccion_extremos_de_16_bits():
+    muestras = np.tile([-32768, 32767], 5000)
+    recuperadas, _ = _ida_y_vuelta(muestras, prediccion.RESIDUOS_AUTOMATICO)
+    np.testing.assert_array_equal(recuperadas, muestras)
+
+
+def test_prediccion_silencio_y_huecos():
+    silencio = np.zeros(10000, dtype=np.int64)
+    recuperadas, datos = _ida_y_vuelta(silencio, prediccion.RESIDUOS_AUTOMATICO)
+    np.testing.assert_array_equal(recuperadas, silencio)
+    assert len(datos) < 32
+
+    muestras = _paseo(50000)
+    muestras[10000:30000] = 0
+    muestras[40000:] = -7
+    recuperadas, _ = _ida_y_vuelta(muestras, prediccion.RESIDUOS_AUTOMATICO)
+    np.testing.assert_array_equal(recuperadas, muestras)
+
+
+def test_prediccion_rechaza_predictor_invalido():
+    f = io.BytesIO()
+    prediccion.escribir(f, _paseo(100), prediccion.RESIDUOS_RICE)
+    datos = bytearray(f.getvalue())
+    datos[2] = 0x20
+    with pytest.raises(ValueError):
+        prediccion.leer(io.BytesIO(bytes(datos)), 100, prediccion.RESIDUOS_RICE)
+
+
+@pytest.fixture
+def compresion_audio():
+    pytest.importorskip("pyaudio")
+    from src import compresion_audio
+
+    return compresion_audio
+
+
+def _escribir_wav(ruta, frames, canales, sample_width):
+    with wave.open(str(ruta), "wb") as archivo:
+        archivo.setnchannels(canales)
+        archivo.setsampwidth(sample_width)
+        archivo.setframerate(8000)
+        archivo.writeframes(frames)
+
+
+def _frames(sample_width, canales, n):
+    if sample_width == 1:
+        muestras = (_paseo(n * canales, paso=3) & 0xFF).astype(np.uint8)
+    elif sample_width == 2:
+        muestras = _paseo(n * canales).astype(np.int16)
+    else:
+        rng = np.random.default_rng(6)
+        muestras = rng.integers(0, 4, n * canales * sample_width).astype(np.uint8)
+    return muestras.tobytes()
+
+
+def _comprimir_y_descomprimir(compresion_audio, ruta, **opciones):
+    compresor = compresion_audio.CompresorAudioOptimizado(**opciones)
+    assert compresor.comprimir_audio(str(ruta))
+    comprimido = ruta.with_name(ruta.stem + "_comprimido.hac")
+    salida = compresion_audio.CompresorAudioOptimizado().descomprimir_audio(
+        str(comprimido)
+    )
+    assert salida
+    with wave.open(salida, "rb") as archivo:
+        return archivo.readframes(archivo.getnframes()), comprimido.stat().st_size
+
+
+@pytest.mark.parametrize(
+    "opciones",
+    [
+        {},
+        # CODEC_RLE_HUFFMAN (el módulo no se importa sin pyaudio)
+        {"codec": 0},
+        {"estereo": False},
+        {"residuos": prediccion.RESIDUOS_HUFFMAN},
+        {"residuos": prediccion.RESIDUOS_RICE},
+    ],
+)
+@pytest.mark.parametrize(
+    "sample_width, canales, n",
+    [
+        (1, 1, 5000),
+        (1, 2, 70001),
+        (2, 1, 1),
+        (2, 1, 9000),
+        (2, 2, 4097),
+        (2, 3, 9000),
+        (3, 1, 5000),
+        (3, 2, 5000),
+        (2, 1, 0),
+        (2, 2, 0),
+    ],
+)
+def test_archivo_ida_y_vuelta(
+    compresion_audio, tmp_path, opciones, sample_width, canales, n
+):
+    frames = _frames(sample_width, canales, n)
+    ruta = tmp_path / "audio.wav"
+    _escribir_wav(ruta, frames, canales, sample_width)
+    recuperados, _ = _comprimir_y_descomprimir(compresion_audio, ruta, **opciones)
+    assert recuperados == frames
+
+
+def test_archivo_silencio(compresion_audio, tmp_path):
+    frames = bytes(2 * 2 * 10000)
+    ruta = tmp_path / "silencio.wav"
+    _escribir_wav(ruta, frames, 2, 2)
+    recuperados, tamano = _comprimir_y_descomprimir(compresion_audio, ruta)
+    assert recuperados == frames
+    assert tamano < 64
+
+
+def test_archivo_silencio_largo_rle(compresion_audio, tmp_path):
+    # Una sola ejecucion de millones de muestras: la tabla de simbolos tiene
+    # dos valores muy distantes (0 y el largo de la ejecucion)
+    frames = bytes(2 * 3_000_000)
+    ruta = tmp_path / "silencio.wav"
+    _escribir_wav(ruta, frames, 1, 2)
+    recuperados, tamano = _comprimir_y_descomprimir(compresion_audio, ruta, codec=0)
+    assert recuperados == frames
+    assert tamano < 64
+
+
+def test_archivo_formato_anterior(compresion_audio, tmp_path):
+    # Los .hac sin firma (pickle) del formato anterior se siguen leyendo
+    raiz = Path(__file__).resolve().parent.parent / "archivos"
+    comprimido = tmp_path / "audio_prueba.hac"
+    shutil.copy(raiz / "comprimidos" / "audio_prueba_comprimido.hac", comprimido)
+    salida = compresion_audio.CompresorAudioOptimizado().descomprimir_audio(
+        str(comprimido)
+    )
+    with wave.open(salida, "rb") as archivo:
+        recuperados = archivo.readframes(archivo.getnframes())
+    with wave.open(str(raiz / "originales" / "audio_prueba.wav"), "rb") as archivo:
+        assert recuperados == archivo.readframes(archivo.getnframes())
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from src import prediccion
+
+# Ida y vuelta de los modos estéreo por trama (izquierdo/derecho,
+# medio/lateral...) de src/prediccion.py
+
+
+def _paseo(n, semilla=0, paso=300):
+    # Señal de 16 bits con correlación entre muestras (paseo aleatorio)
+    rng = np.random.default_rng(semilla)
+    return np.clip(np.cumsum(rng.integers(-paso, paso + 1, n)), -32768, 32767)
+
+
+@pytest.mark.parametrize("n", [0, 1, 4096, 9000])
+def test_estereo_ida_y_vuelta(n):
+    rng = np.random.default_rng(3)
+    izquierdo = _paseo(n, 4)
+    derecho = izquierdo // 2 + rng.integers(-3, 4, n)
+    # Tramas con extremos de 16 bits, donde medio y lateral desbordan int16
+    izquierdo[: n // 2 : 7] = 32767
+    derecho[: n // 2 : 7] = -32768
+    derecho = np.clip(derecho, -32768, 32767)
+    modos, primera, segunda = prediccion.estereo(izquierdo, derecho)
+    recuperados = prediccion.desestereo(modos, primera, segunda)
+    np.testing.assert_array_equal(recuperados[0], izquierdo)
+    np.testing.assert_array_equal(recuperados[1], derecho)
+
+
+def test_estereo_elige_lateral_con_canales_correlacionados():
+    izquierdo = _paseo(8 * 4096, 5)
+    modos, _, _ = prediccion.estereo(izquierdo, izquierdo + 1)
+    assert np.all(modos != prediccion.ESTEREO_IZQUIERDO_DERECHO)
@@ -0,0 +1,228 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src import compresion_imagen
+
+# Ida y vuelta de los .bin de imagen: filtros de fila, teselas RLE,
+# filtradas y con paleta, y la salida PNG por bandas
+
+
+def _degradado(alto, ancho):
+    # Degradado RGB (le convienen los filtros de fila)
+    y, x = np.mgrid[:alto, :ancho]
+    canales = [(3 * x + y) % 256, (x + 2 * y) % 256, (x * y // 50) % 256]
+    return np.stack(canales, axis=-1).astype(np.uint8)
+
+
+def _ida_y_vuelta(tmp_path, pixeles, salida="salida.png", **opciones):
+    entrada = tmp_path / "entrada.png"
+    Image.fromarray(pixeles).save(entrada)
+    comprimido = tmp_path / "imagen.bin"
+    compresion_imagen.comprimir_imagen(entrada, comprimido, procesos=1, **opciones)
+    compresion_imagen.descomprimir_imagen(comprimido, tmp_path / salida, procesos=1)
+    with Image.open(tmp_path / salida) as imagen:
+        return np.asarray(imagen)
+
+
+@pytest.mark.parametrize("alto", [1, 255, 256, 257, 1000])
+def test_reconstruir_filas(alto):
+    pixeles = _degradado(alto, 37)
+    filtros, residuos = compresion_imagen.filtrar_filas(pixeles)
+    recuperados = compresion_imagen.reconstruir_filas(filtros, residuos)
+    np.testing.assert_array_equal(recuperados, pixeles)
+
+
+def test_tesela_filtrada_alta(tmp_path):
+    # Una sola tesela de 8 x 30000: la reconstrucción va por bloques de filas
+    pixeles = _degradado(30000, 8)
+    recuperados = _ida_y_vuelta(tmp_path, pixeles, lado_tesela=0)
+    np.testing.assert_array_equal(recuperados, pixeles)
+
+
+def test_tesela_filtrada_por_bandas(tmp_path):
+    # La tesela filtrada se entrega por bandas sin armarla entera: el pico
+    # de memoria queda por debajo del tamaño de la tesela
+    rng = np.random.default_rng(0)
+    filas = np.arange(10000)[:, None, None]
+    pixeles = ((rng.integers(0, 256, (1, 128, 3)) + filas) % 256).astype(np.uint8)
+    entrada = tmp_path / "entrada.png"
+    Image.fromarray(pixeles).save(entrada)
+    comprimido = tmp_path / "imagen.bin"
+    compresion_imagen.comprimir_imagen(entrada, comprimido, lado_tesela=0)
+    tracemalloc.start()
+    try:
+        *_, bandas = compresion_imagen._bandas_region(comprimido, None, 1)
+        for fila, banda in zip(range(0, len(pixeles), 64), bandas):
+            np.testing.assert_array_equal(banda, pixeles[fila : fila + 64])
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert pico < pixeles.nbytes
+
+
+def _ejecuciones_largas(alto, ancho):
+    # Ejecuciones de 13 píxeles, cada una de un color distinto (gana RLE)
+    rng = np.random.default_rng(3)
+    n = alto * ancho
+    colores = rng.integers(0, 256, (n // 13 + 1, 3))
+    return np.repeat(colores, 13, axis=0)[:n].reshape(alto, ancho, 3).astype(np.uint8)
+
+
+def _pocos_colores(alto, ancho):
+    # Ruido de cuatro colores sin ejecuciones (gana la paleta)
+    rng = np.random.default_rng(4)
+    paleta = np.array([[0, 0, 0], [60, 10, 200], [255, 255, 0], [9, 99, 9]])
+    return paleta[rng.integers(0, 4, (alto, ancho))].astype(np.uint8)
+
+
+@pytest.mark.parametrize(
+    "entropia",
+    [
+        compresion_imagen.ENTROPIA_NINGUNA,
+        compresion_imagen.ENTROPIA_HUFFMAN,
+        compresion_imagen.ENTROPIA_RANGOS,
+    ],
+)
+@pytest.mark.parametrize(
+    "generar, tipo",
+    [
+        (_ejecuciones_largas, compresion_imagen.TESELA_RLE),
+        (_pocos_colores, compresion_imagen.TESELA_PALETA),
+        (_degradado, compresion_imagen.TESELA_FILTRADA),
+    ],
+)
+@pytest.mark.parametrize("lado_tesela", [0, 32])
+def test_teselas_ida_y_vuelta(tmp_path, entropia, generar, tipo, lado_tesela):
+    pixeles = generar(70, 90)
+    assert compresion_imagen._comprimir_tesela(pixeles, True, entropia)[0] == tipo
+    recuperados = _ida_y_vuelta(
+        tmp_path, pixeles, lado_tesela=lado_tesela, entropia=entropia
+    )
+    np.testing.assert_array_equal(recuperados, pixeles)
+    comprimido = tmp_path / "imagen.bin"
+    for caja in [(0, 0, 90, 70), (31, 33, 65, 64), (10, 20, 11, 21), (89, 0, 90, 70)]:
+        region = compresion_imagen.leer_region_imagen(comprimido, caja, procesos=1)
+        izquierda, arriba, derecha, abajo = caja
+        esperado = pixeles[arriba:abajo, izquierda:derecha]
+        np.testing.assert_array_equal(np.asarray(region), esperado)
+
+
+@pytest.mark.parametrize("filtrar", [False, True])
+@pytest.mark.parametrize("modo", ["L", "RGB", "RGBA"])
+def test_sin_filtros_y_otros_modos(tmp_path, filtrar, modo):
+    pixeles = np.asarray(Image.fromarray(_degradado(50, 60)).convert(modo))
+    recuperados = _ida_y_vuelta(tmp_path, pixeles, filtrar=filtrar, lado_tesela=16)
+    np.testing.assert_array_equal(recuperados, pixeles)
+
+
+def test_imagen_de_un_pixel(tmp_path):
+    pixeles = np.array([[[1, 2, 3]]], dtype=np.uint8)
+    np.testing.assert_array_equal(_ida_y_vuelta(tmp_path, pixeles), pixeles)
+
+
+@pytest.mark.parametrize("colores, tolerancia", [(16, 0), (0, 8), (16, 8)])
+def test_con_perdida(tmp_path, colores, tolerancia):
+    # Con cuantización la salida cambia, pero la PSNR informada es la real
+    pixeles = _degradado(60, 80)
+    entrada = tmp_path / "entrada.png"
+    Image.fromarray(pixeles).save(entrada)
+    comprimido = tmp_path / "imagen.bin"
+    *_, psnr = compresion_imagen.comprimir_imagen(
+        entrada, comprimido, procesos=1, colores=colores, tolerancia=tolerancia
+    )
+    salida = tmp_path / "salida.png"
+    compresion_imagen.descomprimir_imagen(comprimido, salida, procesos=1)
+    with Image.open(salida) as imagen:
+        recuperados = np.asarray(imagen).astype(np.float64)
+    if colores:
+        assert len(np.unique(recuperados.reshape(-1, 3), axis=0)) <= colores
+    error = np.mean((recuperados - pixeles) ** 2)
+    assert 0 < error
+    assert psnr == pytest.approx(10 * np.log10(255.0**2 / error))
+
+
+@pytest.mark.parametrize(
+    "modo, tipo",
+    [("I;16", "<u2"), ("I;16B", ">u2"), ("I", np.int32), ("F", np.float32)],
+)
+def test_modos_de_16_y_32_bits(tmp_path, modo, tipo):
+    # Los TIFF de 16 y 32 bits se guardan en su modo, sin truncar
+    rng = np.random.default_rng(1)
+    valores = rng.integers(-(2**20), 2**20, (70, 90)).astype(tipo)
+    if modo == "F":
+        valores /= 7
+    valores[:, 40:] = valores[:, 40:41]
+    entrada = tmp_path / "entrada.tif"
+    Image.frombytes(modo, (90, 70), valores.tobytes()).save(entrada)
+    comprimido = tmp_path / "imagen.bin"
+    resultado = compresion_imagen.comprimir_imagen(entrada, comprimido)
+    assert resultado[2] == modo
+    with Image.open(entrada) as original:
+        esperado = np.asarray(original)
+    salida = tmp_path / "salida.tif"
+    assert compresion_imagen.descomprimir_imagen(comprimido, salida)[2] == modo
+    with Image.open(salida) as imagen:
+        assert imagen.mode == modo
+        np.testing.assert_array_equal(np.asarray(imagen), esperado)
+    region = compresion_imagen.leer_region_imagen(comprimido, (5, 6, 50, 60))
+    np.testing.assert_array_equal(np.asarray(region), esperado[6:60, 5:50])
+    if modo in ("I", "F"):
+        with pytest.raises(ValueError):
+            compresion_imagen.descomprimir_imagen(comprimido, tmp_path / "salida.png")
+        with pytest.raises(ValueError):
+            compresion_imagen.comprimir_imagen(entrada, comprimido, colores=16)
+    else:
+        salida = tmp_path / "salida.png"
+        compresion_imagen.descomprimir_imagen(comprimido, salida)
+        with Image.open(salida) as imagen:
+            np.testing.assert_array_equal(np.asarray(imagen), esperado)
+
+
+@pytest.mark.parametrize("colores, tolerancia", [(1, 0), (2, 0), (0, 255)])
+def test_con_perdida_en_modo_1(tmp_path, colores, tolerancia):
+    # En modo "1" sólo quedan blanco y negro y la PSNR es la de la salida
+    rng = np.random.default_rng(2)
+    pixeles = rng.random((40, 50)) < 0.3
+    entrada = tmp_path / "entrada.png"
+    Image.fromarray(pixeles).save(entrada)
+    comprimido = tmp_path / "imagen.bin"
+    *_, psnr = compresion_imagen.comprimir_imagen(
+        entrada, comprimido, colores=colores, tolerancia=tolerancia
+    )
+    salida = tmp_path / "salida.png"
+    compresion_imagen.descomprimir_imagen(comprimido, salida)
+    with Image.open(salida) as imagen:
+        assert imagen.mode == "1"
+        recuperados = np.asarray(imagen.convert("L")).astype(np.float64)
+    error = np.mean((recuperados - 255.0 * pixeles) ** 2)
+    esperada = 10 * np.log10(255.0**2 / error) if error else float("inf")
+    assert psnr == pytest.approx(esperada)
+
+
+def test_formato_anterior(tmp_path):
+    # Los .bin sin firma (ejecuciones RGB de 5 bytes) se siguen leyendo
+    colores = np.array([[255, 0, 0], [0, 0, 255]], dtype=np.uint8)
+    registros = b"".join(
+        bytes(color) + repeticiones.to_bytes(2, "big")
+        for color, repeticiones in zip(colores, [7, 5])
+    )
+    comprimido = tmp_path / "anterior.bin"
+    comprimido.write_bytes((4).to_bytes(4, "big") + (3).to_bytes(4, "big") + registros)
+    imagen = compresion_imagen.leer_region_imagen(comprimido, (0, 0, 4, 3))
+    esperado = np.repeat(colores, [7, 5], axis=0).reshape(3, 4, 3)
+    np.testing.assert_array_equal(np.asarray(imagen), esperado)
+
+
+def test_rechaza_version_desconocida(tmp_path):
+    entrada = tmp_path / "entrada.png"
+    Image.fromarray(_degradado(10, 10)).save(entrada)
+    comprimido = tmp_path / "imagen.bin"
+    compresion_imagen.comprimir_imagen(entrada, comprimido)
+    datos = bytearray(comprimido.read_bytes())
+    datos[len(compresion_imagen.MAGIA_IMAGEN)] = compresion_imagen.VERSION_IMAGEN + 1
+    comprimido.write_bytes(bytes(datos))
+    with pytest.raises(ValueError):
+        compresion_imagen.descomprimir_imagen(comprimido, tmp_path / "salida.png")
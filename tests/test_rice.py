@@ -0,0 +1,44 @@
+import io
+
+import numpy as np
+import pytest
+
+from src import rice
+
+# Ida y vuelta del código de Rice de los residuos (src/rice.py)
+
+
+@pytest.mark.parametrize(
+    "valores",
+    [
+        [],
+        [0],
+        [5],
+        [0] * 256,
+        [0] * 1000,
+        [3] * 300 + [0] * 600 + [1],
+        [0, 1, 2, 10**9, 0, 10**7],
+    ],
+)
+def test_rice_ida_y_vuelta(valores):
+    valores = np.array(valores, dtype=np.int64)
+    f = io.BytesIO()
+    rice.escribir(f, valores)
+    f.seek(0)
+    np.testing.assert_array_equal(rice.leer(f), valores)
+    assert f.read() == b""
+
+
+def test_rice_geometrico():
+    valores = np.random.default_rng(2).geometric(0.01, 5000) - 1
+    f = io.BytesIO()
+    rice.escribir(f, valores)
+    f.seek(0)
+    np.testing.assert_array_equal(rice.leer(f), valores)
+
+
+def test_rice_particiones_de_ceros_ocupan_un_byte():
+    f = io.BytesIO()
+    rice.escribir(f, np.zeros(256 * 8, dtype=np.int64))
+    # Cantidad, partición, 8 parámetros, escapes y unario vacíos
+    assert len(f.getvalue()) == 2 + 2 + 8 + 1 + 1
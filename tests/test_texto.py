@@ -0,0 +1,203 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src import compresion_texto
+
+# Ida y vuelta de los .bin de texto (Huffman, LZ, rangos, diccionario y el
+# formato anterior) y lectura de rangos de bytes y de líneas con el índice
+# de bloques
+
+BLOQUE = 1000
+
+
+def _texto(n_lineas=300, semilla=0):
+    # Líneas de largo variable con repeticiones (le convienen a LZ) y
+    # caracteres de más de un byte en UTF-8
+    rng = np.random.default_rng(semilla)
+    palabras = ["compresión", "árbol", "Huffman", "bloque", "índice", "ñandú", "€"]
+    lineas = []
+    for i in range(n_lineas):
+        elegidas = rng.choice(palabras, rng.integers(0, 12))
+        lineas.append(f"{i}: " + " ".join(elegidas.tolist()))
+    return "\n".join(lineas)
+
+
+def _comprimir_archivo(tmp_path, datos, **opciones):
+    entrada = tmp_path / "entrada.txt"
+    entrada.write_bytes(datos)
+    comprimido = tmp_path / "texto.bin"
+    compresion_texto.comprimir_archivo_texto(entrada, comprimido, **opciones)
+    return comprimido
+
+
+@pytest.mark.parametrize(
+    "opciones",
+    [
+        {},
+        {"lz": True},
+        {"por_rangos": True},
+        {"modo": compresion_texto.MODO_CARACTERES},
+        {"modo": compresion_texto.MODO_CARACTERES, "lz": True},
+    ],
+)
+@pytest.mark.parametrize("procesos", [1, 2])
+@pytest.mark.parametrize("simbolos_por_bloque", [BLOQUE, 1 << 21])
+def test_archivo_ida_y_vuelta(tmp_path, opciones, procesos, simbolos_por_bloque):
+    datos = _texto().encode("utf-8")
+    comprimido = _comprimir_archivo(
+        tmp_path,
+        datos,
+        simbolos_por_bloque=simbolos_por_bloque,
+        procesos=procesos,
+        **opciones,
+    )
+    salida = tmp_path / "salida.txt"
+    compresion_texto.descomprimir_archivo_texto(comprimido, salida, procesos=procesos)
+    assert salida.read_bytes() == datos
+
+
+@pytest.mark.parametrize("datos", [b"", b"a", b"\x00\xff" * 700, bytes(range(256))])
+def test_archivo_bytes_cualesquiera(tmp_path, datos):
+    # En modo bytes el archivo no tiene por qué ser UTF-8 válido
+    comprimido = _comprimir_archivo(tmp_path, datos, simbolos_por_bloque=BLOQUE)
+    salida = tmp_path / "salida.txt"
+    compresion_texto.descomprimir_archivo_texto(comprimido, salida, procesos=1)
+    assert salida.read_bytes() == datos
+
+
+@pytest.mark.parametrize("opciones", [{}, {"lz": True}, {"por_rangos": True}])
+@pytest.mark.parametrize(
+    "texto", ["", "a", "aaaa", pytest.param(_texto(), id="lineas")]
+)
+def test_texto_ida_y_vuelta(tmp_path, opciones, texto):
+    comprimido = tmp_path / "texto.bin"
+    compresion_texto.comprimir_texto(texto, comprimido, **opciones)
+    assert compresion_texto.descomprimir_texto(comprimido, tmp_path / "s.txt") == texto
+
+
+@pytest.fixture
+def diccionario(tmp_path):
+    # Diccionario entrenado con fragmentos JSON parecidos a los de la prueba
+    muestras = []
+    for i in range(30):
+        muestra = tmp_path / f"muestra_{i}.json"
+        fragmento = {"id": i, "nombre": f"usuario {i}", "activo": i % 2 == 0}
+        muestra.write_text(json.dumps(fragmento), encoding="utf-8")
+        muestras.append(muestra)
+    ruta = tmp_path / "json.dic"
+    compresion_texto.entrenar_diccionario(muestras, ruta)
+    return compresion_texto.cargar_diccionario(ruta)
+
+
+@pytest.mark.parametrize("lz", [False, True])
+def test_diccionario_ida_y_vuelta(tmp_path, diccionario, lz):
+    texto = json.dumps({"id": 99, "nombre": "usuario ñ", "activo": True})
+    comprimido = tmp_path / "texto.bin"
+    compresion_texto.comprimir_texto(texto, comprimido, lz=lz, diccionario=diccionario)
+    salida = tmp_path / "salida.txt"
+    recuperado = compresion_texto.descomprimir_texto(
+        comprimido, salida, diccionario=diccionario
+    )
+    assert recuperado == texto
+    with pytest.raises(ValueError):
+        compresion_texto.descomprimir_texto(comprimido, salida)
+
+
+def test_formato_anterior(tmp_path):
+    # Los .bin sin firma (pickle) del formato anterior se siguen leyendo
+    raiz = Path(__file__).resolve().parent.parent / "archivos"
+    comprimido = raiz / "comprimidos" / "texto_grande_comprimido.bin"
+    original = (raiz / "originales" / "texto_grande.txt").read_text(encoding="utf-8")
+    assert (
+        compresion_texto.descomprimir_texto(comprimido, tmp_path / "s.txt") == original
+    )
+    assert compresion_texto.leer_bytes_texto(comprimido, 5, 40) == (
+        original.encode("utf-8")[5:40]
+    )
+
+
+def test_rechaza_version_desconocida(tmp_path):
+    comprimido = _comprimir_archivo(tmp_path, b"hola")
+    datos = bytearray(comprimido.read_bytes())
+    datos[len(compresion_texto.MAGIA_TEXTO)] = compresion_texto.VERSION_TEXTO + 1
+    comprimido.write_bytes(bytes(datos))
+    with pytest.raises(ValueError):
+        compresion_texto.descomprimir_texto(comprimido, tmp_path / "s.txt")
+
+
+RANGOS = [
+    (0, None),
+    (None, None),
+    (-1, None),
+    (-1500, -10),
+    (BLOQUE - 1, BLOQUE + 1),
+    (BLOQUE, 2 * BLOQUE),
+    (2 * BLOQUE - 3, 5 * BLOQUE + 3),
+    (5, 5),
+    (10, 5),
+    (-3, -5),
+    (10**9, None),
+    (0, 10**9),
+]
+
+
+@pytest.mark.parametrize("simbolos_por_bloque", [BLOQUE, 1 << 21])
+@pytest.mark.parametrize("inicio, fin", RANGOS)
+def test_leer_bytes(tmp_path, simbolos_por_bloque, inicio, fin):
+    datos = _texto().encode("utf-8")
+    comprimido = _comprimir_archivo(
+        tmp_path, datos, simbolos_por_bloque=simbolos_por_bloque, lz=True
+    )
+    inicio_slice = 0 if inicio is None else inicio
+    assert compresion_texto.leer_bytes_texto(comprimido, inicio_slice, fin) == (
+        datos[inicio:fin]
+    )
+
+
+@pytest.mark.parametrize("salto_final", [False, True])
+@pytest.mark.parametrize("simbolos_por_bloque", [BLOQUE, 1 << 21])
+@pytest.mark.parametrize(
+    "inicio, fin",
+    [
+        (0, None),
+        (-1, None),
+        (-3, None),
+        (-50, -20),
+        (0, 1),
+        (2, 5),
+        (40, 140),
+        (299, 300),
+        (299, None),
+        (300, None),
+        (5, 5),
+        (7, 2),
+        (-1, -2),
+        (0, 10**6),
+    ],
+)
+def test_leer_lineas(tmp_path, salto_final, simbolos_por_bloque, inicio, fin):
+    datos = (_texto() + "\n" * salto_final).encode("utf-8")
+    comprimido = _comprimir_archivo(
+        tmp_path, datos, simbolos_por_bloque=simbolos_por_bloque
+    )
+    esperado = b"".join(datos.splitlines(keepends=True)[inicio:fin])
+    assert compresion_texto.leer_lineas_texto(comprimido, inicio, fin) == esperado
+
+
+def test_leer_lineas_con_bloques_sin_saltos(tmp_path):
+    # Líneas más largas que un bloque: hay bloques sin ningún salto de línea
+    datos = b"\n".join([b"x" * 3500, b"", b"y" * 10, b"z" * 2200])
+    comprimido = _comprimir_archivo(tmp_path, datos, simbolos_por_bloque=BLOQUE)
+    lineas = datos.splitlines(keepends=True)
+    for inicio in range(-5, 6):
+        for fin in [None, *range(-5, 6)]:
+            esperado = b"".join(lineas[inicio:fin])
+            assert compresion_texto.leer_lineas_texto(comprimido, inicio, fin) == (
+                esperado
+            )
+    assert compresion_texto.leer_bytes_texto(comprimido, 3400, 3600) == (
+        datos[3400:3600]
+    )